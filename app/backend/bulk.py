@@ -0,0 +1,195 @@
+import io
+import itertools
+import json
+
+from django.db import connections, router
+
+COPY_BATCH_SIZE = 5000
+JSON_READ_SIZE = 1 << 20
+
+_COPY_ESCAPES = str.maketrans({"\\": "\\\\", "\t": "\\t", "\n": "\\n", "\r": "\\r"})
+
+
+def chunked(iterable, size):
+    """Yields lists of up to size items of the iterable."""
+    iterator = iter(iterable)
+    while chunk := list(itertools.islice(iterator, size)):
+        yield chunk
+
+
+def copy_supported(model, using=None):
+    """True when the model's database is PostgreSQL, whose drivers can COPY."""
+    connection = connections[using or router.db_for_write(model)]
+    return connection.vendor == "postgresql"
+
+
+def _copy_value(value):
+    """Formats a database value for COPY's text format."""
+    if value is None:
+        return "\\N"
+    if value is True:
+        return "t"
+    if value is False:
+        return "f"
+    value = str(value)
+    # Tabs, newlines and carriage returns are not printable, most values need no escaping
+    if value.isprintable() and "\\" not in value:
+        return value
+    return value.translate(_COPY_ESCAPES)
+
+
+def _copy(connection, cursor, sql, data):
+    raw = cursor.cursor
+    # The raw driver cursor is used, so its errors are translated here
+    with connection.wrap_database_errors:
+        if hasattr(raw, "copy_expert"):
+            # psycopg2
+            raw.copy_expert(sql, io.StringIO(data))
+        else:
+            # psycopg 3
+            with raw.copy(sql) as copy:
+                copy.write(data)
+
+
+def copy_rows(model, field_names, rows, using=None, batch_size=COPY_BATCH_SIZE):
+    """
+    Inserts rows given as tuples of database values of field_names (field names
+    or attnames), for example as read with values_list(). Rows may be a generator,
+    they are written batch_size at a time. On PostgreSQL they are streamed with
+    COPY, other databases get instances built from them and bulk_create().
+    Returns the number of inserted rows.
+    """
+    using = using or router.db_for_write(model)
+    count = 0
+    if not copy_supported(model, using):
+        batch = []
+        for row in rows:
+            batch.append(model(**dict(zip(field_names, row))))
+            if len(batch) == batch_size:
+                count += len(model.objects.using(using).bulk_create(batch))
+                batch = []
+        return count + len(model.objects.using(using).bulk_create(batch))
+
+    columns = [model._meta.get_field(name).column for name in field_names]
+    return copy_table(connections[using], model._meta.db_table, columns, rows, batch_size)
+
+
+def copy_table(connection, table, columns, rows, batch_size=COPY_BATCH_SIZE):
+    """
+    copy_rows() for a table without a model, e.g. a temporary one, given by its
+    name and column names. PostgreSQL only. Returns the number of inserted rows.
+    """
+    quote_name = connection.ops.quote_name
+    sql = f"COPY {quote_name(table)} ({', '.join(quote_name(column) for column in columns)}) FROM STDIN"
+
+    count = 0
+    with connection.cursor() as cursor:
+        lines = []
+        for row in rows:
+            lines.append("\t".join([_copy_value(value) for value in row]))
+            if len(lines) == batch_size:
+                _copy(connection, cursor, sql, "\n".join(lines) + "\n")
+                count += len(lines)
+                lines = []
+        if lines:
+            _copy(connection, cursor, sql, "\n".join(lines) + "\n")
+            count += len(lines)
+    return count
+
+
+def bulk_insert(model, objs, using=None, batch_size=COPY_BATCH_SIZE, raw=False):
+    """
+    Inserts unsaved instances with copy_rows(), which on PostgreSQL skips the
+    per-row SQL compilation of bulk_create().
+
+    Like bulk_create(), save() and the model signals are not called, pre_save()
+    of the fields is (auto_now, auto_now_add) unless raw is set, which writes
+    the values as loaddata does. bulk_create() on other databases always runs
+    pre_save(). Keys generated by the database are not read back, instances
+    without a pk keep pk None.
+    """
+    objs = list(objs)
+    using = using or router.db_for_write(model)
+    opts = model._meta
+    auto_keys = opts.pk.db_returning and any(obj.pk is None for obj in objs)
+    if not copy_supported(model, using) or (auto_keys and any(obj.pk is not None for obj in objs)):
+        return model.objects.using(using).bulk_create(objs, batch_size=batch_size)
+
+    connection = connections[using]
+    fields = [field for field in opts.concrete_fields if not field.generated]
+    if auto_keys:
+        # Auto-incremented keys are left to the sequence
+        fields.remove(opts.pk)
+    rows = (
+        [field.get_db_prep_save(getattr(obj, field.attname) if raw else field.pre_save(obj, True), connection)
+         for field in fields]
+        for obj in objs
+    )
+    copy_rows(model, [field.name for field in fields], rows, using, batch_size)
+
+    for obj in objs:
+        obj._state.adding = False
+        obj._state.db = using
+    return objs
+
+
+def iter_json_array(f, read_size=JSON_READ_SIZE):
+    """
+    Yields the elements of the JSON array in the text file f one by one, reading
+    read_size characters at a time, so the whole file is never held in memory.
+    """
+    decoder = json.JSONDecoder()
+    buffer, pos, eof = "", 0, False
+    offset = 0  # characters dropped from the start of the buffer
+
+    def fill(size):
+        nonlocal buffer, pos, eof, offset
+        chunk = f.read(size)
+        eof = not chunk
+        offset += pos
+        buffer = buffer[pos:] + chunk
+        pos = 0
+
+    def skip_whitespace():
+        nonlocal pos
+        while True:
+            while pos < len(buffer) and buffer[pos] in " \t\r\n":
+                pos += 1
+            if pos < len(buffer) or eof:
+                return
+            fill(read_size)
+
+    fill(read_size)
+    skip_whitespace()
+    if buffer[pos:pos + 1] != "[":
+        raise ValueError("Expected a JSON array.")
+    pos += 1
+
+    skip_whitespace()
+    if buffer[pos:pos + 1] == "]":
+        return
+    size = read_size
+    while True:
+        try:
+            element, end = decoder.raw_decode(buffer, pos)
+        except json.JSONDecodeError:
+            element, end = None, None
+        if end is None or (end == len(buffer) and not eof):
+            # The element goes on in the next chunk, read bigger chunks until it fits
+            if eof:
+                raise ValueError(f"Invalid or truncated JSON at character {offset + pos}.")
+            fill(size)
+            size *= 2
+            continue
+        size = read_size
+        yield element
+        pos = end
+
+        skip_whitespace()
+        separator = buffer[pos:pos + 1]
+        pos += 1
+        if separator == "]":
+            return
+        if separator != ",":
+            raise ValueError(f"Expected ',' or ']' at character {offset + pos - 1}.")
+        skip_whitespace()
@@ -0,0 +1,69 @@
+import json
+from dataclasses import dataclass
+from datetime import datetime
+from decimal import Decimal
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import connection, transaction
+
+
+@dataclass(frozen=True)
+class DashboardStats:
+    """Everything the home page shows, shared by the templates and HTMX dashboards."""
+    latest_invoices: list
+    top_products: list
+    top_clients: list
+    monthly_revenues: list
+    monthly_revenue: Decimal
+    yearly_revenue: Decimal
+
+    @property
+    def monthly_revenues_json(self):
+        return json.dumps(self.monthly_revenues, default=str)
+
+
+# Shared by all processes, an invalidation in one of them reaches the others
+DASHBOARD_CACHE = "shared"
+
+
+def _cache_key(company_id):
+    return f"dashboard-stats:{company_id}"
+
+
+def get_dashboard_stats(company):
+    """Returns the cached statistics of a company, collecting them on a miss."""
+    cache = caches[DASHBOARD_CACHE]
+    key = _cache_key(company.pk)
+    stats = cache.get(key)
+    if stats is None:
+        stats = collect_dashboard_stats(company)
+        cache.set(key, stats, getattr(settings, "DASHBOARD_CACHE_TIMEOUT", 300))
+    return stats
+
+
+def invalidate_dashboard_stats(company_id):
+    cache, key = caches[DASHBOARD_CACHE], _cache_key(company_id)
+    cache.delete(key)
+    if connection.in_atomic_block:
+        # Other processes may cache the old stats again until the changes are committed
+        transaction.on_commit(lambda: cache.delete(key))
+
+
+def collect_dashboard_stats(company):
+    """
+    Collects the dashboard in four queries: latest invoices, top products,
+    top clients and the monthly revenue rollup of the current year.
+    The current month and yearly revenue are derived from the rollup rows.
+    """
+    now = datetime.now()
+    monthly_revenues = company.get_monthly_revenues(now.year)
+
+    return DashboardStats(
+        latest_invoices=list(company.get_latest_invoices()),
+        top_products=list(company.get_top_products()),
+        top_clients=list(company.get_top_clients()),
+        monthly_revenues=monthly_revenues,
+        monthly_revenue=monthly_revenues[now.month - 1],
+        yearly_revenue=sum(monthly_revenues),
+    )
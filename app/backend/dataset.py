@@ -0,0 +1,313 @@
+import random
+import time
+from calendar import monthrange
+from collections import Counter
+from datetime import date, datetime, time as dt_time, timedelta, timezone as dt_timezone
+from itertools import accumulate
+
+from django.contrib.auth.hashers import UNUSABLE_PASSWORD_PREFIX
+from django.db import connection, transaction
+
+from .bulk import chunked, copy_rows
+from .models import Client, Company, Invoice, InvoiceItem, Product, User
+from .search import SEARCHABLE_MODELS, search_documents_changed
+from .seed import LoadStats, finish_seed
+from .uuids import uuid7_at
+from .validators import NIP_WEIGHTS, REGON_9_WEIGHTS, REGON_14_WEIGHTS, random_identifier
+
+GENERATE_BATCH_SIZE = 10000
+
+# Invoice volume: grows towards the end of the range, dips in summer and on
+# weekends and peaks in December and in the last days of every month
+GROWTH_EXPONENT = 1.5
+MONTH_FACTORS = (0.85, 0.95, 1.05, 1.0, 1.0, 0.95, 0.85, 0.75, 1.05, 1.1, 1.1, 1.3)
+WEEKDAY_FACTORS = (1.0, 1.0, 1.0, 1.0, 1.1, 0.25, 0.1)
+MONTH_END_DAYS = 3
+MONTH_END_FACTOR = 1.8
+
+# Power laws: invoice share of companies, clients and products by rank, and the
+# Pareto shapes of items per invoice and quantities
+COMPANY_ZIPF = 0.8
+CLIENT_ZIPF = 1.0
+PRODUCT_ZIPF = 1.1
+ITEM_COUNT_ALPHA = 1.5
+QUANTITY_ALPHA = 1.3
+MAX_QUANTITY = 100
+
+CLIENT_COMPANY_SHARE = 0.6
+REGON_14_SHARE = 0.1
+PAYMENT_METHODS = ("transfer", "card", "cash")
+PAYMENT_WEIGHTS = (0.7, 0.2, 0.1)
+DUE_DAYS = (7, 14, 14, 30, 30, 60)
+PAID_SHARE_OVERDUE = 0.95
+PAID_SHARE_OPEN = 0.35
+TAX_RATES = (23, 8, 5, 0)
+TAX_RATE_WEIGHTS = (0.75, 0.12, 0.08, 0.05)
+
+FIRST_NAMES = (
+    "Anna", "Maria", "Katarzyna", "Małgorzata", "Agnieszka", "Ewa", "Joanna", "Magdalena",
+    "Piotr", "Krzysztof", "Andrzej", "Tomasz", "Paweł", "Michał", "Marcin", "Łukasz",
+)
+SURNAMES = (
+    "Nowak", "Kowalski", "Wiśniewski", "Wójcik", "Kowalczyk", "Kamiński", "Lewandowski",
+    "Zieliński", "Szymański", "Woźniak", "Dąbrowski", "Kozłowski", "Jankowski", "Mazur",
+)
+COMPANY_WORDS = ("Usługi", "Handel", "Budownictwo", "Transport", "Systemy", "Studio", "Serwis", "Consulting")
+COMPANY_SUFFIXES = ("Sp. z o.o.", "S.A.", "Sp. j.", "s.c.", "")
+PRODUCTS = (
+    ("Usługa programistyczna", "h"),
+    ("Konsultacja", "h"),
+    ("Szkolenie", "h"),
+    ("Licencja", "pcs"),
+    ("Abonament", "pcs"),
+    ("Monitor", "pcs"),
+    ("Laptop", "pcs"),
+    ("Kabel", "pcs"),
+    ("Kawa ziarnista", "kg"),
+    ("Papier", "kg"),
+)
+
+COMPANY_COLUMNS = ("id", "user_id", "name", "nip", "regon", "email", "created_at", "updated_at")
+CLIENT_COLUMNS = (
+    "id", "company_id", "client_company_name", "name", "surname", "nip", "regon", "email", "phone_number",
+    "display_name", "search_document",
+)
+PRODUCT_COLUMNS = (
+    "id", "company_id", "name", "description", "unit_type", "net_price", "tax_rate", "created_at", "search_document",
+)
+INVOICE_COLUMNS = (
+    "id", "company_id", "client_id", "number", "number_sequence", "number_month", "number_year",
+    "issue_date", "due_date", "payment_method", "paid", "note", "total_net", "total_tax", "total_gross",
+    "search_document",
+)
+ITEM_COLUMNS = (
+    "id", "invoice_id", "product_id", "quantity", "net_price", "tax_rate",
+    "net_total", "tax_amount", "gross_total",
+)
+
+
+def _cents(value):
+    return f"{value // 100}.{value % 100:02d}"
+
+
+def _zipf_cum_weights(count, exponent):
+    """Cumulative weights of the ranks 1..count, falling off as rank ** -exponent."""
+    return list(accumulate(rank ** -exponent for rank in range(1, count + 1)))
+
+
+def _day_weight(day, position):
+    weight = (0.2 + position) ** GROWTH_EXPONENT * MONTH_FACTORS[day.month - 1] * WEEKDAY_FACTORS[day.weekday()]
+    if day.day > monthrange(day.year, day.month)[1] - MONTH_END_DAYS:
+        weight *= MONTH_END_FACTOR
+    return weight
+
+
+class DatasetGenerator:
+    """
+    Writes a synthetic dataset for scale testing: companies with their own users,
+    clients, products and invoices over the last `years` years up to `until`.
+    Everything is drawn from one random.Random(seed), so a seed (and `until`)
+    always produces the same rows. Rows are built as tuples and written with
+    copy_rows() (COPY on PostgreSQL). Invoice totals and search documents are
+    computed here, so finish_seed() only rebuilds sequences and rollups.
+    """
+
+    def __init__(self, companies, clients, products, invoices, seed=0, until=None, years=3, max_items=50,
+                 batch_size=GENERATE_BATCH_SIZE):
+        self.rng = random.Random(seed)
+        self.seed = seed
+        self.company_count = companies
+        self.client_count = clients
+        self.product_count = products
+        self.invoice_count = invoices
+        self.max_items = max_items
+        self.batch_size = batch_size
+        self.until = until or date.today()
+
+        start = date(self.until.year - years, self.until.month, 1)
+        self.created_at = datetime.combine(start, dt_time(8), tzinfo=dt_timezone.utc)
+        self.days = [start + timedelta(days) for days in range((self.until - start).days + 1)]
+        self.day_weights = list(accumulate(
+            _day_weight(day, position / len(self.days)) for position, day in enumerate(self.days)
+        ))
+        self.stats = {}
+
+    def run(self):
+        """Returns (LoadStats per model label, seconds of the finishing steps)."""
+        with transaction.atomic():
+            companies = self._companies()
+            invoice_counts = self._split(self.invoice_count, _zipf_cum_weights(len(companies), COMPANY_ZIPF))
+            for company_id, invoice_count in zip(companies, invoice_counts):
+                clients = self._clients(company_id)
+                products = self._products(company_id)
+                self._invoices(company_id, clients, products, invoice_count)
+            timings = finish_seed(companies, totals=False, search_documents=False)
+            for model in SEARCHABLE_MODELS:
+                search_documents_changed(model)
+
+        if connection.vendor == "postgresql":
+            # Fresh planner statistics, autovacuum would only catch up later
+            started = time.perf_counter()
+            with connection.cursor() as cursor:
+                for model in (Company, Client, Product, Invoice, InvoiceItem):
+                    cursor.execute(f"ANALYZE {connection.ops.quote_name(model._meta.db_table)}")
+            timings["analyze"] = time.perf_counter() - started
+        return list(self.stats.values()), timings
+
+    def _record(self, model, rows, seconds):
+        label = model._meta.label_lower
+        stats = self.stats.setdefault(label, LoadStats(label))
+        stats.rows += rows
+        stats.seconds += seconds
+
+    def _uuid(self, moment):
+        """A time-ordered key like the ones UUIDModel creates, of the row's creation time."""
+        return str(uuid7_at(moment, self.rng.getrandbits))
+
+    @staticmethod
+    def _split(total, cum_weights):
+        """Splits total proportionally to the weights, the remainder goes to the first ranks."""
+        counts = [int(total * (weight - previous) / cum_weights[-1])
+                  for previous, weight in zip([0] + cum_weights, cum_weights)]
+        for rank in range(total - sum(counts)):
+            counts[rank % len(counts)] += 1
+        return counts
+
+    def _company_name(self):
+        rng = self.rng
+        return f"{rng.choice(COMPANY_WORDS)} {rng.choice(SURNAMES)} {rng.choice(COMPANY_SUFFIXES)}".strip()
+
+    def _regon(self):
+        weights = REGON_14_WEIGHTS if self.rng.random() < REGON_14_SHARE else REGON_9_WEIGHTS
+        return random_identifier(self.rng, weights)
+
+    def _companies(self):
+        """Creates one user per company, returns the company ids."""
+        started = time.perf_counter()
+        password = f"{UNUSABLE_PASSWORD_PREFIX}generated-{self.seed}"
+        # bulk_create() because the users' auto-increment ids are needed
+        users = User.objects.bulk_create([
+            User(email=f"firma{number}.{self.seed}@example.com", password=password)
+            for number in range(1, self.company_count + 1)
+        ], batch_size=self.batch_size)
+        self._record(User, len(users), time.perf_counter() - started)
+
+        started = time.perf_counter()
+        taken = set(Company.objects.values_list("nip", flat=True))
+        rows = []
+        for number, user in enumerate(users, 1):
+            nip = random_identifier(self.rng, NIP_WEIGHTS)
+            while nip in taken:
+                nip = random_identifier(self.rng, NIP_WEIGHTS)
+            taken.add(nip)
+            rows.append((
+                self._uuid(self.created_at), user.pk, self._company_name(), nip, self._regon(),
+                f"biuro{number}.{self.seed}@example.com", self.created_at, self.created_at,
+            ))
+        copy_rows(Company, COMPANY_COLUMNS, rows, batch_size=self.batch_size)
+        self._record(Company, len(rows), time.perf_counter() - started)
+        return [row[0] for row in rows]
+
+    def _clients(self, company_id):
+        """Writes the clients of the company, returns (id, names for invoice documents) by popularity."""
+        started = time.perf_counter()
+        rng = self.rng
+        rows = []
+        for number in range(1, self.client_count + 1):
+            email = f"klient{number}.{company_id[:8]}@example.com"
+            if rng.random() < CLIENT_COMPANY_SHARE:
+                company_name, name, surname = self._company_name(), "", ""
+                nip, regon, phone = random_identifier(rng, NIP_WEIGHTS), self._regon(), None
+            else:
+                company_name, name, surname = "", rng.choice(FIRST_NAMES), rng.choice(SURNAMES)
+                nip, regon, phone = None, None, f"+48{rng.randrange(5, 9)}{rng.randrange(10 ** 8):08d}"
+            # The same documents as backend.search.build_search_document()
+            names = f"{company_name} {name} {surname}"
+            rows.append((self._uuid(self.created_at), company_id, company_name or None, name or None, surname or None, nip, regon,
+                         email, phone, company_name or f"{name} {surname}", f"{names} {email} {nip or ''}", names))
+        copy_rows(Client, CLIENT_COLUMNS, [row[:-1] for row in rows], batch_size=self.batch_size)
+        self._record(Client, len(rows), time.perf_counter() - started)
+        return [(row[0], row[-1]) for row in rows]
+
+    def _products(self, company_id):
+        """Writes the products of the company, returns (id, net price in cents, tax rate) by popularity."""
+        started = time.perf_counter()
+        rng = self.rng
+        rows, products = [], []
+        for number in range(1, self.product_count + 1):
+            name, unit_type = rng.choice(PRODUCTS)
+            product_id = self._uuid(self.created_at)
+            price = max(int(rng.lognormvariate(8.5, 1.2)), 1)
+            tax_rate = rng.choices(TAX_RATES, TAX_RATE_WEIGHTS)[0]
+            name = f"{name} {number}"
+            rows.append((product_id, company_id, name, "", unit_type, _cents(price), tax_rate, self.created_at,
+                         f"{name} "))
+            products.append((product_id, price, tax_rate))
+        copy_rows(Product, PRODUCT_COLUMNS, rows, batch_size=self.batch_size)
+        self._record(Product, len(rows), time.perf_counter() - started)
+        return products
+
+    def _invoices(self, company_id, clients, products, count):
+        """
+        Writes count invoices with their items. Issue dates are drawn first and
+        numbered in date order, so the numbers of every month run 1, 2, 3...
+        """
+        rng = self.rng
+        day_counts = Counter()
+        for chunk in chunked(range(count), self.batch_size):
+            day_counts.update(rng.choices(range(len(self.days)), cum_weights=self.day_weights, k=len(chunk)))
+
+        client_weights = _zipf_cum_weights(len(clients), CLIENT_ZIPF)
+        product_weights = _zipf_cum_weights(len(products), PRODUCT_ZIPF)
+        payment_weights = list(accumulate(PAYMENT_WEIGHTS))
+        sequences = Counter()
+        invoices, items = [], []
+        started = time.perf_counter()
+
+        for position in sorted(day_counts):
+            issue_date = self.days[position]
+            period = (issue_date.year, issue_date.month)
+            for client_id, client_names in rng.choices(clients, cum_weights=client_weights, k=day_counts[position]):
+                invoice_id = self._uuid(issue_date)
+                item_count = min(int(rng.paretovariate(ITEM_COUNT_ALPHA)), self.max_items)
+                total_net = total_tax = 0
+                for product_id, price, tax_rate in rng.choices(products, cum_weights=product_weights, k=item_count):
+                    quantity = min(int(rng.paretovariate(QUANTITY_ALPHA)), MAX_QUANTITY)
+                    net = quantity * price
+                    # Integer cents, the same half-up rounding as InvoiceItem.calculate_totals()
+                    tax = (net * tax_rate + 50) // 100
+                    total_net += net
+                    total_tax += tax
+                    items.append((self._uuid(issue_date), invoice_id, product_id, quantity, _cents(price), tax_rate,
+                                  _cents(net), _cents(tax), _cents(net + tax)))
+
+                payment_method = rng.choices(PAYMENT_METHODS, cum_weights=payment_weights)[0]
+                if payment_method == "cash":
+                    due_date, paid = issue_date, True
+                else:
+                    due_date = issue_date + timedelta(rng.choice(DUE_DAYS))
+                    paid = rng.random() < (PAID_SHARE_OVERDUE if due_date < self.until else PAID_SHARE_OPEN)
+
+                sequences[period] += 1
+                sequence = sequences[period]
+                number = Invoice.format_number(sequence, issue_date.month, issue_date.year)
+                invoices.append((
+                    invoice_id, company_id, client_id, number,
+                    sequence, issue_date.month, issue_date.year, issue_date, due_date, payment_method, paid, "",
+                    _cents(total_net), _cents(total_tax), _cents(total_net + total_tax), f"{number} {client_names}",
+                ))
+                if len(invoices) == self.batch_size:
+                    self._flush(invoices, items, started)
+                    invoices, items = [], []
+                    started = time.perf_counter()
+        self._flush(invoices, items, started)
+
+    def _flush(self, invoices, items, started):
+        copy_rows(Invoice, INVOICE_COLUMNS, invoices, batch_size=self.batch_size)
+        copy_rows(InvoiceItem, ITEM_COLUMNS, items, batch_size=self.batch_size)
+        # Generating is part of the cost, the batch time is shared by row count
+        seconds = time.perf_counter() - started
+        rows = len(invoices) + len(items)
+        if rows:
+            self._record(Invoice, len(invoices), seconds * len(invoices) / rows)
+            self._record(InvoiceItem, len(items), seconds * len(items) / rows)
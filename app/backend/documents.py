@@ -0,0 +1,160 @@
+from dataclasses import dataclass
+from decimal import Decimal
+from itertools import accumulate, groupby, pairwise
+from operator import itemgetter
+
+from django.http import Http404
+
+from .models import Invoice, Product
+
+DOCUMENT_CHUNK_SIZE = 2000
+
+PAYMENT_METHODS = dict(Invoice.PAYMENT_METHODS)
+UNIT_TYPES = dict(Product.UNIT_CHOICES)
+
+
+@dataclass(frozen=True)
+class SellerDocument:
+    user_id: int
+    name: str
+    nip: str
+    regon: str
+    email: str
+
+
+@dataclass(frozen=True)
+class BuyerDocument:
+    id: object
+    display_name: str
+    client_company_name: str | None
+    name: str | None
+    surname: str | None
+    nip: str | None
+    regon: str | None
+    email: str | None
+
+    def __str__(self):
+        return self.display_name
+
+
+@dataclass(frozen=True)
+class LineDocument:
+    id: object
+    quantity: Decimal
+    net_price: Decimal | None
+    tax_rate: Decimal | None
+    net_total: Decimal
+    tax_amount: Decimal
+    gross_total: Decimal
+    product_name: str
+    unit_type: str
+
+    @property
+    def unit_type_display(self):
+        return UNIT_TYPES.get(self.unit_type, self.unit_type)
+
+
+@dataclass(frozen=True)
+class InvoiceDocument:
+    """
+    Everything the invoice pages and the PDF show, read in one query. Immutable,
+    so the same document can be rendered, hashed for the PDF cache and handed
+    to the renderer without touching the database again.
+    """
+    id: object
+    number: str
+    issue_date: object
+    due_date: object
+    payment_method: str
+    paid: bool
+    note: str
+    total_net: Decimal
+    total_tax: Decimal
+    total_gross: Decimal
+    company: SellerDocument
+    client: BuyerDocument | None
+    items: tuple
+
+    @property
+    def payment_method_display(self):
+        return PAYMENT_METHODS.get(self.payment_method, self.payment_method)
+
+
+# values_list() prefix and fields of each part of a joined row, in row order:
+# invoice, seller, buyer, line, product
+_PARTS = (
+    ("", (
+        "id", "number", "issue_date", "due_date", "payment_method", "paid", "note",
+        "total_net", "total_tax", "total_gross",
+    )),
+    ("company__", ("user", "name", "nip", "regon", "email")),
+    ("client__", ("id", "display_name", "client_company_name", "name", "surname", "nip", "regon", "email")),
+    ("items__", ("id", "quantity", "net_price", "tax_rate", "net_total", "tax_amount", "gross_total")),
+    ("items__product__", ("name", "unit_type")),
+)
+_COLUMNS = [prefix + name for prefix, fields in _PARTS for name in fields]
+_OFFSETS = list(accumulate((len(fields) for _, fields in _PARTS), initial=0))
+_INVOICE, _SELLER, _BUYER, _LINE, _PRODUCT = (slice(*bounds) for bounds in pairwise(_OFFSETS))
+
+
+def _build_document(rows):
+    """One document from the joined rows of an invoice, one row per line (a single one without lines)."""
+    first = rows[0]
+    buyer = first[_BUYER]
+    items = tuple(
+        LineDocument(*row[_LINE], *row[_PRODUCT])
+        for row in rows if row[_LINE.start] is not None
+    )
+    return InvoiceDocument(
+        *first[_INVOICE],
+        company=SellerDocument(*first[_SELLER]),
+        client=BuyerDocument(*buyer) if buyer[0] is not None else None,
+        items=items,
+    )
+
+
+def _document_rows(invoices):
+    # pk keeps the rows of an invoice together. items__pk puts the lines in the order they
+    # were added (the keys are time-ordered) and keeps the PDF cache key stable.
+    return invoices.order_by(*invoices.query.order_by, "pk", "items__pk").values_list(*_COLUMNS)
+
+
+def _build_documents(rows):
+    for _, invoice_rows in groupby(rows, key=itemgetter(0)):
+        yield _build_document(list(invoice_rows))
+
+
+def invoice_documents(invoices, chunk_size=DOCUMENT_CHUNK_SIZE):
+    """
+    Yields an InvoiceDocument for every invoice of the queryset, in its order.
+    Invoices, companies, clients, lines and products are streamed from a single
+    LEFT JOIN query, whatever the number of invoices and lines.
+    """
+    return _build_documents(_document_rows(invoices).iterator(chunk_size=chunk_size))
+
+
+def get_invoice_document(invoices, pk):
+    """The document of the invoice pk of the queryset, raises Invoice.DoesNotExist if it has none."""
+    documents = list(_build_documents(_document_rows(invoices.filter(pk=pk))))
+    if not documents:
+        raise Invoice.DoesNotExist(f"No invoice {pk} in the queryset.")
+    return documents[0]
+
+
+class InvoiceDocumentMixin:
+    """
+    For invoice DetailViews: the object is the InvoiceDocument of one of the
+    user's invoices and its lines are in the items context variable.
+    """
+
+    def get_object(self, queryset=None):
+        invoices = Invoice.objects.filter(company__user=self.request.user)
+        try:
+            return get_invoice_document(invoices, self.kwargs[self.pk_url_kwarg])
+        except Invoice.DoesNotExist:
+            raise Http404("Nie znaleziono faktury.")
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        context['items'] = self.object.items
+        return context
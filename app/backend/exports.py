@@ -0,0 +1,183 @@
+import csv
+import io
+import re
+import zipfile
+from datetime import date, datetime
+from decimal import Decimal
+from xml.sax.saxutils import escape
+
+EXPORT_CHUNK_SIZE = 2000
+
+# Columns of every exportable list: (header, field of values_list())
+EXPORT_COLUMNS = {
+    "invoices": [
+        ("Numer", "number"),
+        ("Klient", "client__display_name"),
+        ("Data wystawienia", "issue_date"),
+        ("Termin płatności", "due_date"),
+        ("Metoda płatności", "payment_method"),
+        ("Opłacona", "paid"),
+        ("Netto", "total_net"),
+        ("VAT", "total_tax"),
+        ("Brutto", "total_gross"),
+    ],
+    "clients": [
+        ("Nazwa", "display_name"),
+        ("NIP", "nip"),
+        ("REGON", "regon"),
+        ("Email", "email"),
+        ("Telefon", "phone_number"),
+    ],
+    "products": [
+        ("Nazwa", "name"),
+        ("Opis", "description"),
+        ("Jednostka", "unit_type"),
+        ("Cena netto", "net_price"),
+        ("VAT %", "tax_rate"),
+    ],
+}
+
+
+def export_rows(kind, queryset):
+    """Yields the export columns of the queryset as tuples, fetched from the database in chunks."""
+    fields = [field for _, field in EXPORT_COLUMNS[kind]]
+    return queryset.values_list(*fields).iterator(chunk_size=EXPORT_CHUNK_SIZE)
+
+
+def _format(value):
+    if value is None:
+        return ""
+    if isinstance(value, bool):
+        return "Tak" if value else "Nie"
+    return value
+
+
+class _Echo:
+    """File-like object that returns what is written, for csv.writer."""
+
+    def write(self, value):
+        return value
+
+
+def stream_csv(kind, queryset):
+    writer = csv.writer(_Echo(), delimiter=";")
+    # BOM so Excel opens UTF-8 files with Polish characters correctly
+    yield "\ufeff" + writer.writerow([header for header, _ in EXPORT_COLUMNS[kind]])
+
+    lines = []
+    for row in export_rows(kind, queryset):
+        lines.append(writer.writerow([_format(value) for value in row]))
+        if len(lines) == EXPORT_CHUNK_SIZE:
+            yield "".join(lines)
+            lines = []
+    yield "".join(lines)
+
+
+class StreamingZipBuffer(io.RawIOBase):
+    """
+    Unseekable write-only file for ZipFile. ZipFile then writes data descriptors
+    and never seeks back, so the archive can be sent while it is being written.
+    """
+
+    def __init__(self):
+        self._chunks = []
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        self._chunks.append(bytes(data))
+        return len(data)
+
+    def pop(self):
+        data = b"".join(self._chunks)
+        self._chunks = []
+        return data
+
+
+XLSX_STATIC_PARTS = {
+    "[Content_Types].xml": (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+        '<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+        '<Default Extension="xml" ContentType="application/xml"/>'
+        '<Override PartName="/xl/workbook.xml" '
+        'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet.main+xml"/>'
+        '<Override PartName="/xl/worksheets/sheet1.xml" '
+        'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.worksheet+xml"/>'
+        '</Types>'
+    ),
+    "_rels/.rels": (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+        '<Relationship Id="rId1" '
+        'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/officeDocument" '
+        'Target="xl/workbook.xml"/>'
+        '</Relationships>'
+    ),
+    "xl/_rels/workbook.xml.rels": (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+        '<Relationship Id="rId1" '
+        'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/worksheet" '
+        'Target="worksheets/sheet1.xml"/>'
+        '</Relationships>'
+    ),
+}
+
+
+# Control characters are not allowed in XML 1.0 documents
+_XML_INVALID_CHARS = re.compile('[\x00-\x08\x0b\x0c\x0e-\x1f]')
+
+
+def _xlsx_workbook(sheet_name):
+    return (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<workbook xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main" '
+        'xmlns:r="http://schemas.openxmlformats.org/officeDocument/2006/relationships">'
+        f'<sheets><sheet name="{escape(sheet_name)}" sheetId="1" r:id="rId1"/></sheets>'
+        '</workbook>'
+    )
+
+
+def _xlsx_cell(value):
+    value = _format(value)
+    if isinstance(value, (int, float, Decimal)):
+        return f"<c><v>{value}</v></c>"
+    if isinstance(value, (date, datetime)):
+        value = value.isoformat()
+    value = _XML_INVALID_CHARS.sub("", str(value))
+    return f'<c t="inlineStr"><is><t xml:space="preserve">{escape(value)}</t></is></c>'
+
+
+def _xlsx_row(values):
+    return "<row>" + "".join(_xlsx_cell(value) for value in values) + "</row>"
+
+
+def stream_xlsx(kind, queryset, sheet_name="Eksport"):
+    """
+    Yields an XLSX workbook with a single sheet. Cells are inline strings and
+    numbers, so no shared string table has to be kept in memory.
+    """
+    buffer = StreamingZipBuffer()
+    with zipfile.ZipFile(buffer, "w", zipfile.ZIP_DEFLATED) as archive:
+        for name, content in XLSX_STATIC_PARTS.items():
+            archive.writestr(name, content)
+        archive.writestr("xl/workbook.xml", _xlsx_workbook(sheet_name))
+
+        with archive.open("xl/worksheets/sheet1.xml", "w", force_zip64=True) as sheet:
+            sheet.write((
+                '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+                '<worksheet xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main"><sheetData>'
+                + _xlsx_row([header for header, _ in EXPORT_COLUMNS[kind]])
+            ).encode())
+
+            rows = []
+            for row in export_rows(kind, queryset):
+                rows.append(_xlsx_row(row))
+                if len(rows) == EXPORT_CHUNK_SIZE:
+                    sheet.write("".join(rows).encode())
+                    rows = []
+                    yield buffer.pop()
+            sheet.write(("".join(rows) + "</sheetData></worksheet>").encode())
+    yield buffer.pop()
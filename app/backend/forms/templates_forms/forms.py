@@ -6,9 +6,10 @@ from django import forms
 from django.core import validators
 from django.contrib.auth.forms import UserCreationForm, AuthenticationForm
 from django.core.exceptions import ValidationError
-from django.forms.models import inlineformset_factory
+from django.forms.models import inlineformset_factory, BaseInlineFormSet
 
-from ...models import User, Product, Client, Invoice, Company, InvoiceItem
+from ...models import User, Product, Client, Invoice, Company, InvoiceItem, \
+    InvoiceNumberSequence
 from phonenumber_field.formfields import PhoneNumberField
 from phonenumber_field.widgets import PhoneNumberPrefixWidget
 
@@ -227,24 +228,9 @@ class InvoiceForm(forms.ModelForm):
                 attrs={'class': 'checkbox checkbox-primary '}),
         }
 
-    def __init__(self, *args, **kwargs):
+    def __init__(self, *args, company=None, **kwargs):
         super().__init__(*args, **kwargs)
-
-        today = datetime.today()
-        current_month_invoices = Invoice.objects.filter(
-            issue_date__year=today.year,
-            issue_date__month=today.month,
-        ).order_by('-number')
-
-        if current_month_invoices.exists():
-            last_invoice = current_month_invoices.first()
-            last_number = int(last_invoice.number.split('/')[0])
-            new_number = last_number + 1
-        else:
-            new_number = 1
-
-        generated_number = f"{new_number}/{today.month}/{today.year}"
-        self.fields['number'].initial = generated_number
+        self.company = company
 
         issue_date = self.data.get('issue_date')
         if issue_date:
@@ -255,6 +241,22 @@ class InvoiceForm(forms.ModelForm):
         self.fields['issue_date'].initial = issue_date
         self.fields['due_date'].initial = issue_date + timedelta(days=14)
 
+        if company and not self.is_bound:
+            next_number = InvoiceNumberSequence.peek_next_number(
+                company.pk, issue_date.year, issue_date.month
+            )
+            self.fields['number'].initial = Invoice.format_number(
+                next_number, issue_date.month, issue_date.year
+            )
+
+    def clean_number(self):
+        number = self.cleaned_data.get('number')
+        if self.company and Invoice.objects.filter(
+            company=self.company, number=number
+        ).exclude(pk=self.instance.pk).exists():
+            raise forms.ValidationError("Faktura o tym numerze już istnieje.")
+        return number
+
 
 class InvoiceItemForm(forms.ModelForm):
     def __init__(self, *args, **kwargs):
@@ -275,10 +277,21 @@ class InvoiceItemForm(forms.ModelForm):
         }
 
 
+class BaseInvoiceItemFormSet(BaseInlineFormSet):
+    def save(self, commit=True):
+        """Saves all items in bulk instead of calling InvoiceItem.save() per row."""
+        items = super().save(commit=False)
+        if not commit:
+            return items
+
+        return self.instance.save_items(items, deleted_items=self.deleted_objects)
+
+
 InvoiceItemFormSet = inlineformset_factory(
     Invoice,
     InvoiceItem,
     form=InvoiceItemForm,
+    formset=BaseInvoiceItemFormSet,
     extra=0,
     can_delete=True,
     validate_min=True,
@@ -318,3 +331,31 @@ class CompanyForm(forms.ModelForm):
                 'placeholder': 'Adres e-mail'
             }),
         }
+
+
+class ImportForm(forms.Form):
+    KIND_CHOICES = [
+        ('clients', 'Klienci'),
+        ('products', 'Produkty'),
+        ('invoices', 'Faktury'),
+    ]
+
+    kind = forms.ChoiceField(
+        choices=KIND_CHOICES,
+        label='Rodzaj danych',
+        widget=forms.Select(attrs={'class': 'select select-bordered w-full mt-2'}),
+    )
+    file = forms.FileField(
+        label='Plik CSV lub JSON',
+        widget=forms.ClearableFileInput(attrs={'class': 'file-input file-input-bordered w-full mt-2'}),
+    )
+
+    def clean_file(self):
+        file = self.cleaned_data['file']
+        if not file.name.lower().endswith(('.csv', '.json')):
+            raise ValidationError("Obsługiwane są tylko pliki .csv i .json.")
+        return file
+
+    @property
+    def file_format(self):
+        return 'json' if self.cleaned_data['file'].name.lower().endswith('.json') else 'csv'
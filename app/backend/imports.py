@@ -0,0 +1,467 @@
+import csv
+import functools
+import io
+import json
+import time
+from collections import defaultdict
+from dataclasses import dataclass, field
+from decimal import Decimal
+
+from django.core.exceptions import ValidationError
+from django.db import DatabaseError, connections, models, router, transaction
+from django.utils import timezone
+
+from .bulk import bulk_insert, chunked, copy_rows
+from .dashboard import invalidate_dashboard_stats
+from .models import Client, ClientSales, Invoice, InvoiceItem, InvoiceNumberSequence, MonthlyRevenue, \
+    Product, ProductSales, parse_invoice_number, sales_periods
+from .search import build_values_search_document, search_documents_changed, update_search_documents
+from .validators import NIP_MESSAGES, REGON_MESSAGES, nip_error_codes, regon_error_codes, validate_nip, \
+    validate_regon
+
+IMPORT_BATCH_SIZE = 1000
+# Above this many touched clients and products the rollups are rebuilt instead of refreshed
+ROLLUP_REFRESH_LIMIT = 500
+
+# Columns read from every row, other columns are ignored
+IMPORT_FIELDS = {
+    "clients": ["client_company_name", "name", "surname", "nip", "regon", "email", "phone_number"],
+    "products": ["name", "description", "unit_type", "net_price", "tax_rate"],
+    "invoices": ["number", "issue_date", "due_date", "payment_method", "paid", "note"],
+}
+# Columns of one invoice item, given per CSV row or in the "items" list of a JSON invoice
+INVOICE_ITEM_FIELDS = ["quantity", "net_price"]
+
+BOOLEAN_VALUES = {"tak": True, "nie": False}
+PLAIN_TEXT_FIELDS = (models.CharField, models.TextField, models.EmailField)
+
+# Columns checked for a whole batch at once instead of per row by their field validator:
+# field name -> (field validator it replaces, batch function returning error codes, messages)
+BATCH_VALIDATED_FIELDS = {
+    "clients": {
+        "nip": (validate_nip, nip_error_codes, NIP_MESSAGES),
+        "regon": (validate_regon, regon_error_codes, REGON_MESSAGES),
+    },
+}
+
+
+@dataclass
+class ImportResult:
+    kind: str
+    created: int = 0
+    errors: list = field(default_factory=list)
+    seconds: float = 0.0
+
+    @property
+    def rows_per_second(self):
+        return self.created / self.seconds if self.seconds else 0
+
+    def add_error(self, row, message):
+        self.errors.append((row, message))
+
+
+def read_rows(file, file_format):
+    """
+    Yields (row number, dict) from an uploaded CSV or JSON file.
+    CSV files may use ',' or ';' as delimiter, JSON files hold a list of objects.
+    """
+    if file_format == "json":
+        data = json.load(file)
+        if not isinstance(data, list):
+            raise ValueError("Plik JSON musi zawierać listę obiektów.")
+        yield from enumerate(data, start=1)
+        return
+
+    text = io.TextIOWrapper(file, encoding="utf-8-sig", newline="")
+    sample = text.read(4096)
+    text.seek(0)
+    try:
+        dialect = csv.Sniffer().sniff(sample, delimiters=",;")
+    except csv.Error:
+        dialect = csv.excel
+    # The header is line 1, so the first data row is row 2
+    yield from enumerate(csv.DictReader(text, dialect=dialect), start=2)
+
+
+def _format_error(error):
+    if hasattr(error, "message_dict"):
+        return "; ".join(f"{name}: {' '.join(messages)}" for name, messages in error.message_dict.items())
+    return " ".join(error.messages)
+
+
+def _clean_value(model_field, value):
+    """Normalizes a raw CSV/JSON value before Model.clean_fields() converts it."""
+    if isinstance(value, str):
+        value = value.strip()
+        if value == "":
+            return None if model_field.null else ""
+        if isinstance(model_field, models.DecimalField):
+            return value.replace(",", ".").replace(" ", "")
+        if isinstance(model_field, models.BooleanField):
+            return BOOLEAN_VALUES.get(value.lower(), value)
+    if value is None and not model_field.null:
+        return ""
+    return value
+
+
+def _clean_field(model_field, value, checked_validator, error):
+    """
+    Field.clean() with one validator replaced by the result of a batch check,
+    error is its message or None. Errors are collected like Field.run_validators().
+    """
+    value = model_field.to_python(value)
+    model_field.validate(value, None)
+    errors = []
+    for validator in model_field.validators:
+        if validator is checked_validator:
+            if error:
+                errors.append(ValidationError(error))
+            continue
+        try:
+            validator(value)
+        except ValidationError as e:
+            if hasattr(e, "code") and e.code in model_field.error_messages:
+                e.message = model_field.error_messages[e.code]
+            errors.extend(e.error_list)
+    if errors:
+        raise ValidationError(errors)
+    return value
+
+
+def _clean_row(model, row, fields, checked=None):
+    """
+    The row's values of fields by name, each validated with Field.clean() like
+    Model.clean_fields() would. checked maps field names to (validator, error)
+    pairs of validators already run for the whole batch.
+    """
+    checked = checked or {}
+    values, errors = {}, {}
+    for model_field in _model_fields(model, fields):
+        name = model_field.name
+        if name not in row:
+            continue
+        value = _clean_value(model_field, row[name])
+        if model_field.blank and value in model_field.empty_values:
+            values[name] = value
+            continue
+        try:
+            if name in checked:
+                values[name] = _clean_field(model_field, value, *checked[name])
+            else:
+                values[name] = model_field.clean(value, None)
+        except ValidationError as e:
+            errors[name] = e.error_list
+    if errors:
+        raise ValidationError(errors)
+    return values
+
+
+def _build(model, row, fields, checked=None, **values):
+    """
+    Creates an unsaved instance from the row's values cleaned by _clean_row().
+    Relations are set by the caller and not validated, ForeignKey.validate() would
+    query the database.
+    """
+    return model(**_clean_row(model, row, fields, checked), **values)
+
+
+def _insert_values(model, rows, **fixed):
+    """
+    Writes rows of cleaned values (from _clean_row()) with copy_rows() without
+    building instances, whose __init__ costs more than validating the row. fixed
+    holds the values of every row by attname (the company_id). Missing fields get
+    their default, auto_now_add the current time. Values are prepared with
+    get_db_prep_save() like bulk_insert() does, fixed ones once per batch.
+    """
+    connection = connections[router.db_for_write(model)]
+    fields = [field for field in model._meta.concrete_fields if not field.generated]
+    now = timezone.now()
+    prepared = {
+        field.attname: field.get_db_prep_save(fixed[field.attname], connection)
+        for field in fields if field.attname in fixed
+    }
+    prepared.update({
+        field.attname: field.get_db_prep_save(now, connection)
+        for field in fields if getattr(field, "auto_now_add", False) or getattr(field, "auto_now", False)
+    })
+
+    # Cleaned text is the string that is written, preparing it would only call str() again
+    # (subclasses like PhoneNumberField are prepared, their Python values are objects)
+    plain = {field.name for field in fields if type(field) in PLAIN_TEXT_FIELDS}
+
+    def prepare(values):
+        return [
+            prepared[field.attname] if field.attname in prepared
+            else values[field.name] if field.name in plain and field.name in values
+            else field.get_db_prep_save(values[field.name], connection) if field.name in values
+            # Callable defaults (the uuid7 keys) are generated per row
+            else field.get_default()
+            for field in fields
+        ]
+
+    return copy_rows(model, [field.attname for field in fields], map(prepare, rows))
+
+
+@functools.cache
+def _model_fields_cached(model, fields):
+    return [model._meta.get_field(name) for name in fields]
+
+
+def _model_fields(model, fields):
+    return _model_fields_cached(model, tuple(fields))
+
+
+def _name_key(value):
+    return " ".join(str(value).split()).casefold()
+
+
+class Importer:
+    """
+    Imports the rows of one kind into a company. Rows are validated in memory,
+    batch_size rows at a time with NIP/REGON checked for the whole batch,
+    references are resolved with dictionaries loaded once and valid rows are
+    written with COPY, one transaction per batch. Clients and products are
+    written as plain values (_insert_values()), invoices and their items with
+    bulk_insert(). Invalid rows are reported in the result and skipped.
+    """
+
+    def __init__(self, company, kind, batch_size=IMPORT_BATCH_SIZE):
+        if kind not in IMPORT_FIELDS:
+            raise ValueError(f"Unknown import kind: {kind}")
+        self.company = company
+        self.kind = kind
+        self.batch_size = batch_size
+        self.result = ImportResult(kind)
+        # Months, clients and products of the written invoices, their rollups are refreshed at the end
+        self.touched_dates = set()
+        self.touched_clients = set()
+        self.touched_products = set()
+
+    def run(self, rows):
+        started = time.perf_counter()
+        if self.kind == "invoices":
+            self._load_references()
+            rows = self._group_invoice_rows(rows)
+
+        for chunk in chunked(rows, self.batch_size):
+            batch = []
+            for (row_number, row), checked in zip(chunk, self._check_batch(chunk)):
+                try:
+                    batch.append((row_number, self.build(row, checked)))
+                except ValidationError as e:
+                    self.result.add_error(row_number, _format_error(e))
+                except (TypeError, ValueError, AttributeError) as e:
+                    self.result.add_error(row_number, f"Nieprawidłowy wiersz: {e}")
+            self._flush(batch)
+
+        self._finish()
+        self.result.seconds = time.perf_counter() - started
+        return self.result
+
+    def build(self, row, checked=None):
+        if self.kind == "invoices":
+            return self._build_invoice(row)
+        model = Client if self.kind == "clients" else Product
+        return _clean_row(model, row, IMPORT_FIELDS[self.kind], checked)
+
+    def _check_batch(self, chunk):
+        """
+        Runs the batch validators over the chunk's identifier columns. Returns the
+        checked (validator, error) pairs of every row, values that are empty or not
+        strings are left to the field validators.
+        """
+        checked = [{} for _ in chunk]
+        for name, (validator, error_codes, messages) in BATCH_VALIDATED_FIELDS.get(self.kind, {}).items():
+            indexes, values = [], []
+            for index, (_, row) in enumerate(chunk):
+                value = row.get(name) if isinstance(row, dict) else None
+                if isinstance(value, str) and value.strip():
+                    indexes.append(index)
+                    values.append(value.strip())
+            for index, code in zip(indexes, error_codes(values)):
+                checked[index][name] = (validator, messages.get(code))
+        return checked
+
+    def _flush(self, batch):
+        if not batch:
+            return
+        try:
+            with transaction.atomic():
+                if self.kind == "invoices":
+                    self._insert_invoices([obj for _, obj in batch])
+                else:
+                    model = Client if self.kind == "clients" else Product
+                    rows = [values for _, values in batch]
+                    for values in rows:
+                        if model is Client:
+                            values["display_name"] = Client.build_display_name(
+                                *(values.get(name) for name in Client.DISPLAY_NAME_FIELDS)
+                            )
+                        values["search_document"] = build_values_search_document(model, values)
+                    _insert_values(model, rows, company_id=self.company.pk)
+                    search_documents_changed(model)
+        except DatabaseError as e:
+            first, last = batch[0][0], batch[-1][0]
+            self.result.add_error(first, f"Wiersze {first}-{last} nie zostały zapisane: {e}")
+            return
+        self.result.created += len(batch)
+
+    def _finish(self):
+        """
+        Rollups and sequences are not maintained by bulk inserts, bring them up to date
+        once. Small imports refresh only the months, clients and products they touched,
+        large ones rebuild the company's rollups with a few grouped aggregates.
+        """
+        company_id = self.company.pk
+        if self.kind == "invoices" and self.result.created:
+            companies = [self.company]
+            InvoiceNumberSequence.sync_from_invoices(companies)
+            if len(self.touched_clients) + len(self.touched_products) > ROLLUP_REFRESH_LIMIT:
+                MonthlyRevenue.rebuild(companies)
+                ClientSales.rebuild(companies)
+                ProductSales.rebuild(companies)
+            else:
+                for year, month in sorted({(d.year, d.month) for d in self.touched_dates}):
+                    MonthlyRevenue.refresh(company_id, year, month)
+                periods = {period for d in self.touched_dates for period in sales_periods(d)}
+                ClientSales.refresh(company_id, self.touched_clients, periods)
+                ProductSales.refresh(company_id, self.touched_products, periods)
+        invalidate_dashboard_stats(company_id)
+
+    # Invoices
+
+    def _load_references(self):
+        """Loads plain tuples instead of instances, the company may have tens of thousands of rows."""
+        # Client id by NIP, email and display name
+        self.clients = {}
+        clients = Client.objects.filter(company=self.company).values_list("id", "nip", "email", "display_name")
+        for client_id, nip, email, display_name in clients:
+            for key in (nip, email, display_name):
+                if key:
+                    self.clients.setdefault(_name_key(key), client_id)
+        # (id, net price, tax rate) by product name
+        self.products = {}
+        products = Product.objects.filter(company=self.company).values_list("name", "id", "net_price", "tax_rate")
+        for name, *product in products:
+            self.products.setdefault(_name_key(name), product)
+        self.numbers = set(Invoice.objects.filter(company=self.company).values_list("number", flat=True))
+
+    @staticmethod
+    def _group_invoice_rows(rows):
+        """
+        Yields one (row number, invoice dict) per invoice. Consecutive CSV rows with
+        the same number are items of one invoice, JSON invoices may list their items.
+        """
+        current_number, current = None, None
+        for row_number, row in rows:
+            if not isinstance(row, dict) or "items" in row:
+                if current:
+                    yield current
+                current_number, current = None, None
+                yield row_number, row
+                continue
+
+            number = (row.get("number") or "").strip()
+            item = {name: row.get(name) for name in ["product", *INVOICE_ITEM_FIELDS]}
+            if current and number and number == current_number:
+                current[1]["items"].append(item)
+                continue
+            if current:
+                yield current
+            current_number, current = number, (row_number, {**row, "items": [item]})
+        if current:
+            yield current
+
+    def _build_invoice(self, row):
+        client_id = None
+        client_key = row.get("client")
+        if client_key:
+            client_id = self.clients.get(_name_key(client_key))
+            if client_id is None:
+                raise ValidationError({"client": [f"Nie znaleziono klienta '{client_key}'."]})
+
+        fields = IMPORT_FIELDS["invoices"]
+        if not str(row.get("number") or "").strip():
+            # Numbered from the sequence when the batch is written
+            fields = [name for name in fields if name != "number"]
+        invoice = _build(Invoice, row, fields, company=self.company, client_id=client_id)
+        if invoice.number:
+            if invoice.number in self.numbers:
+                raise ValidationError({"number": ["Faktura o tym numerze już istnieje."]})
+            self.numbers.add(invoice.number)
+
+        items = []
+        for item_row in row.get("items") or []:
+            product = self.products.get(_name_key(item_row.get("product") or ""))
+            if product is None:
+                raise ValidationError({"product": [f"Nie znaleziono produktu '{item_row.get('product')}'."]})
+            product_id, net_price, tax_rate = product
+            item = _build(InvoiceItem, item_row, INVOICE_ITEM_FIELDS, invoice=invoice, product_id=product_id)
+            if item.net_price is None:
+                item.net_price = net_price
+            item.tax_rate = Decimal(tax_rate)
+            item.calculate_totals()
+            items.append(item)
+        if not items:
+            raise ValidationError({"items": ["Faktura musi mieć co najmniej jedną pozycję."]})
+
+        invoice.total_net = sum((item.net_total for item in items), Decimal("0"))
+        invoice.total_tax = sum((item.tax_amount for item in items), Decimal("0"))
+        invoice.total_gross = sum((item.gross_total for item in items), Decimal("0"))
+        invoice._import_items = items
+        return invoice
+
+    def _reserve_numbers(self, year, month, count):
+        """count numbers of the month from the sequence, skipping the ones already in use."""
+        numbers = []
+        while len(numbers) < count:
+            needed = count - len(numbers)
+            first = InvoiceNumberSequence.reserve_numbers(self.company.pk, year, month, needed)
+            for sequence in range(first, first + needed):
+                number = Invoice.format_number(sequence, month, year)
+                if number not in self.numbers:
+                    numbers.append(number)
+        self.numbers.update(numbers)
+        return numbers
+
+    def _insert_invoices(self, invoices):
+        # Numbers given in the file move the sequences forward, as Invoice.save() does
+        highest = {}
+        for invoice in invoices:
+            parsed = parse_invoice_number(invoice.number) if invoice.number else None
+            if parsed:
+                sequence, month, year = parsed
+                highest[(year, month)] = max(sequence, highest.get((year, month), 0))
+        for (year, month), sequence in highest.items():
+            InvoiceNumberSequence.advance_to(self.company.pk, year, month, sequence)
+
+        # Invoices without a number get a block of numbers per month from the sequence
+        unnumbered = defaultdict(list)
+        for invoice in invoices:
+            if not invoice.number:
+                unnumbered[(invoice.issue_date.year, invoice.issue_date.month)].append(invoice)
+        for (year, month), month_invoices in unnumbered.items():
+            for invoice, number in zip(month_invoices, self._reserve_numbers(year, month, len(month_invoices))):
+                invoice.number = number
+
+        for invoice in invoices:
+            invoice.sync_number_parts()
+        bulk_insert(Invoice, invoices)
+        # The documents contain client names, which are only referenced by id here
+        update_search_documents(Invoice.objects.filter(pk__in=[invoice.pk for invoice in invoices]))
+        items = [item for invoice in invoices for item in invoice._import_items]
+        bulk_insert(InvoiceItem, items)
+
+        self.touched_dates.update(invoice.issue_date.replace(day=1) for invoice in invoices)
+        self.touched_clients.update(invoice.client_id for invoice in invoices if invoice.client_id)
+        self.touched_products.update(item.product_id for item in items)
+
+
+def import_file(company, kind, file, file_format, batch_size=IMPORT_BATCH_SIZE):
+    importer = Importer(company, kind, batch_size)
+    try:
+        rows = read_rows(file, file_format)
+        return importer.run(rows)
+    except (ValueError, UnicodeDecodeError, csv.Error) as e:
+        importer.result.add_error(0, f"Nie można odczytać pliku: {e}")
+        return importer.result
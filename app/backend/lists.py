@@ -0,0 +1,101 @@
+from dataclasses import dataclass, field
+
+from django.db.models.functions import Left
+
+from .models import Client, Invoice, InvoiceQuerySet, Product
+from .search import RANKED, search
+
+# Characters of a product description the list rows show (clamped to three lines)
+DESCRIPTION_PREVIEW_LENGTH = 300
+
+
+@dataclass(frozen=True)
+class RowLoader:
+    """
+    Loads the rows of one list kind with a constant number of queries: only the
+    declared columns, the related rows the row template shows joined in, and an
+    ordering taken from the sorts whitelist. ?sort= values map to the columns they
+    order by, anything else falls back to the default.
+
+    columns must include every column a sort orders by, the keyset cursor reads
+    them from the first and last row.
+    """
+    model: type
+    columns: tuple
+    sorts: dict
+    related: tuple = ()
+    annotations: dict = field(default_factory=dict)
+
+    def queryset(self, company):
+        queryset = self.model.objects.filter(company=company)
+        if self.related:
+            queryset = queryset.select_related(*self.related)
+        return queryset.only(*self.columns).annotate(**self.annotations)
+
+    def ordering(self, sort):
+        """The order_by() arguments of a ?sort= value, None if it is not whitelisted."""
+        columns = self.sorts.get((sort or "").lstrip("-"))
+        if columns is None:
+            return None
+        prefix = "-" if sort.startswith("-") else ""
+        return [prefix + column for column in columns]
+
+    def load(self, company, search_query=None, sort=None, default_sort="-id"):
+        """The rows of the company's list, searched and sorted like ?search= and ?sort= ask."""
+        if not company:
+            return self.model.objects.none()
+
+        queryset = self.queryset(company)
+        if search_query:
+            queryset = search(queryset, search_query)
+            default_sort = RANKED
+        ordering = self.ordering(sort) or self.ordering(default_sort) or [default_sort]
+        return queryset.order_by(*ordering)
+
+    def from_request(self, request, default_sort):
+        return self.load(request.company, request.GET.get("search"), request.GET.get("sort"), default_sort)
+
+
+ROW_LOADERS = {
+    "invoices": RowLoader(
+        model=Invoice,
+        columns=(
+            "number", *InvoiceQuerySet.NUMBER_FIELDS, "issue_date", "due_date", "paid", "total_net",
+            "total_gross", "client", "client__display_name",
+        ),
+        related=("client",),
+        sorts={
+            "id": ("id",),
+            "number": tuple(InvoiceQuerySet.NUMBER_FIELDS),
+            "client__name": ("client__display_name",),
+            "issue_date": ("issue_date",),
+            "due_date": ("due_date",),
+            "paid": ("paid",),
+            "total_net": ("total_net",),
+            "total_gross": ("total_gross",),
+        },
+    ),
+    "clients": RowLoader(
+        model=Client,
+        columns=("display_name", "nip", "regon", "email", "phone_number"),
+        sorts={
+            "id": ("id",),
+            "full_name_or_company": ("display_name",),
+            "email": ("email",),
+            "nip": ("nip",),
+        },
+    ),
+    "products": RowLoader(
+        model=Product,
+        columns=("name", "unit_type", "net_price", "tax_rate", "created_at"),
+        annotations={"description_preview": Left("description", DESCRIPTION_PREVIEW_LENGTH)},
+        sorts={
+            "id": ("id",),
+            "name": ("name",),
+            "unit_type": ("unit_type",),
+            "net_price": ("net_price",),
+            "tax_rate": ("tax_rate",),
+            "created_at": ("created_at",),
+        },
+    ),
+}
@@ -0,0 +1,50 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from backend.bulk import chunked
+from backend.models import Client, Company
+from backend.validators import NIP_MESSAGES, REGON_MESSAGES, nip_error_codes, regon_error_codes
+
+AUDIT_CHUNK_SIZE = 10000
+
+
+class Command(BaseCommand):
+    help = "Report companies and clients whose stored NIP or REGON is not valid."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--company", action="append", help="Company id, can be repeated. Defaults to all companies.")
+        parser.add_argument("--fail", action="store_true", help="Exit with an error when invalid identifiers are found.")
+
+    def handle(self, *args, **opts):
+        companies = Company.objects.all()
+        clients = Client.objects.all()
+        if opts["company"]:
+            companies = companies.filter(id__in=opts["company"])
+            clients = clients.filter(company__in=opts["company"])
+
+        sources = [
+            ("Company", companies.values_list("id", "name", "nip", "regon")),
+            ("Client", clients.values_list("id", "client_company_name", "nip", "regon")),
+        ]
+        invalid = 0
+        for label, rows in sources:
+            checked = 0
+            for chunk in chunked(rows.order_by().iterator(chunk_size=AUDIT_CHUNK_SIZE), AUDIT_CHUNK_SIZE):
+                checked += len(chunk)
+                invalid += self._audit(label, chunk)
+            self.stdout.write(f"Checked {checked} {label.lower()} rows.")
+
+        if invalid and opts["fail"]:
+            raise CommandError(f"{invalid} invalid identifiers.")
+        self.stdout.write(self.style.SUCCESS(f"Found {invalid} invalid identifiers."))
+
+    def _audit(self, label, chunk):
+        """Validates the chunk's identifiers with the batch validators, blank ones are allowed."""
+        invalid = 0
+        columns = [(2, "NIP", nip_error_codes, NIP_MESSAGES), (3, "REGON", regon_error_codes, REGON_MESSAGES)]
+        for column, name, error_codes, messages in columns:
+            rows = [row for row in chunk if row[column]]
+            for row, code in zip(rows, error_codes([row[column] for row in rows])):
+                if code:
+                    invalid += 1
+                    self.stdout.write(f"{label} {row[0]} ({row[1]}): {name} '{row[column]}' - {messages[code]}")
+        return invalid
@@ -0,0 +1,100 @@
+import time
+import uuid
+from datetime import datetime, timezone as dt_timezone
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DatabaseError, connection
+
+from backend.bulk import copy_table
+from backend.uuids import uuid7
+
+KEY_KINDS = {
+    "uuid4": uuid.uuid4,
+    "uuid7": uuid7,
+}
+BENCHMARK_TABLE = "uuid_key_benchmark_{kind}"
+# Throughput of the last tenth of the rows, written into the largest index
+TAIL_SHARE = 0.1
+
+
+class Command(BaseCommand):
+    help = (
+        "Insert the same number of rows into a table with uuid4 and one with time-ordered uuid7 "
+        "primary keys and compare the insert throughput and the size of the primary key indexes. "
+        "The tables are dropped afterwards. PostgreSQL only."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--rows", type=int, default=10_000_000)
+        parser.add_argument("--batch-size", type=int, default=100_000, help="Rows per COPY.")
+        parser.add_argument("--keep", action="store_true", help="Keep the benchmark tables.")
+
+    def handle(self, *args, **opts):
+        if connection.vendor != "postgresql":
+            raise CommandError("The key benchmark runs on PostgreSQL only.")
+        if opts["rows"] < 1 or opts["batch_size"] < 1:
+            raise CommandError("--rows and --batch-size must be positive.")
+
+        results = {}
+        try:
+            for kind, generate in KEY_KINDS.items():
+                results[kind] = self._insert(kind, generate, opts["rows"], opts["batch_size"])
+        except DatabaseError as e:
+            raise CommandError(f"Benchmark failed: {e}") from e
+        finally:
+            if not opts["keep"]:
+                with connection.cursor() as cursor:
+                    for kind in KEY_KINDS:
+                        cursor.execute(f"DROP TABLE IF EXISTS {BENCHMARK_TABLE.format(kind=kind)}")
+
+        self.stdout.write(f"{'keys':<6} {'rows/s':>10} {'tail rows/s':>12} {'index MB':>9} {'table MB':>9}")
+        for kind, (rows_per_second, tail_rows_per_second, index_size, table_size) in results.items():
+            self.stdout.write(
+                f"{kind:<6} {rows_per_second:>10.0f} {tail_rows_per_second:>12.0f} "
+                f"{index_size / 2 ** 20:>9.1f} {table_size / 2 ** 20:>9.1f}"
+            )
+        random_keys, ordered_keys = results["uuid4"], results["uuid7"]
+        self.stdout.write(self.style.SUCCESS(
+            f"uuid7: {ordered_keys[0] / random_keys[0]:.2f}x the insert throughput, "
+            f"{ordered_keys[2] / random_keys[2]:.0%} of the index size of uuid4."
+        ))
+
+    def _insert(self, kind, generate, rows, batch_size):
+        """(rows/s, rows/s of the last TAIL_SHARE, primary key index bytes, table bytes)."""
+        table = BENCHMARK_TABLE.format(kind=kind)
+        with connection.cursor() as cursor:
+            cursor.execute(f"DROP TABLE IF EXISTS {table}")
+            # The shape of an invoice item: its key, a parent key and a few numbers
+            cursor.execute(
+                f"CREATE TABLE {table} (id uuid PRIMARY KEY, parent_id uuid NOT NULL, "
+                f"amount numeric(12, 2) NOT NULL, created_at timestamptz NOT NULL)"
+            )
+
+        tail_from = rows - int(rows * TAIL_SHARE)
+        parent_id = uuid.uuid4()
+        seconds = tail_seconds = 0.0
+        inserted = tail_rows = 0
+        while inserted < rows:
+            count = min(batch_size, rows - inserted)
+            # Keys are generated before the clock starts, only writing the rows is measured
+            now = datetime.now(dt_timezone.utc)
+            batch = [(generate(), parent_id, "100.00", now) for _ in range(count)]
+            started = time.perf_counter()
+            copy_table(connection, table, ("id", "parent_id", "amount", "created_at"), batch, batch_size)
+            elapsed = time.perf_counter() - started
+            seconds += elapsed
+            if inserted >= tail_from:
+                tail_seconds += elapsed
+                tail_rows += count
+            inserted += count
+
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "SELECT pg_relation_size(%s::regclass), pg_relation_size(%s::regclass)",
+                [f"{table}_pkey", table],
+            )
+            index_size, table_size = cursor.fetchone()
+        # With a single batch there is no tail to measure separately
+        tail_rate = tail_rows / tail_seconds if tail_rows else rows / seconds
+        self.stdout.write(f"{kind}: {rows} rows in {seconds:.1f}s")
+        return rows / seconds, tail_rate, index_size, table_size
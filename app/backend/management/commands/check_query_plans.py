@@ -0,0 +1,80 @@
+from django.core.exceptions import ValidationError
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DatabaseError, connection, transaction
+from django.db.models import Count
+
+from backend.dataset import DatasetGenerator
+from backend.models import Company
+from backend.query_plans import PLAN_CHECK_MIN_ROWS, explain_workloads, format_plan
+
+
+class Command(BaseCommand):
+    help = (
+        "Explain the queries of the lists, invoice pages and dashboard of a company and fail if one "
+        "reads a large table with a sequential scan. Everything runs in a transaction that is rolled "
+        "back, including the dataset --generate writes. PostgreSQL only."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--company", help="Company id, the one with the most invoices by default.")
+        parser.add_argument(
+            "--generate", action="store_true",
+            help="Check against a generated dataset instead of the existing rows.",
+        )
+        parser.add_argument("--companies", type=int, default=5)
+        parser.add_argument("--clients", type=int, default=2000, help="Clients per company.")
+        parser.add_argument("--products", type=int, default=500, help="Products per company.")
+        parser.add_argument("--invoices", type=int, default=100000)
+        parser.add_argument("--seed", type=int, default=0)
+        parser.add_argument(
+            "--min-rows", type=int, default=PLAN_CHECK_MIN_ROWS,
+            help="Sequential scans of tables with fewer rows are allowed.",
+        )
+
+    def handle(self, *args, **opts):
+        if connection.vendor != "postgresql":
+            raise CommandError("Query plans are only checked on PostgreSQL.")
+
+        try:
+            with transaction.atomic():
+                plans = self._explain(opts)
+                transaction.set_rollback(True)
+        except DatabaseError as e:
+            raise CommandError(f"Could not check the query plans: {e}") from e
+
+        failed = [plan for plan in plans if plan.seq_scans]
+        for plan in plans:
+            status = self.style.ERROR("SEQ SCAN") if plan.seq_scans else self.style.SUCCESS("ok")
+            self.stdout.write(f"{status} {plan.label}")
+            if plan.seq_scans or opts["verbosity"] > 1:
+                self.stdout.write(f"    {plan.sql}")
+                for line in format_plan(plan.plan[0]["Plan"]):
+                    self.stdout.write(f"    {line}")
+
+        if failed:
+            raise CommandError(
+                f"{len(failed)} of {len(plans)} queries scan a large table sequentially: "
+                + ", ".join(plan.label for plan in failed)
+            )
+        self.stdout.write(self.style.SUCCESS(f"All {len(plans)} queries use indexes."))
+
+    def _explain(self, opts):
+        if opts["generate"]:
+            self.stdout.write("Generating the dataset...")
+            DatasetGenerator(
+                opts["companies"], opts["clients"], opts["products"], opts["invoices"], seed=opts["seed"],
+            ).run()
+
+        companies = Company.objects.annotate(invoice_count=Count("invoices")).filter(invoice_count__gt=0)
+        if opts["company"]:
+            try:
+                company = companies.filter(pk=opts["company"]).first()
+            except ValidationError:
+                raise CommandError(f"Invalid company id {opts['company']}.")
+        else:
+            company = companies.order_by("-invoice_count").first()
+        if company is None:
+            raise CommandError("No company with invoices to check, pass --generate.")
+
+        self.stdout.write(f"Checking {company.name} ({company.invoice_count} invoices).")
+        return explain_workloads(company, opts["min_rows"])
@@ -0,0 +1,35 @@
+from datetime import date
+
+from django.core.management.base import BaseCommand, CommandError
+
+from backend.models import Company
+from backend.pdf import invoices_for_export, stream_invoice_pdfs_zip
+
+
+class Command(BaseCommand):
+    help = "Export the PDFs of a company's invoices from a date range into a ZIP archive."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--company", required=True, help="Company id.")
+        parser.add_argument("--from", dest="date_from", required=True, type=date.fromisoformat, help="First issue date, YYYY-MM-DD.")
+        parser.add_argument("--to", dest="date_to", required=True, type=date.fromisoformat, help="Last issue date, YYYY-MM-DD.")
+        parser.add_argument("--output", required=True, help="Path of the ZIP file to write.")
+
+    def handle(self, *args, **opts):
+        try:
+            company = Company.objects.get(id=opts["company"])
+        except (Company.DoesNotExist, ValueError):
+            raise CommandError(f"Company {opts['company']} does not exist.")
+
+        invoices = invoices_for_export(company, opts["date_from"], opts["date_to"])
+        stats = {}
+        with open(opts["output"], "wb") as f:
+            for chunk in stream_invoice_pdfs_zip(invoices, stats):
+                f.write(chunk)
+
+        seconds = stats["seconds"]
+        self.stdout.write(self.style.SUCCESS(
+            f"Exported {stats['count']} PDFs ({stats['rendered']} rendered, "
+            f"{stats['count'] - stats['rendered']} from cache) in {seconds:.2f}s "
+            f"({stats['count'] / seconds if seconds else 0:.1f} PDFs/s) to {opts['output']}."
+        ))
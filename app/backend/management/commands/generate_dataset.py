@@ -0,0 +1,60 @@
+from datetime import date
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DatabaseError
+
+from backend.dataset import GENERATE_BATCH_SIZE, DatasetGenerator
+
+
+class Command(BaseCommand):
+    help = (
+        "Generate a deterministic synthetic dataset for scale testing: companies with clients, "
+        "products and invoices with valid NIP/REGON, skewed issue dates and power-law item counts, "
+        "written with bulk inserts (COPY on PostgreSQL)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--companies", type=int, default=10)
+        parser.add_argument("--clients", type=int, default=1000, help="Clients per company.")
+        parser.add_argument("--products", type=int, default=200, help="Products per company.")
+        parser.add_argument(
+            "--invoices", type=int, default=100000,
+            help="Invoices of all companies, larger companies get a larger share.",
+        )
+        parser.add_argument("--max-items", type=int, default=50, help="Upper bound of items per invoice.")
+        parser.add_argument("--years", type=int, default=3, help="Years of invoice history.")
+        parser.add_argument(
+            "--until", type=date.fromisoformat,
+            help="Last issue date (YYYY-MM-DD), today by default. Part of what the seed reproduces.",
+        )
+        parser.add_argument("--seed", type=int, default=0)
+        parser.add_argument("--batch-size", type=int, default=GENERATE_BATCH_SIZE)
+
+    def handle(self, *args, **opts):
+        for name in ("companies", "clients", "products", "max_items", "years", "batch_size"):
+            if opts[name] < 1:
+                raise CommandError(f"--{name.replace('_', '-')} must be at least 1.")
+        if opts["invoices"] < 0:
+            raise CommandError("--invoices cannot be negative.")
+
+        generator = DatasetGenerator(
+            opts["companies"], opts["clients"], opts["products"], opts["invoices"],
+            seed=opts["seed"], until=opts["until"], years=opts["years"], max_items=opts["max_items"],
+            batch_size=opts["batch_size"],
+        )
+        self.stdout.write(f"Seed {opts['seed']}, invoices until {generator.until.isoformat()}.")
+        try:
+            stats, timings = generator.run()
+        except DatabaseError as e:
+            raise CommandError(f"Could not write the dataset (was this seed generated already?): {e}") from e
+
+        for model_stats in stats:
+            self.stdout.write(
+                f"{model_stats.label}: {model_stats.rows} rows in {model_stats.seconds:.2f}s "
+                f"({model_stats.rows_per_second:.0f} rows/s)"
+            )
+        for label, seconds in timings.items():
+            self.stdout.write(f"{label}: {seconds:.2f}s")
+        total = sum(model_stats.rows for model_stats in stats)
+        seconds = sum(model_stats.seconds for model_stats in stats) + sum(timings.values())
+        self.stdout.write(self.style.SUCCESS(f"Generated {total} rows in {seconds:.2f}s."))
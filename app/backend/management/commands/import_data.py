@@ -0,0 +1,34 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from backend.imports import IMPORT_BATCH_SIZE, IMPORT_FIELDS, import_file
+from backend.models import Company
+
+
+class Command(BaseCommand):
+    help = "Bulk import clients, products or invoices of a company from a CSV or JSON file."
+
+    def add_arguments(self, parser):
+        parser.add_argument("kind", choices=list(IMPORT_FIELDS))
+        parser.add_argument("path", help="CSV or JSON file.")
+        parser.add_argument("--company", required=True, help="Company id.")
+        parser.add_argument("--batch-size", type=int, default=IMPORT_BATCH_SIZE, help="Rows per transaction.")
+        parser.add_argument("--format", choices=["csv", "json"], help="Defaults to the file extension.")
+
+    def handle(self, *args, **opts):
+        try:
+            company = Company.objects.get(id=opts["company"])
+        except (Company.DoesNotExist, ValueError):
+            raise CommandError(f"Company {opts['company']} does not exist.")
+
+        file_format = opts["format"] or ("json" if opts["path"].lower().endswith(".json") else "csv")
+        with open(opts["path"], "rb") as f:
+            result = import_file(company, opts["kind"], f, file_format, opts["batch_size"])
+
+        for row, message in result.errors[:50]:
+            self.stderr.write(f"Row {row}: {message}")
+        if len(result.errors) > 50:
+            self.stderr.write(f"... and {len(result.errors) - 50} more errors.")
+        self.stdout.write(self.style.SUCCESS(
+            f"Imported {result.created} {opts['kind']} in {result.seconds:.2f}s "
+            f"({result.rows_per_second:.0f} rows/s), {len(result.errors)} rows rejected."
+        ))
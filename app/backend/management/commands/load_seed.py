@@ -0,0 +1,38 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.core.serializers.base import DeserializationError
+from django.db import DatabaseError
+
+from backend.seed import FIXTURES_DIR, SEED_BATCH_SIZE, SEED_FIXTURES, load_fixtures
+
+
+class Command(BaseCommand):
+    help = (
+        "Load seed fixtures in dependency order with bulk inserts (COPY on PostgreSQL), skipping rows "
+        "whose primary key exists, then compute invoice totals, search documents, number sequences "
+        "and rollups in one pass."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "fixtures", nargs="*",
+            help="Fixture files in dependency order. Defaults to the seed fixtures of the backend app.",
+        )
+        parser.add_argument("--batch-size", type=int, default=SEED_BATCH_SIZE)
+
+    def handle(self, *args, **opts):
+        paths = opts["fixtures"] or [FIXTURES_DIR / name for name in SEED_FIXTURES]
+        try:
+            stats, timings = load_fixtures(paths, batch_size=opts["batch_size"])
+        except (OSError, ValueError, DeserializationError, DatabaseError) as e:
+            raise CommandError(f"Could not load fixtures: {e}") from e
+
+        for model_stats in stats:
+            self.stdout.write(
+                f"{model_stats.label}: {model_stats.rows} rows in {model_stats.seconds:.2f}s "
+                f"({model_stats.rows_per_second:.0f} rows/s)"
+            )
+        for label, seconds in timings.items():
+            self.stdout.write(f"{label}: {seconds:.2f}s")
+        total = sum(model_stats.rows for model_stats in stats)
+        seconds = sum(model_stats.seconds for model_stats in stats) + sum(timings.values())
+        self.stdout.write(self.style.SUCCESS(f"Loaded {total} objects in {seconds:.2f}s."))
@@ -0,0 +1,24 @@
+from django.core.management.base import BaseCommand
+
+from backend.models import Company, MonthlyRevenue, ProductSales, ClientSales
+
+
+class Command(BaseCommand):
+    help = "Rebuild the dashboard rollup tables from invoices."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--company", action="append", help="Company id, can be repeated. Defaults to all companies.")
+
+    def handle(self, *args, **opts):
+        companies = None
+        if opts["company"]:
+            companies = Company.objects.filter(id__in=opts["company"])
+
+        rollups = [
+            (MonthlyRevenue, "monthly revenue"),
+            (ProductSales, "product leaderboard"),
+            (ClientSales, "client leaderboard"),
+        ]
+        for model, label in rollups:
+            rows = model.rebuild(companies)
+            self.stdout.write(self.style.SUCCESS(f"Rebuilt {rows} {label} rows."))
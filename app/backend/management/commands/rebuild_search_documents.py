@@ -0,0 +1,22 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from backend.search import get_search_backend, rebuild_search_documents
+
+
+class Command(BaseCommand):
+    help = (
+        "Rebuild the search documents of clients, products and invoices, e.g. after loaddata "
+        "or raw SQL writes, and create the search indexes if they are missing."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--company", action="append", help="Company id, can be repeated. Defaults to all companies.")
+
+    def handle(self, *args, **opts):
+        with transaction.atomic():
+            counts = rebuild_search_documents(opts["company"])
+        get_search_backend().install()
+        for label, count in counts.items():
+            self.stdout.write(f"{label}: {count} documents")
+        self.stdout.write(self.style.SUCCESS("Search documents rebuilt."))
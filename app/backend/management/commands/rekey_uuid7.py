@@ -0,0 +1,39 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DatabaseError, connection
+
+from backend.rekey import REKEY_BATCH_SIZE, REKEY_ORDER, rekey
+
+MODELS = {model._meta.model_name: model for model in REKEY_ORDER}
+
+
+class Command(BaseCommand):
+    help = (
+        "Replace the uuid4 primary keys of existing rows with time-ordered (version 7) keys and "
+        "update every foreign key to them. Old URLs stop working and users choose their company "
+        "again, run it with the application stopped. PostgreSQL only."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--model", action="append", choices=list(MODELS),
+            help="Model to rekey, can be repeated. Defaults to all of them, parents first.",
+        )
+        parser.add_argument("--batch-size", type=int, default=REKEY_BATCH_SIZE)
+
+    def handle(self, *args, **opts):
+        if connection.vendor != "postgresql":
+            raise CommandError("Primary keys can only be rewritten on PostgreSQL.")
+
+        names = opts["model"] or list(MODELS)
+        for name in MODELS:
+            if name not in names:
+                continue
+            started = time.perf_counter()
+            try:
+                count = rekey(MODELS[name], opts["batch_size"])
+            except DatabaseError as e:
+                raise CommandError(f"Could not rekey {name}: {e}") from e
+            self.stdout.write(f"{name}: {count} keys in {time.perf_counter() - started:.2f}s")
+        self.stdout.write(self.style.SUCCESS("Primary keys are time-ordered."))
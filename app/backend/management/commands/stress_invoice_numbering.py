@@ -0,0 +1,79 @@
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.db.models import Count
+
+from backend.models import Company, Invoice, User, parse_invoice_number
+
+
+class Command(BaseCommand):
+    help = "Create invoices from parallel threads and check that no invoice number is issued twice."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--invoices", type=int, default=2000)
+        parser.add_argument("--threads", type=int, default=8)
+        parser.add_argument("--keep", action="store_true", help="Keep the generated test company and invoices.")
+
+    def handle(self, *args, **opts):
+        total, threads = opts["invoices"], opts["threads"]
+        if connection.vendor != "postgresql":
+            self.stderr.write(self.style.WARNING(
+                f"Running on {connection.vendor}, row level locks are not available there."
+            ))
+
+        tag = uuid.uuid4().hex[:10]
+        user = User.objects.create_user(email=f"stress-{tag}@example.com")
+        company = Company.objects.create(user=user, name=f"Stress test {tag}", nip=tag[:10])
+        today = date.today()
+
+        def create_invoices(count):
+            errors = []
+            try:
+                for _ in range(count):
+                    try:
+                        Invoice.objects.create(
+                            company=company,
+                            issue_date=today,
+                            due_date=today,
+                            payment_method="transfer",
+                        )
+                    except Exception as e:
+                        errors.append(repr(e))
+            finally:
+                connection.close()
+            return errors
+
+        batches = [total // threads + (1 if i < total % threads else 0) for i in range(threads)]
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=threads) as pool:
+            errors = [e for result in pool.map(create_invoices, batches) for e in result]
+        elapsed = time.perf_counter() - started
+
+        invoices = Invoice.objects.filter(company=company)
+        duplicates = list(
+            invoices.values("number").annotate(count=Count("id")).filter(count__gt=1)
+        )
+        sequences = sorted(parse_invoice_number(n)[0] for n in invoices.values_list("number", flat=True))
+        created = len(sequences)
+
+        if not opts["keep"]:
+            invoices.delete()
+            user.delete()
+
+        self.stdout.write(
+            f"{created} invoices from {threads} threads in {elapsed:.2f}s "
+            f"({created / elapsed:.0f} invoices/s)"
+        )
+        for e in errors[:10]:
+            self.stderr.write(e)
+        if duplicates:
+            raise CommandError(f"{len(duplicates)} invoice numbers were issued more than once.")
+        if errors:
+            raise CommandError(f"{len(errors)} invoices failed to save.")
+        if sequences != list(range(1, created + 1)):
+            raise CommandError("Invoice numbers are not a gapless sequence.")
+        self.stdout.write(self.style.SUCCESS("No duplicate invoice numbers."))
@@ -0,0 +1,37 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from backend.models import Invoice, InvoiceNumberSequence
+
+
+class Command(BaseCommand):
+    help = "Fill the numeric invoice number columns and move number sequences past existing invoices."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=2000)
+
+    def handle(self, *args, **opts):
+        batch_size = opts["batch_size"]
+        fields = ["number_sequence", "number_month", "number_year"]
+
+        updated = 0
+        batch = []
+        invoices = Invoice.objects.only("id", "number", *fields).iterator(chunk_size=batch_size)
+        for invoice in invoices:
+            parts = (invoice.number_sequence, invoice.number_month, invoice.number_year)
+            invoice.sync_number_parts()
+            if parts != (invoice.number_sequence, invoice.number_month, invoice.number_year):
+                batch.append(invoice)
+            if len(batch) >= batch_size:
+                Invoice.objects.bulk_update(batch, fields)
+                updated += len(batch)
+                batch = []
+        Invoice.objects.bulk_update(batch, fields)
+        updated += len(batch)
+
+        with transaction.atomic():
+            sequences = InvoiceNumberSequence.sync_from_invoices()
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Updated {updated} invoice numbers and {sequences} number sequences."
+        ))
@@ -1,20 +1,77 @@
+from concurrent.futures import ProcessPoolExecutor, as_completed
 from django.core.management.base import BaseCommand, CommandError
 from django.apps import apps
 from django.db import models
-import json
 import os
 import glob
 
+from backend.bulk import iter_json_array
+
 
 def model_label(m):
     return f"{m._meta.app_label}.{m._meta.model_name}"
 
 
+def reference_fields():
+    """
+    FK/M2M fields per model label, read from the model metadata once:
+    {model label: [(field name, target label, is m2m)]}. Only targets with UUID
+    primary keys (i.e. converted fixtures) are checked.
+    """
+    uuid_pk_by_model = {
+        model_label(m): isinstance(m._meta.pk, models.UUIDField) for m in apps.get_models()
+    }
+    fields_by_model = {}
+    for m in apps.get_models():
+        refs = []
+        for f in m._meta.get_fields():
+            if not (f.many_to_one and f.concrete) and not f.many_to_many:
+                continue
+            target_ml = model_label(f.remote_field.model)
+            if uuid_pk_by_model.get(target_ml):
+                refs.append((f.name, target_ml, f.many_to_many))
+        fields_by_model[model_label(m)] = refs
+    return fields_by_model
+
+
+def scan_fixture(path, ref_fields):
+    """
+    Worker of the pool, no Django access. Returns the number of objects, the primary
+    keys the file defines as {model label: {pk}} and the references the file does not
+    resolve itself as {(kind, model label, field name, target label): {pk}}.
+    """
+    present = {}
+    needed = {}
+    objects = 0
+    with open(path, "r", encoding="utf-8") as f:
+        for obj in iter_json_array(f):
+            objects += 1
+            ml = obj.get("model")
+            present.setdefault(ml, set()).add(obj.get("pk"))
+            fields = obj.get("fields", {})
+            for name, target_ml, many in ref_fields.get(ml, ()):
+                val = fields.get(name)
+                if val is None:
+                    continue
+                refs = needed.setdefault(("M2M" if many else "FK", ml, name, target_ml), set())
+                for v in (val if many else [val]):
+                    # Natural keys are lists, they cannot be checked against primary keys
+                    if not isinstance(v, list):
+                        refs.add(v)
+    for (_, _, _, target_ml), refs in needed.items():
+        refs -= present.get(target_ml, set())
+    return objects, present, {origin: refs for origin, refs in needed.items() if refs}
+
+
 class Command(BaseCommand):
     help = "Validate that all FK/M2M references in fixtures resolve to existing objects."
 
     def add_arguments(self, parser):
         parser.add_argument("--src", default="app/backend/fixtures")
+        parser.add_argument(
+            "--workers", type=int, default=os.cpu_count(),
+            help="Processes parsing files in parallel, 0 parses in this process.",
+        )
 
     def handle(self, *args, **opts):
         src = opts["src"]
@@ -22,54 +79,51 @@ class Command(BaseCommand):
         if not files:
             raise CommandError(f"No JSON fixtures found in {src}")
 
-        uuid_pk_by_model = {
-            model_label(m): isinstance(m._meta.pk, models.UUIDField) for m in apps.get_models()
-        }
-        model_by_label = {model_label(m): m for m in apps.get_models()}
-
-        objects = []  # list of tuples (path, obj)
-        present = set()  # (model_label, pk)
-        for path in files:
-            with open(path, "r", encoding="utf-8") as f:
-                try:
-                    data = json.load(f)
-                except Exception as e:
-                    raise CommandError(f"Invalid JSON in {path}: {e}") from e
-                for obj in data:
-                    objects.append((path, obj))
-                    present.add((obj.get("model"), obj.get("pk")))
-
-        errors = []
-        for path, obj in objects:
-            ml = obj.get("model")
-            fields = obj.get("fields", {})
-            m = model_by_label.get(ml)
-            if not m:
-                continue
+        ref_fields = reference_fields()
+        present = {}  # model label -> pks of all files read so far
+        pending = {}  # (kind, model label, field, target label, path) -> unresolved pks
 
-            for f in m._meta.get_fields():
-                if f.many_to_one and f.concrete and f.name in fields:
-                    target_ml = model_label(f.remote_field.model)
-                    val = fields[f.name]
-                    if val is None:
-                        continue
-                    # Check only if target model has UUID PK (i.e., was converted)
-                    if uuid_pk_by_model.get(target_ml) and (target_ml, val) not in present:
-                        errors.append(
-                            f"Missing FK target {target_ml}:{val} referenced from {ml}.{f.name} in {path}"
-                        )
-
-                if f.many_to_many and f.name in fields:
-                    target_ml = model_label(f.remote_field.model)
-                    if uuid_pk_by_model.get(target_ml):
-                        for v in fields[f.name]:
-                            if (target_ml, v) not in present:
-                                errors.append(
-                                    f"Missing M2M target {target_ml}:{v} referenced from {ml}.{f.name} in {path}"
-                                )
+        for path, objects, file_present, needed in self._scan(files, ref_fields, opts["workers"]):
+            for ml, pks in file_present.items():
+                present.setdefault(ml, set()).update(pks)
+            for origin, refs in pending.items():
+                refs -= file_present.get(origin[3], set())
+            for origin, refs in needed.items():
+                refs -= present.get(origin[3], set())
+                if refs:
+                    pending[origin + (path,)] = refs
+            pending = {origin: refs for origin, refs in pending.items() if refs}
+            self.stdout.write(
+                f"{path}: {objects} objects, {sum(map(len, needed.values()))} external references, "
+                f"{sum(map(len, pending.values()))} unresolved so far."
+            )
 
+        errors = sorted(
+            f"Missing {kind} target {target_ml}:{val} referenced from {ml}.{name} in {path}"
+            for (kind, ml, name, target_ml, path), refs in pending.items()
+            for val in refs
+        )
         if errors:
             for e in errors:
                 self.stderr.write(e)
             raise CommandError(f"{len(errors)} reference errors found.")
         self.stdout.write(self.style.SUCCESS("Fixture references validated."))
+
+    @staticmethod
+    def _scan(files, ref_fields, workers):
+        """Yields (path, objects, present, needed) per file as soon as it is parsed."""
+        def scanned(path, scan):
+            try:
+                return (path, *scan())
+            except (ValueError, UnicodeDecodeError) as e:
+                raise CommandError(f"Invalid JSON in {path}: {e}") from e
+
+        if workers <= 0 or len(files) == 1:
+            for path in files:
+                yield scanned(path, lambda: scan_fixture(path, ref_fields))
+            return
+
+        with ProcessPoolExecutor(max_workers=min(workers, len(files))) as pool:
+            futures = {pool.submit(scan_fixture, path, ref_fields): path for path in files}
+            for future in as_completed(futures):
+                yield scanned(futures[future], future.result)
@@ -1,32 +1,92 @@
+import copy
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
 from django.contrib import messages
 from django.shortcuts import redirect
-from django.urls import resolve, reverse, NoReverseMatch
+from django.urls import reverse, NoReverseMatch
+
+from .models import Company
+
+# Per-process cache of active companies: company id -> (user id, company, expires at).
+# Entries are dropped by signals when a company changes, the TTL bounds how long
+# another process may keep serving a stale copy. Least recently used entries are
+# dropped above ACTIVE_COMPANY_CACHE_SIZE, so it does not grow with every tenant.
+_company_cache = OrderedDict()
+_company_cache_lock = threading.Lock()
+
+
+def get_active_company(request):
+    """Returns the active company of the session if it belongs to the logged in user."""
+    company_id = request.session.get('active_company_id')
+    if not company_id or not request.user.is_authenticated:
+        return None
+
+    key = str(company_id)
+    with _company_cache_lock:
+        entry = _company_cache.get(key)
+        if entry and entry[0] == request.user.pk and entry[2] > time.monotonic():
+            _company_cache.move_to_end(key)
+            # Every request gets its own copy, so per-request state never leaks between them
+            return copy.copy(entry[1])
+
+    company = Company.objects.filter(id=company_id, user=request.user).first()
+    if company is not None:
+        timeout = getattr(settings, 'ACTIVE_COMPANY_CACHE_TIMEOUT', 60)
+        max_size = getattr(settings, 'ACTIVE_COMPANY_CACHE_SIZE', 256)
+        with _company_cache_lock:
+            _company_cache[key] = (request.user.pk, copy.copy(company), time.monotonic() + timeout)
+            _company_cache.move_to_end(key)
+            while len(_company_cache) > max_size:
+                _company_cache.popitem(last=False)
+    return company
+
+
+def invalidate_active_company(company_id):
+    with _company_cache_lock:
+        _company_cache.pop(str(company_id), None)
+
 
 class CompanyRequiredMiddleware:
+    """
+    Attaches the active company to every request as request.company and
+    redirects logged in users without one to the company chooser.
+    """
+    exempt_url_names = [
+        'tmp_login',
+        'tmp_register',
+        'tmp_choose_company',
+        'tmp_company_add',
+        'tmp_index',
+        'admin:index',
+        'tmp_logout',
+    ]
+
     def __init__(self, get_response):
         self.get_response = get_response
-        self.exempt_urls = [
-            'tmp_login_view',
-            'tmp_register',
-            'tmp_choose_company',
-            'tmp_company_add',
-            'tmp_index',
-            'admin:index',
-            'tmp_logout',
-        ]
+        self._exempt_paths = None
 
-    def __call__(self, request):
-        if request.user.is_authenticated:
-            try:
-                current_url_name = resolve(request.path_info).url_name
-            except:
-                current_url_name = None
+    @property
+    def exempt_paths(self):
+        # Reversed once on the first request, when the URLconf is guaranteed to be loaded
+        if self._exempt_paths is None:
+            paths = set()
+            for name in self.exempt_url_names:
+                try:
+                    paths.add(reverse(name))
+                except NoReverseMatch:
+                    pass
+            self._exempt_paths = frozenset(paths)
+        return self._exempt_paths
 
-            is_exempt = False
-            if current_url_name:
-                is_exempt = current_url_name in self.exempt_urls
+    def __call__(self, request):
+        request.company = get_active_company(request)
 
-            if not is_exempt and not request.session.get('active_company_id'):
+        if request.user.is_authenticated and request.company is None:
+            if request.path not in self.exempt_paths:
+                request.session.pop('active_company_id', None)
                 messages.info(request, "Wybierz firmę, aby kontynuować.")
 
                 try:
@@ -34,6 +94,5 @@ class CompanyRequiredMiddleware:
                 except NoReverseMatch:
                     return redirect('tmp_home')
 
-
         response = self.get_response(request)
         return response
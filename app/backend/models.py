@@ -1,45 +1,76 @@
 import json
 from datetime import date, datetime
+from decimal import Decimal, ROUND_HALF_UP
 
-from django.core.exceptions import ValidationError
-from django.db import models
+from django.db import models, transaction, IntegrityError
 from django.contrib.auth.models import AbstractBaseUser, PermissionsMixin, BaseUserManager
 from django.conf import settings
-import uuid
 
-from django.db.models import Max, Sum, F, Count
-from django.db.models.functions import TruncMonth, Round
+from django.db.models import Max, Sum, F, Count, Q, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce, Concat, ExtractMonth, ExtractYear, NullIf, Trim
 from phonenumber_field.modelfields import PhoneNumberField
 
+from .bulk import bulk_insert, copy_rows
+from .dashboard import invalidate_dashboard_stats
+from .uuids import uuid7
+from .validators import validate_nip, validate_regon
 
-def validate_nip(nip):
-    if len(nip) != 10 or not nip.isdigit():
-        raise ValidationError("NIP musi składać się z 10 cyfr.")
-    weights = [6, 5, 7, 2, 3, 4, 5, 6, 7]
-    control_sum = sum([int(nip[i]) * weights[i] for i in range(9)])
-    if control_sum % 11 != int(nip[9]):
-        raise ValidationError("NIP jest nieprawidłowy.")
+CENT = Decimal('0.01')
 
-def validate_regon(regon):
-    if len(regon) not in (9, 14) or not regon.isdigit():
-        raise ValidationError("REGON musi zawierać 9 lub 14 cyfr.")
-    weights_9 = [8, 9, 2, 3, 4, 5, 6, 7]
-    weights_14 = [2, 4, 8, 5, 0, 9, 7, 3, 6, 1, 0, 5, 9]
 
-    if len(regon) == 9:
-        control_sum = sum([int(regon[i]) * weights_9[i] for i in range(8)])
-        if control_sum % 11 != int(regon[8]):
-            raise ValidationError("REGON jest nieprawidłowy.")
-    elif len(regon) == 14:
-        control_sum = sum([int(regon[i]) * weights_14[i] for i in range(13)])
-        if control_sum % 11 != int(regon[13]):
-            raise ValidationError("REGON jest nieprawidłowy.")
+def month_bounds(year, month):
+    """Returns the first day of the month and the first day of the next month."""
+    start = date(year, month, 1)
+    end = date(year + 1, 1, 1) if month == 12 else date(year, month + 1, 1)
+    return start, end
+
+
+ALL_TIME = 'all'
+
+
+def sales_periods(issue_date):
+    """Leaderboard periods an invoice counts into: all time, its year and its month."""
+    return [ALL_TIME, f"{issue_date.year}", f"{issue_date.year}-{issue_date.month:02d}"]
+
+
+def current_period(window):
+    """Maps a dashboard time window ('month', 'year' or 'all') to a leaderboard period."""
+    today = date.today()
+    return {
+        'month': f"{today.year}-{today.month:02d}",
+        'year': f"{today.year}",
+    }.get(window, ALL_TIME)
+
+
+def period_bounds(period):
+    """Returns the date range of a leaderboard period, None for all time."""
+    if period == ALL_TIME:
+        return None
+    if '-' not in period:
+        year = int(period)
+        return date(year, 1, 1), date(year + 1, 1, 1)
+    year, month = (int(part) for part in period.split('-'))
+    return month_bounds(year, month)
+
+
+def parse_invoice_number(number):
+    """Splits a number/month/year invoice number into integers, None if it has another format."""
+    parts = (number or '').split('/')
+    if len(parts) != 3 or not all(part.isdigit() for part in parts):
+        return None
+    sequence, month, year = (int(part) for part in parts)
+    if not 1 <= month <= 12:
+        return None
+    return sequence, month, year
 
 
 class UUIDModel(models.Model):
+    # Time-ordered, so new rows are appended to the primary key index and -id
+    # means newest first. Rows created before keep their uuid4 keys until the
+    # rekey_uuid7 command rewrites them.
     id = models.UUIDField(
         primary_key=True,
-        default=uuid.uuid4,
+        default=uuid7,
         editable=False
     )
 
@@ -97,14 +128,14 @@ class Company(UUIDModel):
     updated_at = models.DateTimeField(auto_now=True)
 
     def get_latest_invoices(self, limit=10):
-        return self.invoices.order_by("-issue_date")[:limit]
+        return self.invoices.select_related("client").order_by("-issue_date")[:limit]
 
-    def get_top_clients(self, limit=5):
+    def get_top_clients(self, limit=5, period=ALL_TIME):
         return (
             self.clients
-            .annotate(total_spent=Sum("invoices__total_gross"))
-            .filter(total_spent__isnull=False)
-            .order_by("-total_spent")[:limit]
+            .filter(sales__company=self, sales__period=period)
+            .annotate(total_spent=F("sales__total_gross"))
+            .order_by("-sales__total_gross")[:limit]
     )
 
     def get_monthly_revenues(self, year=None):
@@ -113,17 +144,9 @@ class Company(UUIDModel):
 
         monthly_revenues = [0] * 12
 
-        revenues = self.invoices.filter(
-            issue_date__year=year
-        ).annotate(
-            month=TruncMonth('issue_date')
-        ).values('month').annotate(
-            total_revenue=Sum('total_gross')
-        ).order_by('month')
-
-        for revenue in revenues:
-            month_index = revenue['month'].month - 1
-            monthly_revenues[month_index] = revenue['total_revenue'] or 0
+        revenues = self.monthly_revenues.filter(year=year).values_list('month', 'total_gross')
+        for month, total_gross in revenues:
+            monthly_revenues[month - 1] = total_gross
 
         return monthly_revenues
 
@@ -132,36 +155,37 @@ class Company(UUIDModel):
 
     def get_current_monthly_revenue(self):
         now = datetime.now()
-        monthly_revenues = self.get_monthly_revenues(now.year)
-        return monthly_revenues[now.month - 1]
+        return self.monthly_revenues.filter(
+            year=now.year, month=now.month
+        ).values_list('total_gross', flat=True).first() or 0
 
     def get_yearly_revenue(self, year=None):
         if year is None:
             year = datetime.now().year
 
-        return self.invoices.filter(
-            issue_date__year=year
+        return self.monthly_revenues.filter(
+            year=year
         ).aggregate(total_revenue=Sum('total_gross'))['total_revenue'] or 0
 
-    def get_top_products(self, limit=5):
+    def get_top_products(self, limit=5, period=ALL_TIME):
         return (Product.objects.filter(
-            invoiceitem__invoice__company=self
+            sales__company=self, sales__period=period
         ).annotate(
-            total_sold=Sum('invoiceitem__quantity'),
-            total_revenue=Round(Sum(
-                F('invoiceitem__net_price') * F('invoiceitem__quantity')
-            ), 2)
-        ).order_by('-total_sold')[:limit])
+            total_sold=F('sales__quantity'),
+            total_revenue=F('sales__revenue')
+        ).order_by('-sales__revenue')[:limit])
 
     def __str__(self):
         return self.name
 
 
 class Client(UUIDModel):
+    # Covered by the composite indexes in Meta, which all start with it
     company = models.ForeignKey(
         "Company",
         on_delete=models.PROTECT,
-        related_name="clients"
+        related_name="clients",
+        db_index=False,
     )
     client_company_name = models.CharField(
         max_length=255,
@@ -174,11 +198,54 @@ class Client(UUIDModel):
     regon = models.CharField(max_length=20, blank=True, null=True, validators=[validate_regon])
     email = models.EmailField(blank=True, null=True)
     phone_number = PhoneNumberField(region="PL", blank=True, null=True)
+    # Company name, or first and last name without one. Kept in sync by a pre_save
+    # signal, so lists can sort on it with client_company_display_idx.
+    display_name = models.CharField(max_length=255, blank=True, default='', editable=False)
+    # SEARCH_FIELDS joined for ?search=, kept up to date and indexed by backend.search
+    search_document = models.TextField(blank=True, default='', editable=False)
+
+    SEARCH_FIELDS = ('client_company_name', 'name', 'surname', 'email', 'nip')
+    DISPLAY_NAME_FIELDS = ('client_company_name', 'name', 'surname')
+
+    class Meta:
+        # Served list orderings: ?sort=full_name_or_company and the default -id
+        # (newest first, the keys are time-ordered).
+        # Checked by the check_query_plans command.
+        indexes = [
+            models.Index(fields=['company', 'display_name'], name='client_company_display_idx'),
+            models.Index(fields=['company', '-id'], name='client_company_id_idx'),
+        ]
 
     def __str__(self):
-        if self.client_company_name:
-            return self.client_company_name
-        return f"{self.name} {self.surname or ''}".strip()
+        return self.display_name
+
+    @staticmethod
+    def build_display_name(client_company_name, name, surname):
+        """Must stay equal to display_name_expression(), which builds it in SQL."""
+        return client_company_name or f"{name or ''} {surname or ''}".strip(' ')
+
+    @staticmethod
+    def display_name_expression():
+        full_name = Concat(Coalesce('name', Value('')), Value(' '), Coalesce('surname', Value('')),
+                           output_field=models.CharField())
+        return Coalesce(NullIf('client_company_name', Value('')), Trim(full_name), output_field=models.CharField())
+
+    def sync_display_name(self):
+        self.display_name = self.build_display_name(self.client_company_name, self.name, self.surname)
+
+    def save(self, *args, update_fields=None, **kwargs):
+        """Partial saves of a name field write the display name with it."""
+        if update_fields is not None and set(self.DISPLAY_NAME_FIELDS) & set(update_fields):
+            update_fields = {*update_fields, 'display_name'}
+        super().save(*args, update_fields=update_fields, **kwargs)
+
+    @classmethod
+    def rebuild_display_names(cls, companies=None):
+        """Sets the display names of all clients (of the given companies) with one UPDATE, after writes without save()."""
+        clients = cls.objects.all()
+        if companies is not None:
+            clients = clients.filter(company__in=companies)
+        return clients.update(display_name=cls.display_name_expression())
 
 
 
@@ -197,10 +264,12 @@ class Product(UUIDModel):
         (0, 'zw.')
     ]
 
+    # Covered by the composite indexes in Meta, which all start with it
     company = models.ForeignKey(
         "Company",
         on_delete=models.PROTECT,
-        related_name="products"
+        related_name="products",
+        db_index=False,
     )
     name = models.CharField(max_length=225)
     description = models.TextField(blank=True)
@@ -215,6 +284,15 @@ class Product(UUIDModel):
         default=23
     )
     created_at = models.DateTimeField(auto_now_add=True)
+    search_document = models.TextField(blank=True, default='', editable=False)
+
+    SEARCH_FIELDS = ('name', 'description')
+
+    class Meta:
+        # The lists' default -created_at ordering, checked by check_query_plans
+        indexes = [
+            models.Index(fields=['company', 'created_at'], name='product_company_created_idx'),
+        ]
 
     def __str__(self):
         return self.name
@@ -222,6 +300,15 @@ class Product(UUIDModel):
     def calculate_brutto(self):
         return self.net_price * (1 + self.tax_rate / 100)
 
+class InvoiceQuerySet(models.QuerySet):
+    NUMBER_FIELDS = ['number_year', 'number_month', 'number_sequence']
+
+    def order_by_number(self, descending=False):
+        """Orders by year, month and sequence of the number, served by invoice_company_number_idx."""
+        prefix = '-' if descending else ''
+        return self.order_by(*(prefix + field for field in self.NUMBER_FIELDS), prefix + 'pk')
+
+
 class Invoice(UUIDModel):
     PAYMENT_METHODS =[
         ('cash', 'Gotówka'),
@@ -229,10 +316,12 @@ class Invoice(UUIDModel):
         ('card', 'Karta Płatnicza'),
     ]
 
+    # Covered by the composite indexes in Meta, which all start with it
     company = models.ForeignKey(
         "Company",
         on_delete=models.PROTECT,
-        related_name='invoices'
+        related_name='invoices',
+        db_index=False,
     )
     client = models.ForeignKey(
         "Client",
@@ -240,7 +329,11 @@ class Invoice(UUIDModel):
         null=True,
         related_name='invoices'
     )
-    number = models.CharField(max_length=50, unique=True)
+    number = models.CharField(max_length=50)
+    # number/month/year parts of the number, kept in sync by a pre_save signal
+    number_sequence = models.PositiveIntegerField(default=0, editable=False)
+    number_month = models.PositiveSmallIntegerField(default=0, editable=False)
+    number_year = models.PositiveSmallIntegerField(default=0, editable=False)
     issue_date = models.DateField()
     due_date = models.DateField()
     payment_method = models.CharField(max_length=20, choices=PAYMENT_METHODS)
@@ -265,38 +358,358 @@ class Invoice(UUIDModel):
         editable=False
     )
 
-    def update_totals(self):
-        items = self.items.all()
-        self.total_net = sum(item.net_total for item in items)
-        self.total_tax = sum(item.tax_amount for item in items)
-        self.total_gross = sum(item.gross_total for item in items)
-        self.save(update_fields=['total_net', 'total_tax', 'total_gross'])
+    search_document = models.TextField(blank=True, default='', editable=False)
+
+    objects = InvoiceQuerySet.as_manager()
+
+    SEARCH_FIELDS = ('number', 'client__client_company_name', 'client__name', 'client__surname')
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['company', 'number'],
+                name='unique_invoice_number_per_company'
+            ),
+        ]
+        # Checked by the check_query_plans command
+        indexes = [
+            models.Index(
+                fields=['company', 'number_year', 'number_month', 'number_sequence'],
+                name='invoice_company_number_idx'
+            ),
+            # Issue date orderings, the latest invoices and every date range:
+            # monthly rollups, leaderboard periods and PDF exports
+            models.Index(fields=['company', 'issue_date'], name='invoice_company_issue_idx'),
+            # ?sort=paid, the id keeps the two large groups in keyset order
+            models.Index(fields=['company', 'paid', 'id'], name='invoice_company_paid_idx'),
+        ]
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Remember the loaded month and client, so moving an invoice refreshes both rollup rows.
+        instance._loaded_issue_date = instance.__dict__.get('issue_date')
+        instance._loaded_client_id = instance.__dict__.get('client_id')
+        return instance
+
+    def refresh_rollups(self, product_ids=()):
+        """
+        Recalculates the revenue and leaderboard rows of the months this invoice
+        belongs (or belonged) to. Products of deleted items have to be passed in.
+        """
+        issue_dates = {self.issue_date, getattr(self, '_loaded_issue_date', None)} - {None}
+        for year, month in {(d.year, d.month) for d in issue_dates}:
+            MonthlyRevenue.refresh(self.company_id, year, month)
+
+        periods = {period for d in issue_dates for period in sales_periods(d)}
+        client_ids = {self.client_id, getattr(self, '_loaded_client_id', None)} - {None}
+        ClientSales.refresh(self.company_id, client_ids, periods)
+        if self.pk and not self._state.adding:
+            product_ids = set(product_ids) | set(self.items.values_list('product_id', flat=True))
+        ProductSales.refresh(self.company_id, product_ids, periods)
+
+        self._loaded_issue_date = self.issue_date
+        self._loaded_client_id = self.client_id
+        invalidate_dashboard_stats(self.company_id)
+
+    def sync_number_parts(self):
+        """Copies the parts of the number into the numeric columns used for sorting."""
+        self.number_sequence, self.number_month, self.number_year = (
+            parse_invoice_number(self.number) or (0, 0, 0)
+        )
+
+    def update_totals(self, product_ids=()):
+        """
+        Recalculates the totals with one aggregate query and a single UPDATE.
+        Products of deleted items are passed on to refresh_rollups().
+        """
+        totals = self.items.aggregate(
+            total_net=Sum('net_total'),
+            total_tax=Sum('tax_amount'),
+            total_gross=Sum('gross_total'),
+        )
+        totals = {field: value or Decimal('0.00') for field, value in totals.items()}
+        Invoice.objects.filter(pk=self.pk).update(**totals)
+        for field, value in totals.items():
+            setattr(self, field, value)
+        self.refresh_rollups(product_ids)
+
+    @classmethod
+    def recalculate_totals(cls, companies=None):
+        """
+        Sets the totals of all invoices (of the given companies) from their items
+        in a single UPDATE. Used after items were written without save().
+        """
+        invoices = cls.objects.all()
+        if companies is not None:
+            invoices = invoices.filter(company__in=companies)
+
+        def item_sum(field):
+            total = InvoiceItem.objects.filter(invoice=OuterRef('pk')).order_by().values('invoice')
+            return Coalesce(Subquery(total.annotate(total=Sum(field)).values('total')), Decimal('0.00'))
+
+        return invoices.update(
+            total_net=item_sum('net_total'),
+            total_tax=item_sum('tax_amount'),
+            total_gross=item_sum('gross_total'),
+        )
+
+    def save_items(self, items, deleted_items=()):
+        """
+        Saves line items in bulk and recalculates the totals once.
+        New items are inserted with a single bulk_create, existing ones
+        are written back with a single bulk_update. Deleted items are removed
+        first and their products' leaderboard rows refreshed with the rest.
+        """
+        deleted_product_ids = set()
+        for item in deleted_items:
+            deleted_product_ids.add(item.product_id)
+            item.delete(update_invoice_totals=False)
+
+        new_items, changed_items = [], []
+        for item in items:
+            item.invoice = self
+            item.calculate_totals()
+            if item._state.adding:
+                new_items.append(item)
+            else:
+                changed_items.append(item)
+
+        if new_items:
+            InvoiceItem.objects.bulk_create(new_items)
+        if changed_items:
+            InvoiceItem.objects.bulk_update(changed_items, InvoiceItem.CALCULATED_FIELDS)
+        self.update_totals(deleted_product_ids)
+        return new_items + changed_items
+
+    @staticmethod
+    def format_number(sequence, month, year):
+        return f"{sequence}/{month:02d}/{year}"
 
     def generate_invoice_number(self):
         """Generates the invoice number in the format: number/month/year."""
-        today = date.today()
-        current_month = today.month
-        current_year = today.year
+        issue_date = self.issue_date or date.today()
+        sequence = InvoiceNumberSequence.next_number(
+            self.company_id, issue_date.year, issue_date.month
+        )
+        return self.format_number(sequence, issue_date.month, issue_date.year)
+
+    def save(self, *args, refresh_rollups=True, **kwargs):
+        """
+        Generate an automatic invoice number if number is not set.
+        Numbers entered by hand move the company sequence forward, so the
+        next generated number never collides with them.
+
+        refresh_rollups=False skips the post_save rollup refresh, for saves
+        followed by save_items(), which refreshes them with the final totals.
+        """
+        self._refresh_rollups = refresh_rollups
+        with transaction.atomic():
+            if not self.number:
+                self.number = self.generate_invoice_number()
+            elif self._state.adding:
+                parsed = parse_invoice_number(self.number)
+                if parsed:
+                    sequence, month, year = parsed
+                    InvoiceNumberSequence.advance_to(self.company_id, year, month, sequence)
+            super().save(*args, **kwargs)
+
+
+class InvoiceNumberSequence(models.Model):
+    """Last issued invoice number of a company in a given month."""
+    company = models.ForeignKey(
+        "Company",
+        on_delete=models.CASCADE,
+        related_name='invoice_number_sequences'
+    )
+    year = models.PositiveSmallIntegerField()
+    month = models.PositiveSmallIntegerField()
+    last_number = models.PositiveIntegerField(default=0)
 
-        last_invoice = Invoice.objects.filter(
-            company=self.company_id,
-            issue_date__month=current_month,
-            issue_date__year=current_year
-        ).aggregate(Max('number'))
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['company', 'year', 'month'],
+                name='unique_invoice_number_sequence'
+            ),
+        ]
 
-        last_number = 0
-        if last_invoice['number__max']:
-            last_number = int(last_invoice['number__max'].split('/')[0]) + 1
+    def __str__(self):
+        return f"{self.company_id} {self.month:02d}/{self.year}: {self.last_number}"
+
+    @classmethod
+    def next_number(cls, company_id, year, month):
+        """Atomically reserves the next number. Must run inside the invoice transaction."""
+        with transaction.atomic():
+            sequence = cls._get_locked(company_id, year, month)
+            sequence.last_number += 1
+            sequence.save(update_fields=['last_number'])
+        return sequence.last_number
+
+    @classmethod
+    def reserve_numbers(cls, company_id, year, month, count):
+        """Atomically reserves count consecutive numbers and returns the first one (bulk imports)."""
+        with transaction.atomic():
+            sequence = cls._get_locked(company_id, year, month)
+            first = sequence.last_number + 1
+            sequence.last_number += count
+            sequence.save(update_fields=['last_number'])
+        return first
+
+    @classmethod
+    def peek_next_number(cls, company_id, year, month):
+        """Returns the number the next invoice will most likely get, without reserving it."""
+        last_number = cls.objects.filter(
+            company_id=company_id, year=year, month=month
+        ).values_list('last_number', flat=True).first()
+        if last_number is None:
+            last_number = cls._highest_existing_number(company_id, year, month)
+        return last_number + 1
+
+    @classmethod
+    def advance_to(cls, company_id, year, month, number):
+        """Moves the sequence forward to a number that was assigned by hand."""
+        with transaction.atomic():
+            sequence = cls._get_locked(company_id, year, month)
+            if number > sequence.last_number:
+                sequence.last_number = number
+                sequence.save(update_fields=['last_number'])
+
+    @classmethod
+    def _get_locked(cls, company_id, year, month):
+        """Returns the sequence row locked with SELECT ... FOR UPDATE, creating it on first use."""
+        lookup = {'company_id': company_id, 'year': year, 'month': month}
+        try:
+            return cls.objects.select_for_update().get(**lookup)
+        except cls.DoesNotExist:
+            pass
+
+        try:
+            with transaction.atomic():
+                return cls.objects.create(
+                    last_number=cls._highest_existing_number(company_id, year, month),
+                    **lookup
+                )
+        except IntegrityError:
+            # Another transaction created the row first, wait for its lock.
+            return cls.objects.select_for_update().get(**lookup)
+
+    @classmethod
+    def sync_from_invoices(cls, companies=None):
+        """
+        Moves every sequence up to the highest number already used, creating
+        missing rows. Used after invoices were written without Invoice.save().
+        """
+        invoices = Invoice.objects.filter(number_year__gt=0)
+        sequences = cls.objects.all()
+        if companies is not None:
+            invoices = invoices.filter(company__in=companies)
+            sequences = sequences.filter(company__in=companies)
+
+        existing = {(s.company_id, s.year, s.month): s for s in sequences}
+        created, raised = [], []
+        highest_numbers = invoices.values(
+            'company_id', 'number_year', 'number_month'
+        ).annotate(highest=Max('number_sequence')).order_by()
+
+        for row in highest_numbers:
+            key = (row['company_id'], row['number_year'], row['number_month'])
+            sequence = existing.get(key)
+            if sequence is None:
+                created.append(cls(
+                    company_id=key[0], year=key[1], month=key[2], last_number=row['highest']
+                ))
+            elif sequence.last_number < row['highest']:
+                sequence.last_number = row['highest']
+                raised.append(sequence)
+
+        cls.objects.bulk_create(created)
+        cls.objects.bulk_update(raised, ['last_number'])
+        return len(created) + len(raised)
+
+    @staticmethod
+    def _highest_existing_number(company_id, year, month):
+        """Seeds a new sequence from invoices numbered before the sequence existed."""
+        return Invoice.objects.filter(
+            company_id=company_id, number_year=year, number_month=month
+        ).aggregate(Max('number_sequence'))['number_sequence__max'] or 0
+
+
+class MonthlyRevenue(models.Model):
+    """
+    Invoice sums of a company in one month, read by the dashboard instead of
+    aggregating the invoice table. Rows are refreshed by Invoice.refresh_rollups()
+    and can be rebuilt with the rebuild_rollups command.
+    """
+    company = models.ForeignKey(
+        "Company",
+        on_delete=models.CASCADE,
+        related_name='monthly_revenues'
+    )
+    year = models.PositiveSmallIntegerField()
+    month = models.PositiveSmallIntegerField()
+    invoice_count = models.PositiveIntegerField(default=0)
+    total_net = models.DecimalField(max_digits=16, decimal_places=2, default=0)
+    total_tax = models.DecimalField(max_digits=16, decimal_places=2, default=0)
+    total_gross = models.DecimalField(max_digits=16, decimal_places=2, default=0)
+    paid_gross = models.DecimalField(max_digits=16, decimal_places=2, default=0)
+    unpaid_gross = models.DecimalField(max_digits=16, decimal_places=2, default=0)
 
-        new_number = last_number + 1
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['company', 'year', 'month'],
+                name='unique_monthly_revenue'
+            ),
+        ]
 
-        return f"{new_number}/{current_month:02d}/{current_year}"
+    def __str__(self):
+        return f"{self.company_id} {self.month:02d}/{self.year}: {self.total_gross}"
+
+    @staticmethod
+    def totals():
+        # The filtered sums go first, later aliases shadow the total_* columns.
+        return {
+            'paid_gross': Sum('total_gross', filter=Q(paid=True), default=0),
+            'unpaid_gross': Sum('total_gross', filter=Q(paid=False), default=0),
+            'invoice_count': Count('id'),
+            'total_net': Sum('total_net', default=0),
+            'total_tax': Sum('total_tax', default=0),
+            'total_gross': Sum('total_gross', default=0),
+        }
+
+    @classmethod
+    def refresh(cls, company_id, year, month):
+        """Recalculates one month of one company from its invoices."""
+        start, end = month_bounds(year, month)
+        totals = Invoice.objects.filter(
+            company_id=company_id, issue_date__gte=start, issue_date__lt=end
+        ).aggregate(**cls.totals())
+
+        lookup = {'company_id': company_id, 'year': year, 'month': month}
+        if totals['invoice_count']:
+            cls.objects.update_or_create(defaults=totals, **lookup)
+        else:
+            cls.objects.filter(**lookup).delete()
+
+    @classmethod
+    def rebuild(cls, companies=None):
+        """Recreates all rows (of the given companies) with one grouped aggregate."""
+        invoices = Invoice.objects.all()
+        rollups = cls.objects.all()
+        if companies is not None:
+            invoices = invoices.filter(company__in=companies)
+            rollups = rollups.filter(company__in=companies)
+
+        totals = cls.totals()
+        rows = invoices.values(
+            'company_id', year=ExtractYear('issue_date'), month=ExtractMonth('issue_date')
+        ).annotate(**totals).order_by().values_list('company_id', 'year', 'month', *totals)
+
+        with transaction.atomic():
+            rollups.delete()
+            return copy_rows(cls, ['company_id', 'year', 'month', *totals], rows)
 
-    def save(self, *args, **kwargs):
-        """Generate an automatic invoice number if number is not set."""
-        if not self.number:
-            self.number = self.generate_invoice_number()
-        super().save(*args, **kwargs)
 
 class InvoiceItem(UUIDModel):
     invoice = models.ForeignKey(
@@ -325,21 +738,176 @@ class InvoiceItem(UUIDModel):
     tax_amount = models.DecimalField(max_digits=12, decimal_places=2)
     gross_total = models.DecimalField(max_digits=12, decimal_places=2)
 
+    CALCULATED_FIELDS = [
+        'quantity', 'net_price', 'tax_rate', 'net_total', 'tax_amount', 'gross_total'
+    ]
+
     def __str__(self):
         return f"{self.product.name}, qt: {self.quantity}"
 
-    def save(self, *args, **kwargs):
+    def calculate_totals(self):
+        """Fills missing prices from the product and calculates the line totals in memory."""
         if self.net_price is None:
             self.net_price = self.product.net_price
         if self.tax_rate is None:
-            self.tax_rate = self.product.tax_rate
+            self.tax_rate = Decimal(self.product.tax_rate)
 
-        self.net_total = self.quantity * self.net_price
-        self.tax_amount = self.net_total * (self.tax_rate / 100)
+        self.net_total = (self.quantity * self.net_price).quantize(CENT, ROUND_HALF_UP)
+        self.tax_amount = (self.net_total * self.tax_rate / 100).quantize(CENT, ROUND_HALF_UP)
         self.gross_total = self.net_total + self.tax_amount
+
+    def save(self, *args, update_invoice_totals=True, **kwargs):
+        """
+        Single row save used by the admin. Bulk writes should go through
+        Invoice.save_items() instead, which recalculates the totals only once.
+        """
+        self.calculate_totals()
         super().save(*args, **kwargs)
 
-        self.invoice.update_totals()
+        if update_invoice_totals:
+            self.invoice.update_totals()
+
+    def delete(self, *args, update_invoice_totals=True, **kwargs):
+        """Single row delete, the post_delete signal updates the invoice unless told otherwise."""
+        self._update_invoice_totals = update_invoice_totals
+        return super().delete(*args, **kwargs)
+
+
+class SalesLeaderboard(models.Model):
+    """
+    Sums per company, period and product/client, read by the dashboard as an
+    indexed LIMIT query. Rows are refreshed by Invoice.refresh_rollups() and
+    can be rebuilt with the rebuild_rollups command.
+
+    Subclasses set the aggregated source_model, the ranked key_field and the
+    company_path and date_path of the source rows, and define a totals()
+    classmethod returning {column: aggregate}. A subclass missing one of them
+    is rejected when it is defined.
+    """
+    company = models.ForeignKey("Company", on_delete=models.CASCADE, related_name='+')
+    period = models.CharField(max_length=7)
+
+    REQUIRED_ATTRIBUTES = ('source_model', 'key_field', 'company_path', 'date_path', 'totals')
+
+    class Meta:
+        abstract = True
+
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        missing = [name for name in cls.REQUIRED_ATTRIBUTES if getattr(cls, name, None) is None]
+        if missing:
+            raise TypeError(f"{cls.__name__} must define {', '.join(missing)}.")
+
+    @classmethod
+    def _source(cls, period):
+        rows = cls.source_model.objects.all()
+        bounds = period_bounds(period)
+        if bounds:
+            rows = rows.filter(**{
+                f"{cls.date_path}__gte": bounds[0],
+                f"{cls.date_path}__lt": bounds[1],
+            })
+        return rows
+
+    @classmethod
+    def refresh(cls, company_id, key_ids, periods):
+        """Recalculates the rows of the given products/clients in the given periods."""
+        key_ids, periods = list(key_ids), list(periods)
+        if not key_ids or not periods:
+            return
+
+        key_column = f"{cls.key_field}_id"
+        rows = []
+        for period in periods:
+            totals = cls._source(period).filter(**{
+                cls.company_path: company_id,
+                f"{key_column}__in": key_ids,
+            }).values(key_column).annotate(**cls.totals()).order_by()
+            rows += [cls(company_id=company_id, period=period, **row) for row in totals]
+
+        with transaction.atomic():
+            cls.objects.filter(**{
+                'company_id': company_id,
+                f"{key_column}__in": key_ids,
+                'period__in': periods,
+            }).delete()
+            bulk_insert(cls, rows)
+
+    @classmethod
+    def rebuild(cls, companies=None):
+        """Recreates all rows (of the given companies) with three grouped aggregates."""
+        key_column = f"{cls.key_field}_id"
+        source = cls._source(ALL_TIME).exclude(**{f"{key_column}__isnull": True})
+        leaderboard = cls.objects.all()
+        if companies is not None:
+            source = source.filter(**{f"{cls.company_path}__in": companies})
+            leaderboard = leaderboard.filter(company__in=companies)
+
+        groupings = {
+            'all': {},
+            'year': {'year': ExtractYear(cls.date_path)},
+            'month': {'year': ExtractYear(cls.date_path), 'month': ExtractMonth(cls.date_path)},
+        }
+        totals = cls.totals()
+        rows = []
+        for grouping in groupings.values():
+            grouped = source.values(
+                key_column, rollup_company=F(cls.company_path), **grouping
+            ).annotate(**totals).order_by()
+            for row in grouped:
+                year, month = row.get('year'), row.get('month')
+                period = ALL_TIME if year is None else f"{year}" if month is None else f"{year}-{month:02d}"
+                rows.append((row['rollup_company'], period, row[key_column], *(row[name] for name in totals)))
+
+        with transaction.atomic():
+            leaderboard.delete()
+            return copy_rows(cls, ['company_id', 'period', key_column, *totals], rows)
+
+
+class ProductSales(SalesLeaderboard):
+    product = models.ForeignKey("Product", on_delete=models.CASCADE, related_name='sales')
+    quantity = models.DecimalField(max_digits=16, decimal_places=2, default=0)
+    revenue = models.DecimalField(max_digits=16, decimal_places=2, default=0)
+
+    source_model = InvoiceItem
+    key_field = 'product'
+    company_path = 'invoice__company_id'
+    date_path = 'invoice__issue_date'
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['product', 'period'], name='unique_product_sales'),
+        ]
+        indexes = [
+            models.Index(fields=['company', 'period', '-revenue'], name='product_sales_rank_idx'),
+        ]
+
+    @classmethod
+    def totals(cls):
+        return {'quantity': Sum('quantity'), 'revenue': Sum('net_total')}
+
+
+class ClientSales(SalesLeaderboard):
+    client = models.ForeignKey("Client", on_delete=models.CASCADE, related_name='sales')
+    invoice_count = models.PositiveIntegerField(default=0)
+    total_gross = models.DecimalField(max_digits=16, decimal_places=2, default=0)
+
+    source_model = Invoice
+    key_field = 'client'
+    company_path = 'company_id'
+    date_path = 'issue_date'
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['client', 'period'], name='unique_client_sales'),
+        ]
+        indexes = [
+            models.Index(fields=['company', 'period', '-total_gross'], name='client_sales_rank_idx'),
+        ]
+
+    @classmethod
+    def totals(cls):
+        return {'invoice_count': Count('id'), 'total_gross': Sum('total_gross')}
 
 
 class Address(UUIDModel):
@@ -0,0 +1,236 @@
+import base64
+import datetime
+import hashlib
+import json
+import math
+from functools import cached_property
+
+from django.core.cache import cache
+from django.core.exceptions import EmptyResultSet, FieldDoesNotExist, ValidationError
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import connections
+from django.db.models import Q
+
+
+class CursorEncoder(DjangoJSONEncoder):
+    """
+    DjangoJSONEncoder without its rounding of times to milliseconds: the cursor
+    values are compared with the stored ones, a rounded created_at skips rows.
+    """
+
+    def default(self, o):
+        if isinstance(o, (datetime.datetime, datetime.time)):
+            return o.isoformat()
+        return super().default(o)
+
+
+class KeysetPage:
+    """
+    One page of a KeysetPaginator. Mirrors the parts of django.core.paginator.Page
+    the list templates use, plus next/previous cursors instead of page links.
+    """
+
+    def __init__(self, object_list, paginator, number, has_next, has_previous):
+        self.object_list = object_list
+        self.paginator = paginator
+        self.number = number
+        self._has_next = has_next
+        self._has_previous = has_previous
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def __getitem__(self, index):
+        return self.object_list[index]
+
+    def has_next(self):
+        return self._has_next
+
+    def has_previous(self):
+        return self._has_previous
+
+    def has_other_pages(self):
+        return self._has_next or self._has_previous
+
+    def next_page_number(self):
+        return self.number + 1
+
+    def previous_page_number(self):
+        return self.number - 1
+
+    @property
+    def next_cursor(self):
+        if not self._has_next:
+            return None
+        return self.paginator.encode_cursor("next", self.object_list[-1], self.number + 1)
+
+    @property
+    def previous_cursor(self):
+        if not self._has_previous:
+            return None
+        if self.number == 2:
+            return ""
+        return self.paginator.encode_cursor("previous", self.object_list[0], self.number - 1)
+
+
+class KeysetPaginator:
+    """
+    Cursor based paginator. Pages are fetched with WHERE (sort columns) > (last row)
+    instead of OFFSET, so every page costs the same. The ordering is read from the
+    queryset, the primary key is appended as a tie breaker.
+
+    count_mode controls the total count: "exact" counts on every request, "cached"
+    keeps the count for count_timeout seconds and "none" never counts.
+    """
+
+    def __init__(self, queryset, per_page, count_mode="cached", count_timeout=60):
+        self.per_page = per_page
+        self.count_mode = count_mode
+        self.count_timeout = count_timeout
+
+        ordering = [str(field) for field in queryset.query.order_by]
+        if not any(field.lstrip("-") in ("pk", "id") for field in ordering):
+            ordering.append("-pk" if ordering and ordering[0].startswith("-") else "pk")
+        self.ordering = ordering
+        self.queryset = queryset.order_by(*ordering)
+
+    def get_page(self, cursor=None):
+        direction, values, number = self.decode_cursor(cursor)
+        if direction == "previous":
+            ordering = [self._reverse(field) for field in self.ordering]
+            queryset = self.queryset.order_by(*ordering).filter(self._after(ordering, values))
+            object_list = list(queryset[:self.per_page + 1])
+            has_previous = len(object_list) > self.per_page
+            object_list = object_list[:self.per_page][::-1]
+            return KeysetPage(object_list, self, number, True, has_previous and number > 1)
+
+        queryset = self.queryset
+        if values is not None:
+            queryset = queryset.filter(self._after(self.ordering, values))
+        object_list = list(queryset[:self.per_page + 1])
+        has_next = len(object_list) > self.per_page
+        return KeysetPage(object_list[:self.per_page], self, number, has_next, values is not None)
+
+    @cached_property
+    def count(self):
+        if self.count_mode == "none":
+            return None
+        if self.count_mode == "exact":
+            return self.queryset.count()
+
+        try:
+            sql, params = self.queryset.order_by().query.sql_with_params()
+        except EmptyResultSet:
+            # none() querysets, e.g. a search without matches, have no SQL to key on
+            return 0
+        key = "keyset-count:" + hashlib.sha1(f"{sql}{params}".encode()).hexdigest()
+        return cache.get_or_set(key, self.queryset.count, self.count_timeout)
+
+    @property
+    def num_pages(self):
+        if self.count is None:
+            return None
+        return max(1, math.ceil(self.count / self.per_page))
+
+    def encode_cursor(self, direction, obj, number):
+        values = [self._value(obj, field.lstrip("-")) for field in self.ordering]
+        data = json.dumps({"d": direction, "v": values, "p": number}, cls=CursorEncoder)
+        return base64.urlsafe_b64encode(data.encode()).decode().rstrip("=")
+
+    def decode_cursor(self, cursor):
+        """Returns (direction, values, page number). Invalid cursors start from the first page."""
+        if not cursor:
+            return "next", None, 1
+        try:
+            data = json.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+            direction, values, number = data["d"], data["v"], int(data["p"])
+        except (ValueError, KeyError, TypeError):
+            return "next", None, 1
+        if direction not in ("next", "previous") or not isinstance(values, list) or len(values) != len(self.ordering):
+            return "next", None, 1
+        try:
+            values = [self._to_python(field.lstrip("-"), value) for field, value in zip(self.ordering, values)]
+        except ValidationError:
+            return "next", None, 1
+        return direction, values, max(number, 1)
+
+    def _to_python(self, path, value):
+        """The JSON value of a cursor as the Python value of the field (or annotation) it orders by."""
+        if value is None:
+            return None
+        annotation = self.queryset.query.annotations.get(path)
+        if annotation is not None:
+            return annotation.output_field.to_python(value)
+        model, field = self.queryset.model, None
+        try:
+            for name in path.split("__"):
+                field = model._meta.pk if name == "pk" else model._meta.get_field(name)
+                model = field.related_model
+        except (AttributeError, FieldDoesNotExist):
+            return value
+        return field.to_python(value)
+
+    @staticmethod
+    def _reverse(field):
+        return field[1:] if field.startswith("-") else f"-{field}"
+
+    @staticmethod
+    def _value(obj, path):
+        for attr in path.split("__"):
+            if obj is None:
+                return None
+            obj = getattr(obj, attr)
+        return obj
+
+    def _after(self, ordering, values):
+        """
+        Builds the lexicographic (a, b, pk) > (x, y, z) filter for the given ordering.
+        NULLs are placed where the database sorts them (largest on PostgreSQL).
+        """
+        nulls_largest = connections[self.queryset.db].features.nulls_order_largest
+        condition = Q(pk__in=[])
+        equal = Q()
+        for field, value in zip(ordering, values):
+            descending = field.startswith("-")
+            name = field.lstrip("-")
+            null_is_after = nulls_largest != descending
+
+            if value is None:
+                after = Q(**{f"{name}__isnull": False}) if not null_is_after else Q(pk__in=[])
+                same = Q(**{f"{name}__isnull": True})
+            else:
+                after = Q(**{f"{name}__{'lt' if descending else 'gt'}": value})
+                if null_is_after:
+                    after |= Q(**{f"{name}__isnull": True})
+                same = Q(**{name: value})
+
+            condition |= equal & after
+            equal &= same
+        return condition
+
+
+def adapt_batch_size(size, elapsed, target=0.05, minimum=10, maximum=100):
+    """
+    Scales the next infinite scroll batch so that it takes about target seconds
+    to load and render, based on how long the current batch of size rows took.
+    """
+    if elapsed <= 0:
+        return maximum
+    size = int(size * min(target / elapsed, 2))
+    return max(minimum, min(size, maximum))
+
+
+class KeysetPaginationMixin:
+    """
+    Replaces the OFFSET pagination of ListView with a KeysetPaginator.
+    The page is selected with ?cursor=, the templates keep page_obj and is_paginated.
+    """
+    count_mode = "cached"
+
+    def paginate_queryset(self, queryset, page_size):
+        paginator = KeysetPaginator(queryset, page_size, count_mode=self.count_mode)
+        page = paginator.get_page(self.request.GET.get("cursor"))
+        return paginator, page, page.object_list, page.has_other_pages()
@@ -0,0 +1,343 @@
+import atexit
+import hashlib
+import logging
+import multiprocessing
+import os
+import tempfile
+import threading
+import time
+import zipfile
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, TimeoutError, wait
+from concurrent.futures.process import BrokenProcessPool
+from pathlib import Path
+
+from django.conf import settings
+from django.template.loader import get_template
+
+from .documents import invoice_documents
+from .exports import StreamingZipBuffer
+
+logger = logging.getLogger(__name__)
+
+
+class PdfRendererBusy(Exception):
+    """Raised when INVOICE_PDF_MAX_PENDING renders are already queued."""
+
+
+class PdfRenderTimeout(Exception):
+    """Raised when a render does not finish within INVOICE_PDF_TIMEOUT seconds."""
+
+
+# State of the renderer worker process
+_font_config = None
+
+
+def _warm_renderer():
+    """
+    Pool initializer. Imports WeasyPrint and lays out a small document once,
+    so font discovery and engine setup are paid when the worker starts.
+    """
+    global _font_config
+    from weasyprint import HTML
+    from weasyprint.text.fonts import FontConfiguration
+
+    _font_config = FontConfiguration()
+    HTML(string='<p style="font-family: sans-serif">Faktura</p>').write_pdf(font_config=_font_config)
+
+
+def _render_in_worker(html_string):
+    from weasyprint import HTML
+    return HTML(string=html_string).write_pdf(font_config=_font_config)
+
+
+class PdfRenderer:
+    """
+    Pool of long-lived WeasyPrint processes. The web process never imports
+    WeasyPrint; it only submits HTML and waits for the PDF bytes.
+
+    At most max_pending renders may be queued or running, further requests are
+    rejected with PdfRendererBusy instead of piling up behind a slow render.
+    """
+
+    def __init__(self, workers, timeout, max_pending):
+        self.workers = workers
+        self.timeout = timeout
+        self._slots = threading.BoundedSemaphore(max_pending)
+        self._lock = threading.Lock()
+        self._pool = None
+
+    def _get_pool(self):
+        with self._lock:
+            if self._pool is None:
+                # spawn, forking a threaded web worker is not safe
+                self._pool = ProcessPoolExecutor(
+                    max_workers=self.workers,
+                    mp_context=multiprocessing.get_context('spawn'),
+                    initializer=_warm_renderer,
+                )
+            return self._pool
+
+    def _reset_pool(self, pool):
+        with self._lock:
+            if self._pool is pool:
+                self._pool = None
+        pool.shutdown(wait=False, cancel_futures=True)
+
+    def submit(self, html_string, wait=False):
+        """
+        Queues a render and returns its future. With wait=True a full queue is waited
+        on for up to timeout seconds instead of failing immediately.
+        """
+        acquired = self._slots.acquire(timeout=self.timeout) if wait else self._slots.acquire(blocking=False)
+        if not acquired:
+            raise PdfRendererBusy()
+
+        pool = self._get_pool()
+        try:
+            future = pool.submit(_render_in_worker, html_string)
+        except BaseException as e:
+            self._slots.release()
+            if isinstance(e, BrokenProcessPool):
+                self._reset_pool(pool)
+            raise
+        # The slot is freed when the job really ends, not when the view stops waiting
+        future.add_done_callback(lambda f: self._slots.release())
+        return future
+
+    def result(self, future, timeout=None):
+        try:
+            return future.result(timeout=self.timeout if timeout is None else timeout)
+        except TimeoutError:
+            future.cancel()
+            raise PdfRenderTimeout()
+        except BrokenProcessPool:
+            with self._lock:
+                pool = self._pool
+            if pool is not None:
+                self._reset_pool(pool)
+            raise
+
+    def render(self, html_string):
+        return self.result(self.submit(html_string))
+
+    def shutdown(self):
+        with self._lock:
+            pool, self._pool = self._pool, None
+        if pool is not None:
+            pool.shutdown(wait=False, cancel_futures=True)
+
+
+_renderer = None
+_renderer_lock = threading.Lock()
+
+
+def get_pdf_renderer():
+    global _renderer
+    with _renderer_lock:
+        if _renderer is None:
+            _renderer = PdfRenderer(
+                workers=settings.INVOICE_PDF_WORKERS,
+                timeout=settings.INVOICE_PDF_TIMEOUT,
+                max_pending=settings.INVOICE_PDF_MAX_PENDING,
+            )
+            atexit.register(_renderer.shutdown)
+        return _renderer
+
+
+def render_pdf(html_string):
+    """Renders HTML to PDF bytes in the renderer pool, or inline when INVOICE_PDF_WORKERS is 0."""
+    if not settings.INVOICE_PDF_WORKERS:
+        from weasyprint import HTML
+        return HTML(string=html_string).write_pdf()
+    return get_pdf_renderer().render(html_string)
+
+
+def render_invoice_html(invoice):
+    """The HTML of the PDF of an InvoiceDocument."""
+    return get_template('frontend_templates/invoice_pdf.html').render({'invoice': invoice})
+
+
+def get_invoice_pdf(invoice):
+    """
+    Returns the path of the PDF of an InvoiceDocument, rendering it only when the cache has no
+    file for the current content.
+
+    Files are addressed by the sha256 of the rendered HTML, so any change of the
+    invoice, its items, client or company produces a new key and the old file is
+    left for eviction.
+    """
+    html_string = render_invoice_html(invoice)
+    path = _cache_path(html_string)
+    if _is_cached(path):
+        return path
+
+    _write_atomic(path, render_pdf(html_string))
+    return path
+
+
+def invoices_for_export(company, date_from, date_to):
+    """Invoices of a company issued in [date_from, date_to], iter_invoice_pdfs() loads their documents."""
+    return (
+        company.invoices
+        .filter(issue_date__gte=date_from, issue_date__lte=date_to)
+        .order_by('issue_date', 'pk')
+    )
+
+
+def iter_invoice_pdfs(invoices):
+    """
+    Yields (document, path, rendered) for every invoice, cached PDFs right away and
+    the others as soon as the renderer pool finishes them, so the order is not kept.
+    At most INVOICE_PDF_WORKERS renders are in flight, leaving the remaining
+    queue slots to interactive downloads.
+    """
+    renderer = get_pdf_renderer() if settings.INVOICE_PDF_WORKERS else None
+    pending = {}
+
+    def finished(futures):
+        for future in futures:
+            invoice, path = pending.pop(future)
+            _write_atomic(path, renderer.result(future))
+            yield invoice, path, True
+
+    for invoice in invoice_documents(invoices):
+        html_string = render_invoice_html(invoice)
+        path = _cache_path(html_string)
+        if _is_cached(path):
+            yield invoice, path, False
+        elif renderer is None:
+            _write_atomic(path, render_pdf(html_string))
+            yield invoice, path, True
+        else:
+            if len(pending) >= renderer.workers:
+                done, _ = wait(pending, timeout=renderer.timeout, return_when=FIRST_COMPLETED)
+                if not done:
+                    raise PdfRenderTimeout()
+                yield from finished(done)
+            pending[renderer.submit(html_string, wait=True)] = (invoice, path)
+
+    while pending:
+        done, _ = wait(pending, timeout=renderer.timeout, return_when=FIRST_COMPLETED)
+        if not done:
+            raise PdfRenderTimeout()
+        yield from finished(done)
+
+
+def stream_invoice_pdfs_zip(invoices, stats=None):
+    """
+    Yields a ZIP archive of the invoice PDFs chunk by chunk, one PDF at a time.
+    stats, if given, is filled with count, rendered and seconds.
+    """
+    stats = {} if stats is None else stats
+    stats.update(count=0, rendered=0, seconds=0.0)
+    started = time.perf_counter()
+
+    buffer = StreamingZipBuffer()
+    # PDFs are already compressed, deflating them again only costs CPU
+    with zipfile.ZipFile(buffer, 'w', zipfile.ZIP_STORED) as archive:
+        for invoice, path, rendered in iter_invoice_pdfs(invoices):
+            archive.write(path, f"faktura_{invoice.number.replace('/', '_')}.pdf")
+            stats['count'] += 1
+            stats['rendered'] += rendered
+            yield buffer.pop()
+    yield buffer.pop()
+
+    stats['seconds'] = time.perf_counter() - started
+    logger.info(
+        "Exported %d invoice PDFs (%d rendered) in %.2fs, %.1f PDFs/s",
+        stats['count'], stats['rendered'], stats['seconds'],
+        stats['count'] / stats['seconds'] if stats['seconds'] else 0,
+    )
+
+
+def _cache_path(html_string):
+    key = hashlib.sha256(html_string.encode()).hexdigest()
+    return _cache_dir() / key[:2] / f"{key}.pdf"
+
+
+def _is_cached(path):
+    try:
+        # Touching on every hit keeps the least recently used files first to go
+        os.utime(path)
+        return True
+    except FileNotFoundError:
+        return False
+
+
+def _cache_dir():
+    return Path(settings.INVOICE_PDF_CACHE_DIR)
+
+
+def _write_atomic(path, data):
+    """Writes to a temporary file next to path and renames it, readers never see partial files."""
+    path.parent.mkdir(parents=True, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=path.parent, suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+    _pdf_written(len(data))
+
+
+# Size of the cache as this process knows it: the total of the last scan plus the files
+# it wrote since. Files of other processes are counted by the next scan.
+_cache_size = None
+_cache_size_lock = threading.Lock()
+_eviction_thread = None
+
+
+def _pdf_written(size):
+    """
+    Adds a new file to the known cache size. The cache is only scanned once it may be
+    over INVOICE_PDF_CACHE_MAX_BYTES (or was never scanned), in a background thread,
+    so requests that render a PDF never wait for it.
+    """
+    global _cache_size, _eviction_thread
+    with _cache_size_lock:
+        if _cache_size is not None:
+            _cache_size += size
+            if _cache_size <= settings.INVOICE_PDF_CACHE_MAX_BYTES:
+                return
+        if _eviction_thread is not None and _eviction_thread.is_alive():
+            return
+        _eviction_thread = threading.Thread(target=evict_pdf_cache, name='pdf-cache-eviction', daemon=True)
+        _eviction_thread.start()
+
+
+def evict_pdf_cache(max_bytes=None):
+    """
+    Removes the least recently used PDFs until the cache fits in INVOICE_PDF_CACHE_MAX_BYTES
+    and records the remaining size for _pdf_written().
+    """
+    global _cache_size
+    if max_bytes is None:
+        max_bytes = settings.INVOICE_PDF_CACHE_MAX_BYTES
+
+    files = []
+    total = 0
+    for path in _cache_dir().glob('*/*.pdf'):
+        try:
+            stat = path.stat()
+        except FileNotFoundError:
+            continue
+        files.append((stat.st_mtime, stat.st_size, path))
+        total += stat.st_size
+
+    removed = 0
+    if total > max_bytes:
+        for _, size, path in sorted(files):
+            if total <= max_bytes:
+                break
+            try:
+                path.unlink()
+            except FileNotFoundError:
+                pass
+            total -= size
+            removed += 1
+
+    with _cache_size_lock:
+        _cache_size = total
+    return removed
@@ -0,0 +1,139 @@
+import json
+from dataclasses import dataclass, field
+from datetime import timedelta
+
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
+from .dashboard import collect_dashboard_stats
+from .documents import get_invoice_document, invoice_documents
+from .lists import ROW_LOADERS
+from .models import Invoice, month_bounds
+from .pagination import KeysetPaginator
+from .pdf import invoices_for_export
+
+PLAN_CHECK_PAGE_SIZE = 10
+# Tables with fewer (estimated) rows may be read with a sequential scan, it is
+# cheaper than an index for them
+PLAN_CHECK_MIN_ROWS = 10000
+
+# List orderings served by an index. The amount, price and e-mail sorts are sorted
+# per request on purpose and searches depend on pg_trgm, neither is checked.
+INDEXED_SORTS = {
+    "invoices": ("-issue_date", "issue_date", "-number", "number", "paid", "-paid"),
+    "clients": ("-id", "id", "full_name_or_company", "-full_name_or_company"),
+    "products": ("-created_at", "created_at"),
+}
+
+# Statements that can be explained without running them. The server-side cursors
+# of iterator() are explained as declared, PostgreSQL plans them for a fast start.
+EXPLAINABLE = ("SELECT", "UPDATE", "DELETE", "DECLARE")
+
+
+@dataclass
+class QueryPlan:
+    label: str
+    sql: str
+    plan: list
+    seq_scans: list = field(default_factory=list)
+
+
+def _page_walk(queryset):
+    """
+    The first three pages, then one back, like a user paging through the list.
+    Not the count: it reads every row of the company whatever the plan, the views
+    cache it, and PostgreSQL picks a sequential or index-only scan for it depending
+    on how much of the table is vacuumed.
+    """
+    paginator = KeysetPaginator(queryset, PLAN_CHECK_PAGE_SIZE, count_mode="none")
+    page = paginator.get_page()
+    for _ in range(2):
+        if not page.has_next():
+            return
+        page = paginator.get_page(page.next_cursor)
+    paginator.get_page(page.previous_cursor)
+
+
+def workloads(company):
+    """
+    (label, callable) for every query path of the lists, invoice pages and the
+    dashboard of a company, each running the same code as the views.
+    """
+    latest = company.invoices.order_by("-issue_date", "-pk").first()
+    if latest is None:
+        raise ValueError(f"Company {company.pk} has no invoices.")
+    month_start, month_end = month_bounds(latest.issue_date.year, latest.issue_date.month)
+
+    checks = [
+        (f"{kind} list ?sort={sort}", lambda kind=kind, sort=sort: _page_walk(
+            ROW_LOADERS[kind].load(company, sort=sort)
+        ))
+        for kind, sorts in INDEXED_SORTS.items() for sort in sorts
+    ]
+    checks += [
+        ("invoice document", lambda: get_invoice_document(Invoice.objects.filter(company=company), latest.pk)),
+        ("invoice PDF export of a month", lambda: list(invoice_documents(
+            invoices_for_export(company, month_start, month_end - timedelta(days=1))
+        ))),
+        ("dashboard", lambda: collect_dashboard_stats(company)),
+        ("dashboard leaderboards of the month", lambda: (
+            list(company.get_top_products(period=f"{month_start:%Y-%m}")),
+            list(company.get_top_clients(period=f"{month_start:%Y-%m}")),
+        )),
+        ("invoice rollup refresh", latest.refresh_rollups),
+    ]
+    return checks
+
+
+def _seq_scans(node, large_tables):
+    scans = []
+    if node.get("Node Type") == "Seq Scan" and node.get("Relation Name") in large_tables:
+        scans.append(node["Relation Name"])
+    for child in node.get("Plans", ()):
+        scans += _seq_scans(child, large_tables)
+    return scans
+
+
+def _large_tables(min_rows):
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT relname FROM pg_class WHERE relkind = 'r' AND reltuples >= %s", [min_rows])
+        return {name for name, in cursor.fetchall()}
+
+
+def explain_workloads(company, min_rows=PLAN_CHECK_MIN_ROWS):
+    """
+    Runs the workloads of the company, captures their statements and explains
+    them (without ANALYZE, nothing is executed twice). Returns a QueryPlan per
+    statement, seq_scans lists the tables of at least min_rows rows read with a
+    sequential scan. PostgreSQL only, writes of the workloads are not undone.
+    """
+    large_tables = _large_tables(min_rows)
+    plans = []
+    for label, run in workloads(company):
+        with CaptureQueriesContext(connection) as captured:
+            run()
+        statements = [query["sql"].lstrip() for query in captured.captured_queries]
+        statements = [sql for sql in statements if sql.upper().startswith(EXPLAINABLE)]
+        for number, sql in enumerate(statements, 1):
+            with connection.cursor() as cursor:
+                cursor.execute(f"EXPLAIN (FORMAT JSON) {sql}")
+                plan = cursor.fetchone()[0]
+            if isinstance(plan, str):
+                plan = json.loads(plan)
+            plans.append(QueryPlan(
+                f"{label} #{number}", sql, plan, _seq_scans(plan[0]["Plan"], large_tables),
+            ))
+    return plans
+
+
+def format_plan(node, depth=0):
+    """Short text rendering of an EXPLAIN (FORMAT JSON) node: type, relation, index."""
+    line = "  " * depth + node["Node Type"]
+    if "Relation Name" in node:
+        line += f" on {node['Relation Name']}"
+    if "Index Name" in node:
+        line += f" using {node['Index Name']}"
+    lines = [line]
+    for child in node.get("Plans", ()):
+        lines += format_plan(child, depth + 1)
+    return lines
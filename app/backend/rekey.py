@@ -0,0 +1,101 @@
+from django.apps import apps
+from django.db import connection, transaction
+from django.db.models import F, Min
+from django.db.models.functions import Coalesce, TruncDate
+
+from .bulk import copy_table
+from .dashboard import invalidate_dashboard_stats
+from .models import Client, Company, Invoice, InvoiceItem, InvoiceQuerySet, Product
+from .search import SEARCHABLE_MODELS, search_documents_changed
+from .uuids import UUID7Generator
+
+REKEY_BATCH_SIZE = 10000
+REKEY_TABLE = "rekey_uuid7"
+
+# Per model: the creation time its new keys are made of and the columns that break
+# ties, the old key always comes last. Parents are rekeyed first, so items follow
+# the order of their invoices and the lines of an invoice keep their order.
+# Clients have no creation time, their first invoice stands in for it.
+REKEY_ORDER = {
+    Company: (F("created_at"), ()),
+    Client: (Coalesce(Min("invoices__issue_date"), TruncDate("company__created_at")), ()),
+    Product: (F("created_at"), ()),
+    Invoice: (F("issue_date"), InvoiceQuerySet.NUMBER_FIELDS),
+    InvoiceItem: (F("invoice__issue_date"), ("invoice",)),
+}
+
+
+def referencing_columns(model):
+    """(table, column) of every foreign key to the model, of all installed models."""
+    return [
+        (related._meta.db_table, field.column)
+        for related in apps.get_models(include_auto_created=True)
+        if related._meta.managed and not related._meta.proxy
+        for field in related._meta.local_concrete_fields
+        if field.is_relation and field.related_model is model
+    ]
+
+
+def _new_keys(model, batch_size):
+    """(old key, new key) of the rows without a version 7 key, new keys ascending in REKEY_ORDER."""
+    key_time, tie_breakers = REKEY_ORDER[model]
+    rows = (
+        model._base_manager.annotate(key_time=key_time)
+        .order_by("key_time", *tie_breakers, "pk")
+        .values_list("pk", "key_time")
+    )
+    generate = UUID7Generator()
+    for old, moment in rows.iterator(chunk_size=batch_size):
+        if old.version != 7:
+            yield old, generate(moment)
+
+
+def rekey(model, batch_size=REKEY_BATCH_SIZE):
+    """
+    Replaces the uuid4 primary keys of the model's rows with version 7 keys of
+    their creation time and rewrites every foreign key to them, in one
+    transaction (Django's foreign keys are deferred until the commit). Rows with
+    version 7 keys keep them, so it can be run again. PostgreSQL only.
+
+    The old keys stop working everywhere outside the database: bookmarked URLs,
+    active companies of sessions and caches. Returns the number of new keys.
+    """
+    quote_name = connection.ops.quote_name
+    with transaction.atomic(), connection.cursor() as cursor:
+        cursor.execute(
+            f"CREATE TEMPORARY TABLE {REKEY_TABLE} (old_id uuid PRIMARY KEY, new_id uuid NOT NULL) ON COMMIT DROP"
+        )
+        count = copy_table(connection, REKEY_TABLE, ("old_id", "new_id"), _new_keys(model, batch_size), batch_size)
+        if not count:
+            return 0
+        cursor.execute(f"ANALYZE {REKEY_TABLE}")
+        cursor.execute("SET CONSTRAINTS ALL DEFERRED")
+
+        columns = referencing_columns(model) + [(model._meta.db_table, model._meta.pk.column)]
+        for table, column in columns:
+            cursor.execute(
+                f"UPDATE {quote_name(table)} AS t SET {quote_name(column)} = m.new_id "
+                f"FROM {REKEY_TABLE} AS m WHERE t.{quote_name(column)} = m.old_id"
+            )
+        if apps.is_installed("django.contrib.admin"):
+            from django.contrib.admin.models import LogEntry
+            from django.contrib.contenttypes.models import ContentType
+
+            cursor.execute(
+                f"UPDATE {quote_name(LogEntry._meta.db_table)} AS t SET object_id = m.new_id::text "
+                f"FROM {REKEY_TABLE} AS m WHERE t.content_type_id = %s AND t.object_id = m.old_id::text",
+                [ContentType.objects.get_for_model(model).pk],
+            )
+
+        if model in SEARCHABLE_MODELS:
+            search_documents_changed(model)
+        # The dashboards cache the latest invoices and leaderboards with their keys
+        for company_id in Company.objects.values_list("pk", flat=True):
+            transaction.on_commit(lambda company_id=company_id: invalidate_dashboard_stats(company_id))
+
+    # Every updated row got new index entries, rebuilding leaves them as compact as after a fresh load
+    with connection.cursor() as cursor:
+        for table in {table for table, _ in columns}:
+            cursor.execute(f"REINDEX TABLE {quote_name(table)}")
+            cursor.execute(f"ANALYZE {quote_name(table)}")
+    return count
@@ -0,0 +1,194 @@
+import logging
+import operator
+from abc import ABC, abstractmethod
+from functools import reduce
+
+from django.conf import settings
+from django.core.exceptions import ObjectDoesNotExist
+from django.db import DatabaseError, connections, transaction
+from django.db.models import Case, F, FloatField, OuterRef, Subquery, TextField, Value, When
+from django.db.models.functions import Coalesce, Concat
+from django.db.models.lookups import IContains
+from django.utils.module_loading import import_string
+
+from .models import Client, Invoice, Product
+
+logger = logging.getLogger(__name__)
+
+# Annotation the backends rank with, higher is better. Lists searched without an
+# explicit ?sort= are ordered by it.
+SEARCH_RANK = "search_rank"
+RANKED = f"-{SEARCH_RANK}"
+
+SEARCHABLE_MODELS = (Client, Product, Invoice)
+
+
+def search_terms(query):
+    return (query or "").split()
+
+
+def build_search_document(instance):
+    """
+    The text the search matches, the model's SEARCH_FIELDS joined with spaces.
+    Must stay equal to search_document_expression(), which builds it in SQL.
+    """
+    values = []
+    for path in type(instance).SEARCH_FIELDS:
+        value = instance
+        for attr in path.split("__"):
+            try:
+                value = getattr(value, attr) if value is not None else None
+            except ObjectDoesNotExist:
+                value = None
+        values.append("" if value is None else str(value))
+    return " ".join(values)
+
+
+def build_values_search_document(model, values):
+    """build_search_document() of field values by name, for rows written without instances. Plain fields only."""
+    return " ".join("" if values.get(path) is None else str(values[path]) for path in model.SEARCH_FIELDS)
+
+
+def search_document_expression(model):
+    """SQL version of build_search_document(), related fields are read with subqueries so it works in update()."""
+    parts = []
+    for path in model.SEARCH_FIELDS:
+        relation, _, name = path.rpartition("__")
+        if relation:
+            related = model._meta.get_field(relation).related_model
+            value = Subquery(related.objects.filter(pk=OuterRef(relation)).values(name)[:1])
+        else:
+            value = F(name)
+        parts += [Coalesce(value, Value(""), output_field=TextField()), Value(" ")]
+    return Concat(*parts[:-1], output_field=TextField())
+
+
+def update_search_documents(queryset):
+    """Rebuilds the documents of the queryset's rows with one UPDATE."""
+    updated = queryset.update(search_document=search_document_expression(queryset.model))
+    search_documents_changed(queryset.model, queryset.db)
+    return updated
+
+
+def rebuild_search_documents(companies=None):
+    """Rebuilds the documents of all searchable models, of the given companies only if passed."""
+    counts = {}
+    for model in SEARCHABLE_MODELS:
+        queryset = model.objects.all()
+        if companies is not None:
+            queryset = queryset.filter(company__in=companies)
+        counts[model._meta.label_lower] = update_search_documents(queryset)
+    return counts
+
+
+def search_documents_changed(model, using="default"):
+    """Tells the backend that documents of the model were written, e.g. by bulk inserts."""
+    transaction.on_commit(lambda: get_search_backend(using).documents_changed(model), using=using)
+
+
+class SearchBackend(ABC):
+    """
+    A search backend filters a queryset to the rows whose search_document contains
+    every whitespace separated term of the query (case insensitive, the contract of
+    the old icontains filters) and annotates SEARCH_RANK.
+    """
+
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        # ABC only refuses to instantiate, backends are created lazily on the first search
+        if getattr(cls.search, "__isabstractmethod__", False):
+            raise TypeError(f"{cls.__name__} must define search().")
+
+    def __init__(self, using):
+        self.using = using
+
+    @abstractmethod
+    def search(self, queryset, terms):
+        """The queryset filtered to documents containing every term, annotated with SEARCH_RANK."""
+
+    def install(self):
+        """Creates what the backend needs in the database, runs after every migrate."""
+
+    def documents_changed(self, model):
+        """Called after documents of the model were committed, for backends keeping their own index."""
+
+
+def _word_rank(document, term):
+    """3.0 if the term is a whole word of the document, 2.0 if it starts one, 1.0 otherwise."""
+    padded = Concat(Value(" "), document, Value(" "), output_field=TextField())
+    return Case(
+        When(IContains(padded, f" {term} "), then=Value(3.0)),
+        When(IContains(padded, f" {term}"), then=Value(2.0)),
+        default=Value(1.0),
+        output_field=FloatField(),
+    )
+
+
+class SqlSearchBackend(SearchBackend):
+    """
+    Filters and ranks in the query: every term is matched with icontains and rows
+    are ranked 3 per term that is a whole word of the document, 2 per word prefix
+    and 1 per other substring. The default on SQLite, where LIKE folds the case of
+    ASCII letters only, the contract of the old icontains filters.
+    """
+
+    def search(self, queryset, terms):
+        if not terms:
+            return queryset.annotate(**{SEARCH_RANK: Value(0.0)})
+        for term in terms:
+            queryset = queryset.filter(search_document__icontains=term)
+        rank = reduce(operator.add, (_word_rank(F("search_document"), term) for term in terms))
+        return queryset.annotate(**{SEARCH_RANK: rank})
+
+
+class PostgresSearchBackend(SqlSearchBackend):
+    """
+    icontains compiles to UPPER(search_document) LIKE, which is served by the GIN
+    trigram indexes install() creates on that expression.
+
+    The indexes are created by install() instead of Meta.indexes: they need the
+    pg_trgm extension, which may be missing, and migrations must keep working on
+    SQLite. Without it the search still works, with sequential scans.
+    """
+
+    def install(self):
+        connection = connections[self.using]
+        try:
+            with transaction.atomic(using=self.using), connection.cursor() as cursor:
+                cursor.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+        except DatabaseError as e:
+            logger.warning("pg_trgm is not available, search runs without indexes: %s", e)
+            return
+
+        quote_name = connection.ops.quote_name
+        with connection.cursor() as cursor:
+            for model in SEARCHABLE_MODELS:
+                table = model._meta.db_table
+                cursor.execute(
+                    f"CREATE INDEX IF NOT EXISTS {quote_name(f'{table}_search_trgm_idx')} "
+                    f"ON {quote_name(table)} USING gin (UPPER(search_document) gin_trgm_ops)"
+                )
+
+
+DEFAULT_BACKENDS = {
+    "postgresql": "backend.search.PostgresSearchBackend",
+}
+_backends = {}
+
+
+def get_search_backend(using="default"):
+    """
+    The search backend of a database alias. settings.SEARCH_BACKEND (a dotted path)
+    overrides the default, indexed search on PostgreSQL and plain SQL elsewhere.
+    """
+    if using not in _backends:
+        path = getattr(settings, "SEARCH_BACKEND", None) or DEFAULT_BACKENDS.get(
+            connections[using].vendor, "backend.search.SqlSearchBackend"
+        )
+        _backends[using] = import_string(path)(using)
+    return _backends[using]
+
+
+def search(queryset, query):
+    """Filters a queryset of a searchable model by the ?search= query and annotates SEARCH_RANK."""
+    return get_search_backend(queryset.db).search(queryset, search_terms(query))
@@ -0,0 +1,158 @@
+import time
+from collections import defaultdict
+from dataclasses import dataclass
+from pathlib import Path
+
+from django.core import serializers
+from django.core.management.color import no_style
+from django.db import connection, transaction
+
+from .bulk import bulk_insert, chunked, iter_json_array
+from .dashboard import invalidate_dashboard_stats
+from .models import Client, ClientSales, Company, Invoice, InvoiceItem, InvoiceNumberSequence, MonthlyRevenue, \
+    ProductSales
+from .search import SEARCHABLE_MODELS, rebuild_search_documents
+
+SEED_BATCH_SIZE = 5000
+
+FIXTURES_DIR = Path(__file__).resolve().parent / "fixtures"
+# Seed fixtures in dependency order
+SEED_FIXTURES = [
+    "users.json",
+    "companies.json",
+    "clients.json",
+    "products.json",
+    "invoices.json",
+    "invoice_items.json",
+    "addresses.json",
+]
+
+
+@dataclass
+class LoadStats:
+    label: str
+    rows: int = 0
+    seconds: float = 0.0
+
+    @property
+    def rows_per_second(self):
+        return self.rows / self.seconds if self.seconds else 0
+
+
+def _prepare(obj):
+    """Does in memory what the save hooks skipped by bulk inserts would have done."""
+    if isinstance(obj, Invoice):
+        obj.sync_number_parts()
+    elif isinstance(obj, Client):
+        obj.sync_display_name()
+    elif isinstance(obj, InvoiceItem) and None in (obj.net_total, obj.tax_amount, obj.gross_total):
+        obj.calculate_totals()
+
+
+def _new_objects(model, objects):
+    """The deserialized objects whose primary key is not in the table yet."""
+    pks = [deserialized.object.pk for deserialized in objects if deserialized.object.pk is not None]
+    existing = set(model._base_manager.filter(pk__in=pks).values_list("pk", flat=True)) if pks else set()
+    return [deserialized for deserialized in objects if deserialized.object.pk not in existing]
+
+
+def _insert_m2m(model, objects):
+    for name in {name for deserialized in objects for name in deserialized.m2m_data}:
+        field = model._meta.get_field(name)
+        through = field.remote_field.through
+        source, target = f"{field.m2m_field_name()}_id", f"{field.m2m_reverse_field_name()}_id"
+        bulk_insert(through, [
+            through(**{source: deserialized.object.pk, target: value})
+            for deserialized in objects
+            for value in deserialized.m2m_data.get(name, ())
+        ])
+
+
+def finish_seed(companies=None, totals=True, search_documents=True):
+    """
+    Set-based pass after rows were written without save(): invoice totals from the
+    items and search documents (unless the writer computed them, totals=False and
+    search_documents=False), number sequences and dashboard rollups of the given
+    company ids, all companies by default. Returns the seconds of every step.
+    """
+    steps = [
+        ("invoice totals", Invoice.recalculate_totals) if totals else None,
+        ("search documents", rebuild_search_documents) if search_documents else None,
+        ("number sequences", InvoiceNumberSequence.sync_from_invoices),
+        ("monthly revenue", MonthlyRevenue.rebuild),
+        ("product leaderboard", ProductSales.rebuild),
+        ("client leaderboard", ClientSales.rebuild),
+    ]
+    timings = {}
+    for label, step in filter(None, steps):
+        started = time.perf_counter()
+        step(companies)
+        timings[label] = time.perf_counter() - started
+
+    for company_id in companies if companies is not None else Company.objects.values_list("pk", flat=True):
+        invalidate_dashboard_stats(company_id)
+    return timings
+
+
+def load_fixtures(paths, batch_size=SEED_BATCH_SIZE):
+    """
+    Loads fixture files in the given (dependency) order in one transaction.
+    Unlike loaddata, existing rows are not updated: objects whose primary key
+    is already in the table are skipped, so a partial earlier load is completed.
+    Objects are streamed from the files and written batch_size at a time with
+    bulk_insert(), so no save() or signal runs per row. finish_seed() then brings
+    search documents, totals, sequences and rollups up to date, for the companies
+    of the loaded clients, products and invoices.
+
+    Returns (LoadStats per model label, seconds of the finishing steps).
+    """
+    stats = {}
+    models = set()
+    # Companies of the loaded clients, products and invoices, their documents and rollups are rebuilt
+    companies = set()
+    items_loaded = False
+
+    with transaction.atomic():
+        for path in paths:
+            with open(path, encoding="utf-8") as f:
+                objects = serializers.deserialize("python", iter_json_array(f))
+                started = time.perf_counter()
+                for batch in chunked(objects, batch_size):
+                    by_model = defaultdict(list)
+                    for deserialized in batch:
+                        _prepare(deserialized.object)
+                        by_model[type(deserialized.object)].append(deserialized)
+
+                    by_model = {model: _new_objects(model, objs) for model, objs in by_model.items()}
+                    for model, model_objects in by_model.items():
+                        if not model_objects:
+                            continue
+                        bulk_insert(model, [deserialized.object for deserialized in model_objects], raw=True)
+                        _insert_m2m(model, model_objects)
+                        models.add(model)
+                        if model in SEARCHABLE_MODELS:
+                            companies.update(d.object.company_id for d in model_objects)
+                        items_loaded = items_loaded or model is InvoiceItem
+
+                    # Deserializing is part of the cost, the batch time is shared by row count
+                    seconds = time.perf_counter() - started
+                    for model, model_objects in by_model.items():
+                        model_stats = stats.setdefault(model._meta.label_lower, LoadStats(model._meta.label_lower))
+                        model_stats.rows += len(model_objects)
+                        model_stats.seconds += seconds * len(model_objects) / len(batch)
+                    started = time.perf_counter()
+
+        # Explicit primary keys were written, move the auto-increment sequences past them
+        sequence_sql = connection.ops.sequence_reset_sql(no_style(), list(models))
+        if sequence_sql:
+            with connection.cursor() as cursor:
+                for sql in sequence_sql:
+                    cursor.execute(sql)
+
+        timings = {}
+        if companies:
+            timings = finish_seed(sorted(companies))
+        elif items_loaded:
+            # Items of invoices loaded earlier can belong to any company
+            timings = finish_seed()
+    return list(stats.values()), timings
@@ -0,0 +1,124 @@
+from django.db.models.signals import pre_save, post_save, pre_delete, post_delete, post_migrate
+from django.dispatch import receiver
+
+from .dashboard import invalidate_dashboard_stats
+from .middleware import invalidate_active_company
+from .models import Company, Invoice, InvoiceItem, Client, Product, ProductSales, sales_periods
+from .search import get_search_backend, build_search_document, search_documents_changed, \
+    update_search_documents
+
+
+@receiver(pre_save, sender=Invoice)
+def sync_invoice_number_parts(sender, instance, raw, update_fields=None, **kwargs):
+    """Runs for loaddata (raw) saves too, so fixtures get sortable number columns."""
+    if update_fields is not None and 'number' not in update_fields:
+        return
+    instance.sync_number_parts()
+
+
+@receiver(pre_save, sender=Client)
+def sync_client_display_name(sender, instance, raw, update_fields=None, **kwargs):
+    """Runs for loaddata (raw) saves too, so fixture clients can be sorted by name."""
+    if update_fields is not None and 'display_name' not in update_fields:
+        return
+    instance.sync_display_name()
+
+
+@receiver(post_save, sender=Invoice)
+def refresh_invoice_rollups(sender, instance, **kwargs):
+    if getattr(instance, '_refresh_rollups', True):
+        instance.refresh_rollups()
+
+
+@receiver(pre_delete, sender=Invoice)
+def remember_invoice_products(sender, instance, **kwargs):
+    """The items are gone by post_delete, their products still need new leaderboard rows."""
+    instance._deleted_product_ids = set(instance.items.values_list('product_id', flat=True))
+
+
+@receiver(post_delete, sender=Invoice)
+def refresh_deleted_invoice_rollups(sender, instance, **kwargs):
+    instance.refresh_rollups(product_ids=getattr(instance, '_deleted_product_ids', ()))
+
+
+@receiver(post_delete, sender=InvoiceItem)
+def update_deleted_item_invoice(sender, instance, origin=None, **kwargs):
+    """Lines deleted one by one or with a queryset, not with their invoice, change its totals."""
+    if not getattr(instance, '_update_invoice_totals', True):
+        return
+    if isinstance(origin, Invoice) or getattr(origin, 'model', None) is Invoice:
+        return
+    instance.invoice.update_totals(product_ids=[instance.product_id])
+
+
+@receiver(post_save, sender=InvoiceItem)
+def refresh_loaded_item_rollups(sender, instance, raw, **kwargs):
+    """Regular saves refresh through Invoice.update_totals(), loaddata bypasses it."""
+    if raw:
+        invoice = instance.invoice
+        ProductSales.refresh(
+            invoice.company_id, [instance.product_id], sales_periods(invoice.issue_date)
+        )
+        invalidate_dashboard_stats(invoice.company_id)
+
+
+@receiver(post_save, sender=Client)
+@receiver(post_delete, sender=Client)
+@receiver(post_save, sender=Product)
+@receiver(post_delete, sender=Product)
+def invalidate_dashboard(sender, instance, **kwargs):
+    """Names of clients and products are shown on the dashboard."""
+    invalidate_dashboard_stats(instance.company_id)
+
+
+@receiver(post_save, sender=Company)
+@receiver(post_delete, sender=Company)
+def invalidate_company(sender, instance, **kwargs):
+    invalidate_active_company(instance.pk)
+
+
+@receiver(pre_save, sender=Client)
+@receiver(pre_save, sender=Product)
+@receiver(pre_save, sender=Invoice)
+def sync_search_document(sender, instance, update_fields=None, **kwargs):
+    """Partial saves (update_fields) cannot add the document column, they leave it as is."""
+    if update_fields is None:
+        instance.search_document = build_search_document(instance)
+
+
+@receiver(post_save, sender=Product)
+@receiver(post_delete, sender=Product)
+@receiver(post_save, sender=Invoice)
+@receiver(post_delete, sender=Invoice)
+def invalidate_search(sender, instance, using, **kwargs):
+    search_documents_changed(sender, using)
+
+
+@receiver(post_save, sender=Client)
+def refresh_client_invoice_documents(sender, instance, created, using, **kwargs):
+    """Invoice documents contain the client's names."""
+    search_documents_changed(sender, using)
+    if not created:
+        update_search_documents(Invoice.objects.using(using).filter(client=instance))
+
+
+@receiver(post_delete, sender=Client)
+def refresh_orphaned_invoice_documents(sender, instance, using, **kwargs):
+    """Invoices of a deleted client lose it (SET_NULL), and its names with it."""
+    search_documents_changed(sender, using)
+    update_search_documents(
+        Invoice.objects.using(using).filter(company_id=instance.company_id, client__isnull=True)
+    )
+
+
+@receiver(post_migrate)
+def install_search(sender, using, **kwargs):
+    if sender.name == "backend":
+        get_search_backend(using).install()
+
+
+@receiver(post_migrate)
+def fill_client_display_names(sender, using, **kwargs):
+    """Clients written before the display_name column existed get it on the next migrate."""
+    if sender.name == "backend":
+        Client.objects.using(using).filter(display_name='').update(display_name=Client.display_name_expression())
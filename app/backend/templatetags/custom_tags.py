@@ -28,3 +28,20 @@ def sort_arrow(current_sort, current_order, column):
         return '↑' if current_order == 'asc' else '↓'
     # Domyślnie brak strzałki, gdy kolumna nie jest sortowana
     return ''
+
+
+@register.simple_tag(takes_context=True)
+def cursor_url(context, cursor, **extra):
+    """
+    Zwraca adres bieżącej listy z podanym kursorem strony.
+    - Zachowuje sortowanie i wyszukiwanie z aktualnego zapytania.
+    - Dodatkowe argumenty nadpisują parametry zapytania (np. rows=1).
+    """
+    params = context["request"].GET.copy()
+    params.pop("page", None)
+    params.pop("cursor", None)
+    if cursor:
+        params["cursor"] = cursor
+    for key, value in extra.items():
+        params[key] = value
+    return f"?{params.urlencode()}"
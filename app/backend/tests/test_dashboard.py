@@ -0,0 +1,30 @@
+from datetime import date
+
+from django.db import connection
+from django.test import TestCase
+
+from backend.dashboard import get_dashboard_stats
+from backend.models import Company, Invoice, User
+
+
+class DashboardCacheTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        user = User.objects.create_user(email="dashboard@example.com")
+        cls.company = Company.objects.create(user=user, name="Dashboard", nip="5260250274")
+
+    def _cached_rows(self):
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT COUNT(*) FROM shared_cache")
+            return cursor.fetchone()[0]
+
+    def test_stats_are_shared_and_invalidated_in_the_database(self):
+        self.assertEqual(get_dashboard_stats(self.company).latest_invoices, [])
+        # Stored in the database, every process reads and invalidates the same entry
+        self.assertEqual(self._cached_rows(), 1)
+
+        invoice = Invoice.objects.create(
+            company=self.company, issue_date=date.today(), due_date=date.today(), payment_method="transfer",
+        )
+        self.assertEqual(self._cached_rows(), 0)
+        self.assertEqual(get_dashboard_stats(self.company).latest_invoices, [invoice])
@@ -0,0 +1,48 @@
+from decimal import Decimal
+
+from django.test import TestCase
+
+from backend.imports import Importer
+from backend.models import Client, Company, Invoice, InvoiceNumberSequence, Product, User
+
+
+class ImporterTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        user = User.objects.create_user(email="imports@example.com")
+        cls.company = Company.objects.create(user=user, name="Import", nip="5260250274")
+
+    def test_clients_are_written_with_display_name_and_search_document(self):
+        result = Importer(self.company, "clients").run(enumerate([
+            {"client_company_name": "", "name": "Karolina", "surname": "Nowak", "email": "k@example.com",
+             "phone_number": "+48502345678"},
+            {"client_company_name": "Firma", "nip": "2914177762"},
+            {"name": "Bez", "nip": "1234567890"},
+        ], start=1))
+
+        self.assertEqual(result.created, 2)
+        self.assertEqual([row for row, _ in result.errors], [3])
+        client = Client.objects.get(company=self.company, surname="Nowak")
+        self.assertEqual(client.display_name, "Karolina Nowak")
+        self.assertIn("Karolina", client.search_document)
+        self.assertEqual(str(client.phone_number), "+48502345678")
+        self.assertEqual(client.pk.version, 7)
+
+    def test_unnumbered_invoices_skip_explicit_numbers(self):
+        client = Client.objects.create(company=self.company, client_company_name="PaperPro")
+        Product.objects.create(
+            company=self.company, name="Teczki", unit_type="szt", net_price=Decimal("10.00"), tax_rate=23,
+        )
+        row = {"client": "PaperPro", "product": "Teczki", "quantity": "1", "issue_date": "2025-11-05",
+               "due_date": "2025-11-19", "payment_method": "transfer"}
+        rows = [{**row, "number": "3/11/2025"}] + [{**row, "number": "", "quantity": str(n)} for n in (2, 3, 4)]
+
+        result = Importer(self.company, "invoices").run(enumerate(rows, start=1))
+
+        self.assertEqual(result.errors, [])
+        self.assertEqual(result.created, 4)
+        numbers = set(Invoice.objects.filter(client=client).values_list("number", flat=True))
+        self.assertEqual(numbers, {"3/11/2025", "4/11/2025", "5/11/2025", "6/11/2025"})
+        self.assertEqual(
+            InvoiceNumberSequence.next_number(self.company.pk, 2025, 11), 7,
+        )
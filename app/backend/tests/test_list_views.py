@@ -0,0 +1,38 @@
+from decimal import Decimal
+
+from django.test import TestCase
+from django.urls import reverse
+
+from backend.models import Company, Product, User
+from backend.views.htmx_views import LIST_BATCH_SIZE
+
+
+class GenericListModeTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(email="lists@example.com")
+        cls.company = Company.objects.create(user=cls.user, name="Lists", nip="5260250274")
+        Product.objects.bulk_create([
+            Product(company=cls.company, name=f"Produkt {number}", unit_type="szt", net_price=Decimal("1.00"),
+                    tax_rate=23)
+            for number in range(LIST_BATCH_SIZE + 1)
+        ])
+
+    def setUp(self):
+        self.client.force_login(self.user)
+        session = self.client.session
+        session["active_company_id"] = str(self.company.pk)
+        session.save()
+        self.url = reverse("htmx_list", kwargs={"kind": "products"})
+
+    def test_pages_by_default(self):
+        response = self.client.get(self.url)
+        self.assertFalse(response.context["infinite_scroll"])
+        self.assertContains(response, "Następna")
+        self.assertNotContains(response, 'hx-trigger="revealed"')
+
+    def test_infinite_scroll_is_opt_in(self):
+        response = self.client.get(self.url, {"mode": "scroll"})
+        self.assertTrue(response.context["infinite_scroll"])
+        self.assertContains(response, 'hx-trigger="revealed"')
+        self.assertContains(response, "mode=scroll")
@@ -0,0 +1,37 @@
+from django.test import RequestFactory, TestCase, override_settings
+
+from backend import middleware
+from backend.middleware import get_active_company
+from backend.models import Company, User
+
+
+@override_settings(ACTIVE_COMPANY_CACHE_SIZE=2)
+class ActiveCompanyCacheTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(email="companies@example.com")
+        cls.companies = [
+            Company.objects.create(user=cls.user, name=f"Firma {number}", nip=nip)
+            for number, nip in enumerate(("5260250274", "2914177762", "0636083773"))
+        ]
+
+    def setUp(self):
+        middleware._company_cache.clear()
+        self.addCleanup(middleware._company_cache.clear)
+
+    def _get(self, company):
+        request = RequestFactory().get("/")
+        request.user = self.user
+        request.session = {"active_company_id": str(company.pk)}
+        return get_active_company(request)
+
+    def test_least_recently_used_companies_are_dropped(self):
+        first, second, third = self.companies
+        self._get(first)
+        self._get(second)
+        # A hit makes the first company the most recently used one
+        with self.assertNumQueries(0):
+            self.assertEqual(self._get(first), first)
+        self._get(third)
+
+        self.assertEqual(list(middleware._company_cache), [str(first.pk), str(third.pk)])
@@ -0,0 +1,41 @@
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date
+from unittest import skipUnless
+
+from django.db import connection
+from django.test import TransactionTestCase
+
+from backend.models import Company, Invoice, User, parse_invoice_number
+
+THREADS = 8
+INVOICES_PER_THREAD = 25
+
+
+@skipUnless(connection.vendor == "postgresql", "Needs the row level locks of PostgreSQL.")
+class ConcurrentNumberingTests(TransactionTestCase):
+    """Invoices created from parallel threads, each with its own connection, get unique gapless numbers."""
+
+    def setUp(self):
+        user = User.objects.create_user(email="numbering@example.com")
+        self.company = Company.objects.create(user=user, name="Numbering", nip="5260250274")
+
+    def _create_invoices(self, count):
+        today = date.today()
+        try:
+            for _ in range(count):
+                Invoice.objects.create(
+                    company=self.company, issue_date=today, due_date=today, payment_method="transfer",
+                )
+        finally:
+            connection.close()
+
+    def test_parallel_invoices_get_unique_gapless_numbers(self):
+        with ThreadPoolExecutor(max_workers=THREADS) as pool:
+            # result() re-raises the errors of the threads
+            for future in [pool.submit(self._create_invoices, INVOICES_PER_THREAD) for _ in range(THREADS)]:
+                future.result()
+
+        numbers = list(Invoice.objects.filter(company=self.company).values_list("number", flat=True))
+        self.assertEqual(len(numbers), len(set(numbers)))
+        sequences = sorted(parse_invoice_number(number)[0] for number in numbers)
+        self.assertEqual(sequences, list(range(1, THREADS * INVOICES_PER_THREAD + 1)))
@@ -0,0 +1,99 @@
+from datetime import date, datetime, timedelta, timezone as dt_timezone
+from decimal import Decimal
+
+from django.test import TestCase
+
+from backend.lists import ROW_LOADERS
+from backend.models import Client, Company, Invoice, Product, User
+from backend.pagination import KeysetPaginator
+
+PRODUCTS = 61
+PER_PAGE = 7
+
+
+class KeysetWalkTests(TestCase):
+    """Walking a list with the next and previous cursors returns every row exactly once."""
+
+    @classmethod
+    def setUpTestData(cls):
+        user = User.objects.create_user(email="pagination@example.com")
+        cls.company = Company.objects.create(user=user, name="Pagination", nip="5260250274")
+        products = Product.objects.bulk_create([
+            Product(
+                company=cls.company, name=f"Produkt {number % 13}", unit_type="szt",
+                net_price=Decimal(number % 9) + Decimal("0.99"), tax_rate=23,
+            )
+            for number in range(PRODUCTS)
+        ])
+        # Microsecond timestamps that differ below a millisecond, with ties every fifth row
+        start = datetime(2025, 10, 1, 12, tzinfo=dt_timezone.utc)
+        for number, product in enumerate(products):
+            product.created_at = start + timedelta(microseconds=(number - number % 5 * (number % 2)) * 137)
+        Product.objects.bulk_update(products, ["created_at"])
+        cls.pks = {product.pk for product in products}
+
+    def _walk(self, sort):
+        paginator = KeysetPaginator(
+            ROW_LOADERS["products"].load(self.company, sort=sort), PER_PAGE, count_mode="none",
+        )
+        pages = [paginator.get_page()]
+        # Bounded, a cursor that does not move on would walk forever
+        while pages[-1].has_next() and len(pages) <= PRODUCTS:
+            pages.append(paginator.get_page(pages[-1].next_cursor))
+        return paginator, pages
+
+    def assertWalksEveryRowOnce(self, sort):
+        paginator, pages = self._walk(sort)
+        forward = [product.pk for page in pages for product in page]
+        self.assertEqual(len(forward), PRODUCTS)
+        self.assertEqual(set(forward), self.pks)
+
+        backward = [product.pk for product in pages[-1]]
+        page = pages[-1]
+        while page.has_previous() and len(backward) <= PRODUCTS:
+            page = paginator.get_page(page.previous_cursor)
+            backward[:0] = [product.pk for product in page]
+        self.assertEqual(backward, forward)
+
+    def test_created_at_descending(self):
+        self.assertWalksEveryRowOnce("-created_at")
+
+    def test_created_at_ascending(self):
+        self.assertWalksEveryRowOnce("created_at")
+
+    def test_decimal_and_text_sorts(self):
+        for sort in ("net_price", "-net_price", "name", "-name"):
+            with self.subTest(sort=sort):
+                self.assertWalksEveryRowOnce(sort)
+
+
+class InvoiceClientSortTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        user = User.objects.create_user(email="client-sort@example.com")
+        cls.company = Company.objects.create(user=user, name="Client sort", nip="5260250274")
+        # Company clients have no first name, people are named by first name and surname
+        for client in (
+            Client(company=cls.company, client_company_name="Zakład Wodny"),
+            Client(company=cls.company, name="Adam", surname="Nowak"),
+            Client(company=cls.company, client_company_name="Biuro Rachunkowe"),
+        ):
+            client.save()
+            Invoice.objects.create(
+                company=cls.company, client=client, issue_date=date(2025, 11, 5), due_date=date(2025, 11, 19),
+                payment_method="transfer",
+            )
+
+    def test_client_sort_orders_by_display_name(self):
+        for sort, expected in (
+            ("client__name", ["Adam Nowak", "Biuro Rachunkowe", "Zakład Wodny"]),
+            ("-client__name", ["Zakład Wodny", "Biuro Rachunkowe", "Adam Nowak"]),
+        ):
+            with self.subTest(sort=sort):
+                paginator = KeysetPaginator(
+                    ROW_LOADERS["invoices"].load(self.company, sort=sort), 2, count_mode="none",
+                )
+                first = paginator.get_page()
+                second = paginator.get_page(first.next_cursor)
+                names = [invoice.client.display_name for page in (first, second) for invoice in page]
+                self.assertEqual(names, expected)
@@ -0,0 +1,41 @@
+import os
+import tempfile
+from pathlib import Path
+
+from django.test import SimpleTestCase, override_settings
+
+from backend import pdf
+
+
+class PdfCacheEvictionTests(SimpleTestCase):
+    def setUp(self):
+        self.cache_dir = Path(self.enterContext(tempfile.TemporaryDirectory()))
+        self.enterContext(override_settings(INVOICE_PDF_CACHE_DIR=self.cache_dir, INVOICE_PDF_CACHE_MAX_BYTES=250))
+        pdf._cache_size = None
+        self.addCleanup(setattr, pdf, "_cache_size", None)
+
+    def _write(self, name, mtime):
+        path = self.cache_dir / name[:2] / f"{name}.pdf"
+        pdf._write_atomic(path, b"x" * 100)
+        os.utime(path, (mtime, mtime))
+        self._wait_for_eviction()
+        return path
+
+    @staticmethod
+    def _wait_for_eviction():
+        if pdf._eviction_thread is not None:
+            pdf._eviction_thread.join()
+
+    def test_cache_is_only_scanned_above_the_limit(self):
+        first = self._write("aa1", 1)
+        # The first write scans once to learn the size, the next ones only count
+        started = pdf._eviction_thread
+        second = self._write("bb2", 2)
+        self.assertIs(pdf._eviction_thread, started)
+        self.assertEqual(pdf._cache_size, 200)
+
+        third = self._write("cc3", 3)
+        self.assertIsNot(pdf._eviction_thread, started)
+        self.assertFalse(first.exists())
+        self.assertTrue(second.exists() and third.exists())
+        self.assertEqual(pdf._cache_size, 200)
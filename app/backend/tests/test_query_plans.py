@@ -0,0 +1,29 @@
+from unittest import skipUnless
+
+from django.db import connection
+from django.db.models import Count
+from django.test import TestCase
+
+from backend.dataset import DatasetGenerator
+from backend.models import Company
+from backend.query_plans import explain_workloads, format_plan
+
+
+@skipUnless(connection.vendor == "postgresql", "Query plans are only checked on PostgreSQL.")
+class QueryPlanTests(TestCase):
+    """The workloads of check_query_plans read no large table with a sequential scan."""
+
+    @classmethod
+    def setUpTestData(cls):
+        # Large enough for the invoices, items and clients to pass PLAN_CHECK_MIN_ROWS
+        DatasetGenerator(companies=5, clients=2000, products=500, invoices=20000, max_items=5).run()
+        cls.company = Company.objects.annotate(invoice_count=Count("invoices")).order_by("-invoice_count").first()
+
+    def test_workloads_use_indexes(self):
+        plans = explain_workloads(self.company)
+        self.assertTrue(plans)
+        failed = {
+            plan.label: [plan.sql, *format_plan(plan.plan[0]["Plan"])]
+            for plan in plans if plan.seq_scans
+        }
+        self.assertEqual(failed, {})
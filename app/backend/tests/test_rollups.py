@@ -0,0 +1,60 @@
+from datetime import date
+from decimal import Decimal
+
+from django.test import TestCase
+
+from backend.models import ALL_TIME, Client, Company, Invoice, InvoiceItem, MonthlyRevenue, Product, \
+    ProductSales, User
+
+
+class DeletedItemRollupTests(TestCase):
+    """Deleting invoice lines updates the invoice totals, the monthly revenue and the product leaderboard."""
+
+    @classmethod
+    def setUpTestData(cls):
+        user = User.objects.create_user(email="rollups@example.com")
+        cls.company = Company.objects.create(user=user, name="Rollups", nip="5260250274")
+        cls.client_ = Client.objects.create(company=cls.company, client_company_name="PaperPro")
+        cls.folders, cls.paper = (
+            Product.objects.create(
+                company=cls.company, name=name, unit_type="szt", net_price=Decimal("10.00"), tax_rate=23,
+            )
+            for name in ("Teczki", "Papier")
+        )
+
+    def setUp(self):
+        self.invoice = Invoice(
+            company=self.company, client=self.client_, issue_date=date(2025, 11, 5), due_date=date(2025, 11, 19),
+            payment_method="transfer",
+        )
+        self.invoice.save(refresh_rollups=False)
+        self.invoice.save_items([
+            InvoiceItem(product=self.folders, quantity=1),
+            InvoiceItem(product=self.paper, quantity=2),
+        ])
+        self.paper_item = self.invoice.items.get(product=self.paper)
+
+    def assertOnlyFoldersCount(self):
+        self.invoice.refresh_from_db()
+        self.assertEqual(self.invoice.total_net, Decimal("10.00"))
+        revenue = MonthlyRevenue.objects.get(company=self.company, year=2025, month=11)
+        self.assertEqual(revenue.total_net, Decimal("10.00"))
+        self.assertFalse(ProductSales.objects.filter(product=self.paper, period=ALL_TIME, revenue__gt=0).exists())
+        self.assertTrue(ProductSales.objects.filter(product=self.folders, period=ALL_TIME, revenue=10).exists())
+
+    def test_save_items_deletes_lines(self):
+        self.invoice.save_items([], deleted_items=[self.paper_item])
+        self.assertOnlyFoldersCount()
+
+    def test_single_line_delete(self):
+        self.paper_item.delete()
+        self.assertOnlyFoldersCount()
+
+    def test_queryset_delete(self):
+        InvoiceItem.objects.filter(pk=self.paper_item.pk).delete()
+        self.assertOnlyFoldersCount()
+
+    def test_invoice_delete_clears_its_rollups(self):
+        self.invoice.delete()
+        self.assertFalse(MonthlyRevenue.objects.filter(company=self.company, total_net__gt=0).exists())
+        self.assertFalse(ProductSales.objects.filter(company=self.company, revenue__gt=0).exists())
@@ -0,0 +1,36 @@
+from django.test import TestCase
+
+from backend.models import Client, Company, User
+from backend.search import RANKED, search
+
+
+class SearchTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        user = User.objects.create_user(email="search@example.com")
+        cls.company = Company.objects.create(user=user, name="Search", nip="5260250274")
+        cls.clients = Client.objects.filter(company=cls.company)
+
+    def _search(self, query):
+        return [client.display_name for client in search(self.clients, query).order_by(RANKED, "display_name")]
+
+    def test_rows_written_in_the_transaction_are_found(self):
+        Client.objects.create(company=self.company, name="Karolina", surname="Nowak")
+        self.assertEqual(self._search("karolina"), ["Karolina Nowak"])
+
+    def test_whole_words_rank_above_prefixes_and_substrings(self):
+        for name in ("Annapolis", "Anna", "Joanna"):
+            Client.objects.create(company=self.company, name=name, surname="Kowalska")
+        self.assertEqual(
+            self._search("anna kowalska"), ["Anna Kowalska", "Annapolis Kowalska", "Joanna Kowalska"],
+        )
+
+    def test_short_terms_are_filtered_in_the_query(self):
+        Client.objects.bulk_create([
+            Client(company=self.company, client_company_name=f"Firma {number}", search_document=f"Firma {number}")
+            for number in range(500)
+        ])
+        queryset = search(self.clients, "a")
+        # No list of matching keys is sent back to the database
+        self.assertNotIn(" IN (", str(queryset.query))
+        self.assertEqual(queryset.count(), 500)
@@ -0,0 +1,33 @@
+from django.db import connection
+from django.test import TestCase
+
+from backend.models import Client, Company, Product
+from backend.search import get_search_backend
+from backend.seed import FIXTURES_DIR, SEED_FIXTURES, load_fixtures
+
+
+class LoadFixturesTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        load_fixtures([FIXTURES_DIR / name for name in SEED_FIXTURES])
+
+    def test_every_loaded_company_is_searchable(self):
+        # Companies without invoices too, their clients and products are still searched
+        self.assertFalse(Client.objects.filter(search_document="").exists())
+        self.assertFalse(Product.objects.filter(search_document="").exists())
+        company = Company.objects.get(name="Test water company")
+        clients = get_search_backend(connection.alias).search(Client.objects.filter(company=company), ["Karolina"])
+        self.assertEqual(clients.count(), 1)
+
+
+class PartialSeedTests(TestCase):
+    def test_rows_loaded_earlier_are_skipped(self):
+        paths = [FIXTURES_DIR / name for name in SEED_FIXTURES]
+        # An earlier load stopped after the users, the companies were never written
+        load_fixtures(paths[:1])
+        stats, _ = load_fixtures(paths)
+
+        rows = {model_stats.label: model_stats.rows for model_stats in stats}
+        self.assertEqual(rows["backend.user"], 0)
+        self.assertEqual(rows["backend.company"], Company.objects.count())
+        self.assertTrue(Client.objects.exclude(search_document="").exists())
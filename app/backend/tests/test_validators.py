@@ -0,0 +1,96 @@
+import random
+
+from django.core.exceptions import ValidationError
+from django.test import SimpleTestCase
+
+from backend import validators
+from backend.validators import NIP_WEIGHTS, REGON_9_WEIGHTS, REGON_14_WEIGHTS, nip_error_codes, \
+    random_identifier, regon_error_codes, validate_nip, validate_regon
+
+SAMPLES = 20000
+# Characters of the random identifiers: ASCII and other Unicode decimal digits, digits
+# that are not decimal, letters and separators seen in pasted identifiers
+ALPHABET = "0123456789" * 4 + "٠١٢٣٤٥٦٧٨٩" + "０１２３４５６７８９" + "²³¹" + "abcXYZ" + " -./"
+
+
+def _mutate(rng, value):
+    position = rng.randrange(len(value))
+    mutation = rng.randrange(5)
+    if mutation == 0:
+        return value[:position] + str(rng.randrange(10)) + value[position + 1:]
+    if mutation == 1 and len(value) > 1:
+        other = rng.randrange(len(value))
+        chars = list(value)
+        chars[position], chars[other] = chars[other], chars[position]
+        return "".join(chars)
+    if mutation == 2:
+        return value[:position] + value[position + 1:]
+    if mutation == 3:
+        return value[:position] + rng.choice(ALPHABET) + value[position:]
+    return value[:position] + rng.choice(ALPHABET) + value[position + 1:]
+
+
+def _samples(rng, count, checksum_weights):
+    """Valid identifiers, valid ones with one mutation and random strings of identifier and other lengths."""
+    samples = []
+    for _ in range(count):
+        kind = rng.randrange(4)
+        if kind == 0:
+            samples.append(random_identifier(rng, rng.choice(checksum_weights)))
+        elif kind == 1:
+            samples.append(_mutate(rng, random_identifier(rng, rng.choice(checksum_weights))))
+        elif kind == 2:
+            length = rng.choice([len(w) + 1 for w in checksum_weights])
+            samples.append("".join(rng.choice(ALPHABET) for _ in range(length)))
+        else:
+            samples.append("".join(rng.choice(ALPHABET) for _ in range(rng.randrange(17))))
+    return samples
+
+
+def _scalar_code(validator, value):
+    try:
+        validator(value)
+    except ValidationError as e:
+        return e.code
+    return None
+
+
+class BatchValidatorTests(SimpleTestCase):
+    """The batch NIP/REGON validators return exactly the error codes of validate_nip() and validate_regon()."""
+
+    CASES = [
+        ("NIP", validate_nip, nip_error_codes, [NIP_WEIGHTS]),
+        ("REGON", validate_regon, regon_error_codes, [REGON_9_WEIGHTS, REGON_14_WEIGHTS]),
+    ]
+
+    def assertMatchesScalar(self, validator, error_codes, weights, vectorized):
+        samples = _samples(random.Random(0), SAMPLES, weights)
+        expected = [_scalar_code(validator, value) for value in samples]
+        self.assertTrue(any(code is None for code in expected))
+
+        mismatches = [
+            (value, scalar, batch)
+            for value, scalar, batch in zip(samples, expected, error_codes(samples, vectorized=vectorized))
+            if scalar != batch
+        ]
+        # Small batches exercise the grouping with one or no value per length
+        for start in range(0, 2000, 7):
+            chunk, chunk_expected = samples[start:start + 7], expected[start:start + 7]
+            mismatches += [
+                (value, scalar, batch)
+                for value, scalar, batch in zip(chunk, chunk_expected, error_codes(chunk, vectorized=vectorized))
+                if scalar != batch
+            ]
+        self.assertEqual(mismatches[:10], [])
+
+    def test_python(self):
+        for label, validator, error_codes, weights in self.CASES:
+            with self.subTest(label):
+                self.assertMatchesScalar(validator, error_codes, weights, vectorized=False)
+
+    def test_numpy(self):
+        if validators.np is None:
+            self.skipTest("NumPy is not installed.")
+        for label, validator, error_codes, weights in self.CASES:
+            with self.subTest(label):
+                self.assertMatchesScalar(validator, error_codes, weights, vectorized=True)
@@ -12,7 +12,7 @@ from ..views.htmx_views import (
     htmx_home, htmx_home_top_products, htmx_home_top_clients,
     htmx_home_latest_invoices, htmx_home_calendar, htmx_generic_list,
     htmx_invoice_add, htmx_invoice_add_item, htmx_invoice_item_autofill,
-    htmx_home_chart,
+    htmx_home_chart, htmx_generic_export,
 )
 
 
@@ -27,6 +27,7 @@ urlpatterns = [
 
     # Section wrappers for SPA swaps
     path("<str:kind>/", htmx_generic_list, name="htmx_list"),
+    path("<str:kind>/export/<str:file_format>/", htmx_generic_export, name="htmx_list_export"),
 
     # Invoices
     path("invoices/<uuid:pk>/", InvoiceDetailHTMXView.as_view(), name="htmx_invoice_detail"),
@@ -41,6 +41,10 @@ urlpatterns = [
     #invoices
     path("invoices/", InvoicesListView.as_view(), name="tmp_invoices"),
     path("invoices/add/", InvoiceCreateView.as_view(), name="tmp_invoice_add"),
+    path("invoices/export/pdf/", templates_views.invoice_pdf_export, name="tmp_invoice_pdf_export"),
+
+    #import
+    path("import/", templates_views.import_view, name="tmp_import"),
     path("invoices/<uuid:pk>/", InvoiceDetailView.as_view(), name="tmp_invoice_detail"),
     path("invoices/<uuid:pk>/pdf/", invoice_pdf, name='invoice_pdf'),
     path("invoices/<uuid:pk>/toggle-paid/", templates_views.toggle_invoice_paid, name="tmp_toggle_invoice_paid")
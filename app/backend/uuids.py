@@ -0,0 +1,84 @@
+import os
+import threading
+import time
+import uuid
+from datetime import datetime, time as dt_time, timezone as dt_timezone
+
+# Layout of a version 7 UUID (RFC 9562): 48 bits of Unix time in milliseconds,
+# the version, 12 bits of rand_a, the variant and 62 bits of rand_b
+_TIME_MASK = (1 << 48) - 1
+_RAND_A_BITS = 12
+_RAND_B_BITS = 62
+_RAND_A_MAX = (1 << _RAND_A_BITS) - 1
+# The counter of a new millisecond starts below half of rand_a, so it rarely overflows
+_COUNTER_START_BITS = _RAND_A_BITS - 1
+
+
+def _urandom_bits(bits):
+    return int.from_bytes(os.urandom((bits + 7) // 8)) & ((1 << bits) - 1)
+
+
+def _uuid7(unix_ms, rand_a, rand_b):
+    return uuid.UUID(int=(unix_ms & _TIME_MASK) << 80 | 7 << 76 | rand_a << 64 | 0b10 << 62 | rand_b)
+
+
+def unix_ms(moment):
+    """Milliseconds since the epoch of a datetime (naive ones are UTC) or of midnight of a date."""
+    if not isinstance(moment, datetime):
+        moment = datetime.combine(moment, dt_time())
+    if moment.tzinfo is None:
+        moment = moment.replace(tzinfo=dt_timezone.utc)
+    return int(moment.timestamp() * 1000)
+
+
+def uuid7_at(moment, randbits=_urandom_bits):
+    """
+    A version 7 UUID of a given datetime or date, for rows written with their own
+    creation time. Ids of the same millisecond are in random order.
+    """
+    return _uuid7(unix_ms(moment), randbits(_RAND_A_BITS), randbits(_RAND_B_BITS))
+
+
+class UUID7Generator:
+    """
+    Version 7 UUIDs that strictly increase in the order they are generated: rand_a
+    counts the ids of a millisecond (RFC 9562, method 1) and the time is moved on
+    when the clock goes back or the counter runs out. The ids of one generator
+    sort in creation order, those of different processes by millisecond.
+
+    randbits(bits) draws the random bits, a seeded random.Random().getrandbits
+    makes the ids reproducible.
+    """
+
+    def __init__(self, randbits=_urandom_bits):
+        self.randbits = randbits
+        self._lock = threading.Lock()
+        self._last_ms = -1
+        self._counter = 0
+
+    def __call__(self, moment=None):
+        """The next id, of the current time or of a given datetime or date (ids never go back in time)."""
+        now_ms = time.time_ns() // 1_000_000 if moment is None else unix_ms(moment)
+        with self._lock:
+            if now_ms > self._last_ms:
+                self._last_ms, self._counter = now_ms, self.randbits(_COUNTER_START_BITS)
+            elif self._counter < _RAND_A_MAX:
+                self._counter += 1
+            else:
+                self._last_ms, self._counter = self._last_ms + 1, 0
+            return _uuid7(self._last_ms, self._counter, self.randbits(_RAND_B_BITS))
+
+
+_generator = UUID7Generator()
+
+
+def uuid7():
+    """A new time-ordered UUID, the primary key default of UUIDModel."""
+    return _generator()
+
+
+def uuid7_time(value):
+    """The UTC creation time of a version 7 UUID, None for other versions."""
+    if value.version != 7:
+        return None
+    return datetime.fromtimestamp((value.int >> 80) / 1000, tz=dt_timezone.utc)
@@ -0,0 +1,110 @@
+from operator import mul
+
+from django.core.exceptions import ValidationError
+
+try:
+    import numpy as np
+except ImportError:  # pragma: no cover - numpy is optional, the batch API falls back to Python
+    np = None
+
+NIP_WEIGHTS = (6, 5, 7, 2, 3, 4, 5, 6, 7)
+REGON_9_WEIGHTS = (8, 9, 2, 3, 4, 5, 6, 7)
+REGON_14_WEIGHTS = (2, 4, 8, 5, 0, 9, 7, 3, 6, 1, 0, 5, 9)
+
+# Error codes of the validators, shared by the scalar and the batch API
+INVALID_FORMAT = 'invalid_format'
+INVALID_CHECKSUM = 'invalid_checksum'
+
+NIP_MESSAGES = {
+    INVALID_FORMAT: "NIP musi składać się z 10 cyfr.",
+    INVALID_CHECKSUM: "NIP jest nieprawidłowy.",
+}
+REGON_MESSAGES = {
+    INVALID_FORMAT: "REGON musi zawierać 9 lub 14 cyfr.",
+    INVALID_CHECKSUM: "REGON jest nieprawidłowy.",
+}
+
+# Below this many identifiers of one length the NumPy setup costs more than it saves
+VECTORIZE_MIN_BATCH = 64
+
+
+def random_identifier(rng, weights):
+    """Random digits with a valid check digit for the weights, e.g. a NIP for NIP_WEIGHTS (test data)."""
+    while True:
+        digits = [rng.randrange(10) for _ in weights]
+        check = sum(map(mul, digits, weights)) % 11
+        if check != 10:
+            return "".join(map(str, digits)) + str(check)
+
+
+def validate_nip(nip):
+    if len(nip) != 10 or not nip.isdecimal():
+        raise ValidationError(NIP_MESSAGES[INVALID_FORMAT], code=INVALID_FORMAT)
+    control_sum = sum([int(nip[i]) * NIP_WEIGHTS[i] for i in range(9)])
+    if control_sum % 11 != int(nip[9]):
+        raise ValidationError(NIP_MESSAGES[INVALID_CHECKSUM], code=INVALID_CHECKSUM)
+
+
+def validate_regon(regon):
+    if len(regon) not in (9, 14) or not regon.isdecimal():
+        raise ValidationError(REGON_MESSAGES[INVALID_FORMAT], code=INVALID_FORMAT)
+
+    if len(regon) == 9:
+        control_sum = sum([int(regon[i]) * REGON_9_WEIGHTS[i] for i in range(8)])
+        if control_sum % 11 != int(regon[8]):
+            raise ValidationError(REGON_MESSAGES[INVALID_CHECKSUM], code=INVALID_CHECKSUM)
+    elif len(regon) == 14:
+        control_sum = sum([int(regon[i]) * REGON_14_WEIGHTS[i] for i in range(13)])
+        if control_sum % 11 != int(regon[13]):
+            raise ValidationError(REGON_MESSAGES[INVALID_CHECKSUM], code=INVALID_CHECKSUM)
+
+
+def _checksums_match(values, weights, vectorized):
+    """
+    For strings of len(weights) + 1 digits, whether the weighted sum of the first
+    digits modulo 11 equals the last one. ASCII strings are checked as one
+    (rows x digits) matrix product when NumPy is available.
+    """
+    if vectorized and values:
+        raw = np.frombuffer("".join(values).encode("ascii"), dtype=np.uint8)
+        digits = raw.reshape(len(values), len(weights) + 1).astype(np.int64) - ord("0")
+        return ((digits[:, :-1] @ np.array(weights, dtype=np.int64)) % 11 == digits[:, -1]).tolist()
+    return [sum(map(mul, map(int, value[:-1]), weights)) % 11 == int(value[-1]) for value in values]
+
+
+def _error_codes(values, weights_by_length, vectorized):
+    if vectorized is None:
+        vectorized = np is not None and len(values) >= VECTORIZE_MIN_BATCH
+    elif vectorized and np is None:
+        raise ImportError("Vectorized validation requires NumPy.")
+
+    codes = [INVALID_FORMAT] * len(values)
+    # length -> (row indexes, values), ASCII digits and other Unicode decimal digits apart
+    ascii_groups = {length: ([], []) for length in weights_by_length}
+    other_groups = {length: ([], []) for length in weights_by_length}
+    for index, value in enumerate(values):
+        if not isinstance(value, str) or len(value) not in weights_by_length or not value.isdecimal():
+            continue
+        indexes, group = (ascii_groups if value.isascii() else other_groups)[len(value)]
+        indexes.append(index)
+        group.append(value)
+
+    for groups, use_numpy in ((ascii_groups, vectorized), (other_groups, False)):
+        for length, (indexes, group) in groups.items():
+            for index, valid in zip(indexes, _checksums_match(group, weights_by_length[length], use_numpy)):
+                codes[index] = None if valid else INVALID_CHECKSUM
+    return codes
+
+
+def nip_error_codes(values, vectorized=None):
+    """
+    Validates a sequence of NIP strings at once. Returns one error code per value,
+    None for valid ones, the same code validate_nip() would raise otherwise.
+    vectorized=None uses NumPy for large batches when it is installed.
+    """
+    return _error_codes(values, {10: NIP_WEIGHTS}, vectorized)
+
+
+def regon_error_codes(values, vectorized=None):
+    """Like nip_error_codes(), for REGON numbers of 9 and 14 digits."""
+    return _error_codes(values, {9: REGON_9_WEIGHTS, 14: REGON_14_WEIGHTS}, vectorized)
@@ -1,10 +1,11 @@
 from django.contrib.auth.mixins import LoginRequiredMixin
 from django.core.paginator import Paginator
-from django.http import HttpResponse
+from django.http import HttpResponse, StreamingHttpResponse
 from django.views.generic import ListView, DetailView, View, CreateView, UpdateView, DeleteView
 from django.urls import reverse_lazy
 from django.db.models import Q
 
+from ..documents import InvoiceDocumentMixin
 from ..models import Invoice, Client, Product
 from ..forms.templates_forms.forms import ClientForm, ProductForm, InvoiceForm, \
     InvoiceItemFormSet, InvoiceItemForm
@@ -14,16 +15,11 @@ def is_hx(request) -> bool:
     return request.headers.get('HX-Request', 'false') == 'true'
 
 
-class InvoiceDetailHTMXView(LoginRequiredMixin, DetailView):
+class InvoiceDetailHTMXView(LoginRequiredMixin, InvoiceDocumentMixin, DetailView):
     model = Invoice
     template_name = 'htmx_templates/invoice_detail_htmx.html'
     context_object_name = 'invoice'
 
-    def get_context_data(self, **kwargs):
-        context = super().get_context_data(**kwargs)
-        context['items'] = self.object.items.all()
-        return context
-
 
 class ToggleInvoicePaidHTMXView(LoginRequiredMixin, View):
     def post(self, request, pk):
@@ -47,15 +43,10 @@ class ClientCreateHTMXView(LoginRequiredMixin, CreateView):
     template_name = 'htmx_templates/client_create_htmx.html'
 
     def form_valid(self, form):
-        active_company_id = self.request.session.get('active_company_id')
-        if not active_company_id:
+        company = self.request.company
+        if not company:
             form.add_error(None, 'Nie wybrano aktywnej firmy.')
             return self.form_invalid(form)
-        try:
-            company = Company.objects.get(id=active_company_id, user=self.request.user)
-        except Company.DoesNotExist:
-            form.add_error(None, 'Aktywna firma nie istnieje.')
-            return self.form_invalid(form)
         form.instance.company = company
         response = super().form_valid(form)
         return response
@@ -72,12 +63,7 @@ class ProductsListHTMXView(LoginRequiredMixin, ListView):
     paginate_by = 10
 
     def get_queryset(self):
-        company_id = self.request.session.get('active_company_id')
-        if not company_id:
-            return Product.objects.none()
-        queryset = Product.objects.filter(company_id=company_id, company__user=self.request.user)
-        sort_param = self.request.GET.get('sort', '-created_at')
-        return queryset.order_by(sort_param)
+        return get_product_queryset(self.request)
 
     def dispatch(self, request, *args, **kwargs):
         if not request.session.get('active_company_id'):
@@ -114,15 +100,11 @@ class ProductCreateHTMXView(LoginRequiredMixin, CreateView):
     template_name = 'htmx_templates/product_create_htmx.html'
 
     def form_valid(self, form):
-        active_company_id = self.request.session.get('active_company_id')
-        if not active_company_id:
+        company = self.request.company
+        if not company:
             form.add_error(None, 'Nie wybrano aktywnej firmy.')
             return self.form_invalid(form)
-        try:
-            form.instance.company = Company.objects.get(id=active_company_id, user=self.request.user)
-        except Company.DoesNotExist:
-            form.add_error(None, 'Aktywna firma nie istnieje.')
-            return self.form_invalid(form)
+        form.instance.company = company
         return super().form_valid(form)
 
     def get_success_url(self):
@@ -153,12 +135,19 @@ from django.contrib.auth.mixins import LoginRequiredMixin
 from django.shortcuts import redirect, get_object_or_404, render
 from django.views.generic import ListView, DetailView, View, CreateView, UpdateView, DeleteView
 from django.urls import reverse, reverse_lazy
-from django.db.models import Case, When, Value, CharField, Sum
-from django.db.models.functions import Concat, TruncMonth, Round
+from django.db.models import Sum
+from django.db.models.functions import TruncMonth, Round
 from django.contrib.auth.decorators import login_required
-from datetime import datetime
-
-from ..models import Invoice, Client, Company, Product
+from django.template.loader import render_to_string
+from datetime import date, datetime
+import time
+
+from ..dashboard import get_dashboard_stats
+from ..documents import InvoiceDocumentMixin
+from ..exports import stream_csv, stream_xlsx
+from ..lists import ROW_LOADERS
+from ..pagination import KeysetPaginator, adapt_batch_size
+from ..models import Invoice, Client, Company, Product, current_period
 from ..forms.templates_forms.forms import ClientForm, ProductForm
 
 
@@ -173,27 +162,7 @@ class InvoicesListHTMXView(LoginRequiredMixin, ListView):
     paginate_by = 10
 
     def get_queryset(self):
-        company_id = self.request.session.get('active_company_id')
-        if not company_id:
-            return self.model.objects.none()
-
-        queryset = self.model.objects.filter(company__user=self.request.user, company_id=company_id)
-        sort_param = self.request.GET.get('sort', '-issue_date')
-
-        if sort_param.lstrip('-') == 'number':
-            reverse_sort = sort_param.startswith('-')
-            queryset = sorted(
-                queryset,
-                key=lambda inv: (
-                    int(inv.number.split('/')[2]),
-                    int(inv.number.split('/')[1]),
-                    int(inv.number.split('/')[0])
-                ),
-                reverse=reverse_sort
-            )
-        else:
-            queryset = queryset.order_by(sort_param)
-        return queryset
+        return get_invoice_queryset(self.request)
 
     def dispatch(self, request, *args, **kwargs):
         if not request.session.get('active_company_id'):
@@ -214,16 +183,11 @@ class InvoicesListHTMXView(LoginRequiredMixin, ListView):
         return super().render_to_response(context, **response_kwargs)
 
 
-class InvoiceDetailHTMXView(LoginRequiredMixin, DetailView):
+class InvoiceDetailHTMXView(LoginRequiredMixin, InvoiceDocumentMixin, DetailView):
     model = Invoice
     template_name = 'htmx_templates/invoice_detail_htmx.html'
     context_object_name = 'invoice'
 
-    def get_context_data(self, **kwargs):
-        context = super().get_context_data(**kwargs)
-        context['items'] = self.object.items.all()
-        return context
-
 
 class ToggleInvoicePaidHTMXView(LoginRequiredMixin, View):
     def post(self, request, pk):
@@ -236,36 +200,29 @@ class ToggleInvoicePaidHTMXView(LoginRequiredMixin, View):
 # ==== HTMX Home ====
 @login_required
 def htmx_home(request):
-    active_company = None
-    monthly_revenue = 0
-    yearly_revenue = 0
-    monthly_revenues_json = {}
-
-    company_id = request.session.get('active_company_id')
-    if company_id:
-        try:
-            active_company = Company.objects.get(id=company_id, user=request.user)
-
-            monthly_revenues_json = active_company.get_monthly_revenues_json()
-            monthly_revenue = active_company.get_current_monthly_revenue()
-            yearly_revenue = active_company.get_yearly_revenue()
-        except Company.DoesNotExist:
-            active_company = None
+    active_company = get_active_company(request)
+    stats = get_dashboard_stats(active_company) if active_company else None
 
     return render(
         request,
         'htmx_templates/home_authenticated_htmx.html',
         {
             'active_company': active_company,
-            'monthly_revenues': monthly_revenues_json,
-            'monthly_revenue': monthly_revenue,
-            'yearly_revenue': yearly_revenue,
+            'monthly_revenues': stats.monthly_revenues_json if stats else {},
+            'monthly_revenue': stats.monthly_revenue if stats else 0,
+            'yearly_revenue': stats.yearly_revenue if stats else 0,
         }
     )
 
 def htmx_home_top_products(request):
     company = get_active_company(request)
-    products = company.get_top_products() if company else []
+    window = request.GET.get('window', 'all')
+    if not company:
+        products = []
+    elif window == 'all':
+        products = get_dashboard_stats(company).top_products
+    else:
+        products = company.get_top_products(period=current_period(window))
     return render(
         request,
         'htmx_templates/partials/home/_top_products.html',
@@ -274,7 +231,13 @@ def htmx_home_top_products(request):
 
 def htmx_home_top_clients(request):
     company = get_active_company(request)
-    top_clients = company.get_top_clients() if company else []
+    window = request.GET.get('window', 'all')
+    if not company:
+        top_clients = []
+    elif window == 'all':
+        top_clients = get_dashboard_stats(company).top_clients
+    else:
+        top_clients = company.get_top_clients(period=current_period(window))
     return render(
         request,
         'htmx_templates/partials/home/_top_clients.html',
@@ -283,7 +246,7 @@ def htmx_home_top_clients(request):
 
 def htmx_home_latest_invoices(request):
     company = get_active_company(request)
-    invoices = company.get_latest_invoices() if company else []
+    invoices = get_dashboard_stats(company).latest_invoices if company else []
     return render(
         request,
         'htmx_templates/partials/home/_latest_invoices.html',
@@ -294,10 +257,12 @@ def htmx_home_calendar(request):
     return render(request, 'htmx_templates/partials/home/_calendar.html')
 
 def get_active_company(request):
-    company_id = request.session.get("active_company_id")
-    if not company_id:
-        return None
-    return Company.objects.filter(id=company_id, user=request.user).first()
+    return request.company
+
+LIST_BATCH_SIZE = 10
+LIST_BATCH_MIN = 10
+LIST_BATCH_MAX = 100
+
 
 @login_required
 def htmx_generic_list(request, kind):
@@ -358,151 +323,115 @@ def htmx_generic_list(request, kind):
 
 
     objects = cfg["get_queryset"]()
+    # Pages by default, ?mode=scroll loads the next rows when the end of the list is reached
+    infinite_scroll = request.GET.get("mode") == "scroll"
+
+    # Infinite scroll: only the next batch of rows and a new sentinel, no header or paginator
+    if infinite_scroll and request.GET.get("rows"):
+        return htmx_list_rows(request, cfg, objects)
 
-    paginator = Paginator(objects, 10)
-    page_obj = paginator.get_page(request.GET.get("page"))
+    paginator = KeysetPaginator(objects, LIST_BATCH_SIZE)
+    page_obj = paginator.get_page(request.GET.get("cursor"))
 
     return render(
         request,
         "htmx_templates/base_list.html",
         {
             **cfg,
+            "kind": kind,
             "objects": page_obj,
             "page_obj": page_obj,
             "is_paginated": page_obj.has_other_pages(),
+            "infinite_scroll": infinite_scroll,
+            "batch_size": LIST_BATCH_SIZE,
         },
     )
 
 
-def get_invoice_queryset(request):
-    company_id = request.session.get("active_company_id")
-    if not company_id:
-        return Invoice.objects.none()
-
-    qs = Invoice.objects.filter(
-        company__user=request.user,
-        company_id=company_id
+def htmx_list_rows(request, cfg, objects):
+    """
+    Renders one infinite scroll batch of a generic list. The size of the next batch
+    is adapted to how long this one took to load and render.
+    """
+    started = time.perf_counter()
+    try:
+        size = int(request.GET.get("size", LIST_BATCH_SIZE))
+    except ValueError:
+        size = LIST_BATCH_SIZE
+    size = max(LIST_BATCH_MIN, min(size, LIST_BATCH_MAX))
+
+    paginator = KeysetPaginator(objects, size, count_mode="none")
+    page_obj = paginator.get_page(request.GET.get("cursor"))
+    context = {**cfg, "objects": page_obj, "page_obj": page_obj}
+    rows = render_to_string(cfg["row_template"], context, request)
+
+    context["batch_size"] = adapt_batch_size(
+        size, time.perf_counter() - started, minimum=LIST_BATCH_MIN, maximum=LIST_BATCH_MAX
     )
+    sentinel = render_to_string("htmx_templates/partials/list/sentinel.html", context, request)
+    return HttpResponse(rows + sentinel)
 
-    search_query = request.GET.get('search')
-    if search_query:
-        qs = qs.filter(
-            Q(number__icontains=search_query) |
-            Q(client__name__icontains=search_query) |
-            Q(client__surname__icontains=search_query) |
-            Q(client__client_company_name__icontains=search_query)
-        )
-
-    sort_param = request.GET.get("sort", "-issue_date")
 
-    if sort_param.lstrip("-") == "number":
-        reverse = sort_param.startswith("-")
-        return sorted(
-            qs,
-            key=lambda inv: (
-                int(inv.number.split("/")[2]),
-                int(inv.number.split("/")[1]),
-                int(inv.number.split("/")[0]),
-            ),
-            reverse=reverse,
-        )
-
-    return qs.order_by(sort_param)
+def get_invoice_queryset(request):
+    return ROW_LOADERS["invoices"].from_request(request, "-issue_date")
 
 
 def get_client_queryset(request):
-    company_id = request.session.get("active_company_id")
-    if not company_id:
-        return Client.objects.none()
+    return ROW_LOADERS["clients"].from_request(request, "-id")
 
-    qs = Client.objects.filter(
-        company__user=request.user,
-        company_id=company_id
-    )
-
-    search_query = request.GET.get('search')
-    if search_query:
-        qs = qs.filter(
-            Q(name__icontains=search_query) |
-            Q(surname__icontains=search_query) |
-            Q(email__icontains=search_query) |
-            Q(nip__icontains=search_query) |
-            Q(client_company_name__icontains=search_query)
-        )
-
-    qs = qs.annotate(
-        full_name_or_company=Case(
-            When(
-                client_company_name__isnull=False,
-                then="client_company_name",
-            ),
-            default=Concat(
-                "name",
-                Value(" "),
-                "surname",
-                output_field=CharField(),
-            ),
-            output_field=CharField(),
-        )
-    )
 
-    sort_param = request.GET.get("sort", "-id")
+def get_product_queryset(request):
+    return ROW_LOADERS["products"].from_request(request, "-created_at")
 
-    return qs.order_by(sort_param)
 
+EXPORT_FORMATS = {
+    "csv": (stream_csv, "text/csv; charset=utf-8"),
+    "xlsx": (stream_xlsx, "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"),
+}
 
-def get_product_queryset(request):
-    company_id = request.session.get("active_company_id")
-    if not company_id:
-        return Product.objects.none()
 
-    qs = Product.objects.filter(
-        company__user=request.user,
-        company_id=company_id
-    )
+@login_required
+def htmx_generic_export(request, kind, file_format):
+    """Streams a whole generic list as CSV or XLSX, with the same search and sort as the list."""
+    get_queryset = {
+        "invoices": get_invoice_queryset,
+        "clients": get_client_queryset,
+        "products": get_product_queryset,
+    }.get(kind)
+    if not get_queryset or file_format not in EXPORT_FORMATS:
+        return HttpResponse(status=404)
+    if not request.company:
+        return HttpResponse("Brak firmy", status=400)
 
-    search_query = request.GET.get('search')
-    if search_query:
-        qs = qs.filter(
-            Q(name__icontains=search_query) |
-            Q(description__icontains=search_query)
-        )
+    stream, content_type = EXPORT_FORMATS[file_format]
+    response = StreamingHttpResponse(stream(kind, get_queryset(request)), content_type=content_type)
+    response["Content-Disposition"] = f'attachment; filename="{kind}_{date.today()}.{file_format}"'
+    return response
 
-    sort_param = request.GET.get('sort', '-created_at')
-    return qs.order_by(sort_param)
 
 def htmx_invoice_add(request):
-    company_id = request.session.get("active_company_id")
-    if not company_id:
+    company = request.company
+    if not company:
         return HttpResponse("Brak aktywnej firmy", status=400)
 
-    try:
-        company = Company.objects.get(id=company_id, user=request.user)
-    except Company.DoesNotExist:
-        return HttpResponse("Firma nie istnieje", status=400)
-
     if request.method == "POST":
-        form = InvoiceForm(request.POST)
+        form = InvoiceForm(request.POST, company=company)
         item_formset = InvoiceItemFormSet(request.POST, prefix="items")
 
-        form.fields['client'].queryset = Client.objects.filter(
-            company_id=company_id, company__user=request.user
-        )
+        form.fields['client'].queryset = Client.objects.filter(company=company)
 
         for f in item_formset.forms:
-            f.fields["product"].queryset = Product.objects.filter(
-                company_id=company_id)
+            f.fields["product"].queryset = Product.objects.filter(company=company)
 
         if form.is_valid() and item_formset.is_valid():
             invoice = form.save(commit=False)
             invoice.company = company
-            invoice.save()
+            # The item formset's save_items() refreshes the rollups once, with the totals
+            invoice.save(refresh_rollups=False)
 
             item_formset.instance = invoice
             item_formset.save()
 
-            invoice.update_totals()
-
             if is_hx(request):
                 list_url = reverse("htmx_list", kwargs={"kind": "invoices"})
 
@@ -517,16 +446,13 @@ def htmx_invoice_add(request):
             print("Formset errors:", item_formset.errors)
             print("Non-form errors:", item_formset.non_form_errors)
     else:
-        form = InvoiceForm()
-        form.fields['client'].queryset = Client.objects.filter(
-            company_id=company_id, company__user=request.user
-        )
+        form = InvoiceForm(company=company)
+        form.fields['client'].queryset = Client.objects.filter(company=company)
 
         item_formset = InvoiceItemFormSet(prefix="items")
 
     for f in item_formset.forms:
-        f.fields["product"].queryset = Product.objects.filter(
-            company_id=company_id)
+        f.fields["product"].queryset = Product.objects.filter(company=company)
 
     return render(
         request,
@@ -539,34 +465,22 @@ def htmx_invoice_add(request):
 
 
 def htmx_home_chart(request):
-    monthly_revenue = 0
-    yearly_revenue = 0
-    monthly_revenues_json = {}
-
-    company_id = request.session.get('active_company_id')
-    if company_id:
-        try:
-            active_company = Company.objects.get(id=company_id, user=request.user)
-            monthly_revenues_json = active_company.get_monthly_revenues_json()
-            monthly_revenue = active_company.get_current_monthly_revenue()
-            yearly_revenue = active_company.get_yearly_revenue()
-        except Company.DoesNotExist:
-            pass
+    company = get_active_company(request)
+    stats = get_dashboard_stats(company) if company else None
 
     return render(
         request,
         'htmx_templates/partials/home/_chart.html',
         {
-            'monthly_revenues': monthly_revenues_json,
-            'monthly_revenue': monthly_revenue,
-            'yearly_revenue': yearly_revenue,
+            'monthly_revenues': stats.monthly_revenues_json if stats else {},
+            'monthly_revenue': stats.monthly_revenue if stats else 0,
+            'yearly_revenue': stats.yearly_revenue if stats else 0,
         }
     )
 
 
 def htmx_invoice_add_item(request):
-    company_id = request.session.get("active_company_id")
-    if not company_id:
+    if not request.company:
         return HttpResponse(status=400)
 
     current_forms = request.GET.get('total_forms', '0')
@@ -577,9 +491,7 @@ def htmx_invoice_add_item(request):
 
     form.prefix = f"items-{new_index}"
 
-    form.fields["product"].queryset = Product.objects.filter(
-        company_id=company_id, company__user=request.user
-    )
+    form.fields["product"].queryset = Product.objects.filter(company=request.company)
 
     form.fields['quantity'].initial = 1
 
@@ -614,9 +526,7 @@ def htmx_invoice_item_autofill(request):
         prefix=prefix,
     )
 
-    company_id = request.session.get("active_company_id")
-    form.fields["product"].queryset = Product.objects.filter(
-        company_id=company_id)
+    form.fields["product"].queryset = Product.objects.filter(company=request.company)
 
     return render(
         request,
@@ -1,28 +1,32 @@
 import json
 import logging
-from datetime import datetime
+from datetime import date, datetime
 
 from django.contrib.auth.decorators import login_required
 from django.contrib.auth.mixins import LoginRequiredMixin
-from django.db.models import Sum, F, Max, Case, When, Value, CharField
-from django.db.models.functions import Concat
+from django.db.models import Sum, F, Max
 from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib.auth import login as auth_login
 from django.contrib import messages
-from django.template.loader import get_template
 from django.urls import reverse
 from django.views.generic import ListView, DetailView, UpdateView, DeleteView, \
     CreateView
 from rest_framework.reverse import reverse_lazy
-from weasyprint import HTML
 
 from ..forms.templates_forms.forms import RegisterForm, LoginForm, ProductForm, \
-    ClientForm, InvoiceForm, InvoiceItemFormSet, CompanyForm
+    ClientForm, InvoiceForm, InvoiceItemFormSet, CompanyForm, ImportForm
 from django.db.models.functions import Round, TruncMonth
 from django.db.models import Q
 
+from ..dashboard import get_dashboard_stats
+from ..documents import InvoiceDocumentMixin, get_invoice_document
+from ..imports import import_file
+from ..lists import ROW_LOADERS
+from ..pagination import KeysetPaginationMixin
+from ..pdf import get_invoice_pdf, invoices_for_export, stream_invoice_pdfs_zip, PdfRendererBusy, \
+    PdfRenderTimeout
 from ..models import Client, Company, User, Invoice, Product, InvoiceItem
-from django.http import JsonResponse, HttpResponse
+from django.http import Http404, JsonResponse, HttpResponse, FileResponse, StreamingHttpResponse
 
 logger = logging.getLogger(__name__)
 
@@ -64,53 +68,22 @@ def register(request):
         {"form": form}
     )
 
-def get_top_products(company, limit=5):
-    return (
-        Product.objects.filter(company=company)
-        .annotate(
-            total_revenue=Round(Sum(F("invoiceitem__quantity") * F("invoiceitem__net_price")), precision=2),
-            total_quantity=Sum("invoiceitem__quantity")
-        )
-        .filter(total_revenue__isnull=False)
-        .order_by("-total_revenue")[:limit]
-    )
-
-
-
 @login_required()
 def home(request):
-    active_company = None
-    invoices, top_products, top_clients = [], [], []
-    monthly_revenue: float = 0
-    yearly_revenue: float = 0
-    monthly_revenues_json = {}
-
-    company_id = request.session.get('active_company_id')
-    if company_id:
-        try:
-            active_company = Company.objects.get(id=company_id, user=request.user)
-            invoices = active_company.get_latest_invoices()
-            top_products = active_company.get_top_products()
-            top_clients = active_company.get_top_clients()
-
-            monthly_revenues_json = active_company.get_monthly_revenues_json()
-            monthly_revenue = active_company.get_current_monthly_revenue()
-            yearly_revenue = active_company.get_yearly_revenue()
-
-        except Company.DoesNotExist:
-            active_company = None
+    active_company = request.company
+    stats = get_dashboard_stats(active_company) if active_company else None
 
     return render(
         request,
         "frontend_templates/home_authenticated.html",
         {
             "active_company": active_company,
-            "invoices": invoices,
-            "top_products": top_products,
-            "top_clients": top_clients,
-            "monthly_revenues": monthly_revenues_json,
-            "monthly_revenue": monthly_revenue,
-            "yearly_revenue": yearly_revenue
+            "invoices": stats.latest_invoices if stats else [],
+            "top_products": stats.top_products if stats else [],
+            "top_clients": stats.top_clients if stats else [],
+            "monthly_revenues": stats.monthly_revenues_json if stats else {},
+            "monthly_revenue": stats.monthly_revenue if stats else 0,
+            "yearly_revenue": stats.yearly_revenue if stats else 0
         }
     )
 
@@ -132,15 +105,10 @@ def choose_company(request):
 
 
 def handle_form_valid(view, form):
-    active_company_id = view.request.session.get('active_company_id')
-    if not active_company_id:
+    company = view.request.company
+    if not company:
         form.add_error(None, "Nie wybrano aktywnej firmy.")
         return view.form_invalid(form)
-    try:
-        company = Company.objects.get(id=active_company_id)
-    except Company.DoesNotExist:
-        form.add_error(None, "Aktywna firma nie istnieje.")
-        return view.form_invalid(form)
 
     form.instance.company = company
     return super(view.__class__, view).form_valid(form)
@@ -155,7 +123,7 @@ class CompanyCreateView(BaseSecuredView, CreateView):
         form.instance.user = self.request.user
         return super().form_valid(form)
 
-class ClientsListView(BaseSecuredView, ListView):
+class ClientsListView(BaseSecuredView, KeysetPaginationMixin, ListView):
     model = Client
     template_name = "frontend_templates/clients.html"
     context_object_name = "clients"
@@ -163,33 +131,7 @@ class ClientsListView(BaseSecuredView, ListView):
 
 
     def get_queryset(self):
-        company_id: int = self.request.session.get('active_company_id')
-        if not company_id:
-            return Client.objects.none()
-
-        queryset = Client.objects.filter(company__user=self.request.user, company_id=company_id)
-
-        search_query = self.request.GET.get('search')
-        if search_query:
-            queryset = queryset.filter(
-                Q(name__icontains=search_query) |
-                Q(surname__icontains=search_query) |
-                Q(email__icontains=search_query) |
-                Q(nip__icontains=search_query)
-            )
-
-        queryset = queryset.annotate(
-            full_name_or_company=Case(
-                When(client_company_name__isnull=False,
-                     then='client_company_name'),
-                default=Concat('name',
-                               Value(' '), 'surname',
-                               output_field=CharField()),
-                output_field=CharField(),
-            )
-        )
-        sort_param = self.request.GET.get('sort', 'id')
-        return queryset.order_by(sort_param)
+        return ROW_LOADERS["clients"].from_request(self.request, 'id')
 
 class ClientCreateView(BaseSecuredView, CreateView):
     model = Client
@@ -208,74 +150,43 @@ class ClientDetailView(BaseSecuredView, DetailView):
     def get_queryset(self):
         return Client.objects.filter(company__user=self.request.user)
 
-class InvoicesListView(BaseSecuredView, ListView):
+class InvoicesListView(BaseSecuredView, KeysetPaginationMixin, ListView):
     model = Invoice
     template_name = 'frontend_templates/invoices.html'
     context_object_name = 'invoices'
     paginate_by = 10
 
     def get_queryset(self):
-        company_id: int = self.request.session.get('active_company_id')
-        if not company_id:
-            return Invoice.objects.none()
-
-        queryset = self.model.objects.filter(company__user=self.request.user, company_id=company_id)
-        search_query = self.request.GET.get('search')
-        if search_query:
-            queryset = queryset.filter(
-                Q(number__icontains=search_query) |
-                Q(client__name__icontains=search_query)
-            )
-        sort_param = self.request.GET.get('sort', '-number')
-
-        if sort_param.lstrip('-') == 'number':
-            reverse = sort_param.startswith('-')
-            queryset = sorted(
-                queryset,
-                key=lambda inv: (
-                    int(inv.number.split('/')[2]),
-                    int(inv.number.split('/')[1]),
-                    int(inv.number.split('/')[0])
-                ),
-                reverse=reverse
-            )
+        return ROW_LOADERS["invoices"].from_request(self.request, '-number')
 
-        else:
-            queryset = queryset.order_by(sort_param)
-
-        return queryset
-
-class InvoiceDetailView(BaseSecuredView, DetailView):
+class InvoiceDetailView(BaseSecuredView, InvoiceDocumentMixin, DetailView):
     model = Invoice
     template_name = 'frontend_templates/invoice_detail.html'
     context_object_name = 'invoice'
 
-    def get_context_data(self, **kwargs):
-        context = super().get_context_data(**kwargs)
-        context['items'] = self.object.items.all()
-        return context
-
 class InvoiceCreateView(BaseSecuredView, CreateView):
     model = Invoice
     form_class = InvoiceForm
     template_name = 'frontend_templates/invoice_create.html'
     success_url = reverse_lazy('tmp_invoices')
 
+    def get_form_kwargs(self):
+        kwargs = super().get_form_kwargs()
+        kwargs['company'] = self.request.company
+        return kwargs
+
     def get_form(self, form_class=None):
         form = super().get_form(form_class)
-        company_id = self.request.session.get('active_company_id')
-        if company_id:
-            form.fields['client'].queryset = Client.objects.filter(
-                company_id=company_id,
-                company__user=self.request.user
-            )
+        company = self.request.company
+        if company:
+            form.fields['client'].queryset = Client.objects.filter(company=company)
         else:
             form.fields['client'].queryset = Client.objects.none()
         return form
 
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
-        company_id = self.request.session.get('active_company_id')
+        company = self.request.company
 
         # Use an unsaved Invoice instance to properly initialize the inline formset
         temp_invoice = Invoice()
@@ -286,25 +197,24 @@ class InvoiceCreateView(BaseSecuredView, CreateView):
             context['item_formset'] = InvoiceItemFormSet(instance=temp_invoice, prefix='items')
 
         for form in context['item_formset'].forms:
-            form.fields['product'].queryset = Product.objects.filter(company_id=company_id)
+            form.fields['product'].queryset = Product.objects.filter(company=company)
 
         return context
 
     def form_valid(self, form):
-        company_id = self.request.session.get('active_company_id')
-        form.instance.company = Company.objects.get(id=company_id)
+        form.instance.company = self.request.company
 
         context = self.get_context_data()
         item_formset = context['item_formset']
 
 
         if item_formset.is_valid():
-            invoice = form.save()
+            invoice = form.save(commit=False)
+            # The item formset's save_items() refreshes the rollups once, with the totals
+            invoice.save(refresh_rollups=False)
 
             item_formset.instance = invoice
             item_formset.save()
-
-            invoice.update_totals()
             if self.request.headers.get("HX-Request") == "true":
                 response = HttpResponse()
                 response["HX-Redirect"] = reverse("htmx_home") + "?view=invoices"
@@ -314,30 +224,14 @@ class InvoiceCreateView(BaseSecuredView, CreateView):
         return self.form_invalid(form)
 
 
-class ProductsListView(BaseSecuredView, ListView):
+class ProductsListView(BaseSecuredView, KeysetPaginationMixin, ListView):
     model = Product
     template_name = "frontend_templates/products.html"
     context_object_name = "products"
     paginate_by = 10
 
     def get_queryset(self):
-        company_id: int = self.request.session.get('active_company_id')
-        if not company_id:
-            return Product.objects.none()
-        
-        queryset = Product.objects.filter(
-            company_id=company_id,
-            company__user=self.request.user
-        )
-
-        search_query = self.request.GET.get('search')
-        if search_query:
-            queryset = queryset.filter(
-                Q(name__icontains=search_query) |
-                Q(description__icontains=search_query)
-            )
-        sort_param = self.request.GET.get('sort', '-created_at')
-        return queryset.order_by(sort_param)
+        return ROW_LOADERS["products"].from_request(self.request, '-created_at')
 
 class ProductsDetailView(BaseSecuredView, DetailView):
     model = Product
@@ -383,24 +277,71 @@ def product_data(request, pk):
 
 @login_required
 def invoice_pdf(request, pk):
-    invoice = get_object_or_404(Invoice, pk=pk)
+    try:
+        invoice = get_invoice_document(Invoice.objects.all(), pk)
+    except Invoice.DoesNotExist:
+        raise Http404('Nie znaleziono faktury.')
 
-    if invoice.company.user != request.user:
+    if invoice.company.user_id != request.user.id:
         return HttpResponse('Brak uprawnień do tej faktury', status=403)
 
-    context = {
-        'invoice': invoice,
-    }
+    try:
+        path = get_invoice_pdf(invoice)
+    except (PdfRendererBusy, PdfRenderTimeout):
+        logger.warning("PDF renderer unavailable for invoice %s", invoice.pk, exc_info=True)
+        response = HttpResponse('Generowanie PDF jest chwilowo niedostępne, spróbuj ponownie.', status=503)
+        response['Retry-After'] = '5'
+        return response
+
+    return FileResponse(
+        open(path, 'rb'),
+        as_attachment=True,
+        filename=f"faktura_{invoice.number.replace('/', '_')}.pdf",
+        content_type='application/pdf',
+    )
 
-    template = get_template('frontend_templates/invoice_pdf.html')
-    html_string = template.render(context)
 
-    pdf_file = HTML(string=html_string).write_pdf()
+@login_required
+def invoice_pdf_export(request):
+    """Streams a ZIP with the PDFs of all invoices of the active company issued between ?from= and ?to=."""
+    try:
+        date_from = date.fromisoformat(request.GET.get('from', ''))
+        date_to = date.fromisoformat(request.GET.get('to', ''))
+    except ValueError:
+        return HttpResponse('Podaj zakres dat (from, to) w formacie RRRR-MM-DD.', status=400)
+
+    invoices = invoices_for_export(request.company, date_from, date_to)
+    response = StreamingHttpResponse(stream_invoice_pdfs_zip(invoices), content_type='application/zip')
+    response['Content-Disposition'] = f'attachment; filename="faktury_{date_from}_{date_to}.zip"'
+    return response
 
-    response = HttpResponse(pdf_file, content_type='application/pdf')
-    response['Content-Disposition'] = f'attachment;filename="faktura_{invoice.number}.pdf"'
 
-    return response
+@login_required
+def import_view(request):
+    """Bulk import of clients, products or invoices from an uploaded CSV/JSON file."""
+    result = None
+    if request.method == "POST":
+        form = ImportForm(request.POST, request.FILES)
+        if form.is_valid():
+            result = import_file(
+                request.company,
+                form.cleaned_data['kind'],
+                form.cleaned_data['file'],
+                form.file_format,
+            )
+            form = ImportForm(initial={'kind': form.cleaned_data['kind']})
+    else:
+        form = ImportForm()
+
+    return render(
+        request,
+        "frontend_templates/import.html",
+        {
+            "form": form,
+            "result": result,
+            "errors": result.errors[:200] if result else [],
+        }
+    )
 
 
 @login_required
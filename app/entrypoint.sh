@@ -10,14 +10,7 @@ echo "Applying migrations..."
 python manage.py tailwind install
 python manage.py makemigrations
 python manage.py migrate
-
-echo "Creating superuser if not exists..."
-python manage.py shell -c "
-from django.contrib.auth import get_user_model
-User = get_user_model()
-if not User.objects.filter(email='admin@example.com').exists():
-    User.objects.create_superuser('admin@example.com', 'admin')
-"
+python manage.py createcachetable
 
 if [ "$RESET_DB" = "true" ]; then
     echo "Resetting database..."
@@ -29,17 +22,15 @@ python manage.py shell -c "
 from django.core.management import call_command
 from backend.models import Company
 if '$RESET_DB' == 'true' or not Company.objects.exists():
-    fixtures = [
-        'backend/fixtures/users.json',
-        'backend/fixtures/companies.json',
-        'backend/fixtures/clients.json',
-        'backend/fixtures/products.json',
-        'backend/fixtures/invoices.json',
-        'backend/fixtures/invoice_items.json',
-        'backend/fixtures/addresses.json'
-    ]
-    for fixture in fixtures:
-        call_command('loaddata', fixture, verbosity=2)
+    call_command('load_seed')
+"
+
+echo "Creating superuser if not exists..."
+python manage.py shell -c "
+from django.contrib.auth import get_user_model
+User = get_user_model()
+if not User.objects.filter(email='admin@example.com').exists():
+    User.objects.create_superuser('admin@example.com', 'admin')
 "
 
 echo "Starting server..."
@@ -151,6 +151,34 @@ AUTH_USER_MODEL = 'backend.User'
 
 LOGIN_URL = '/templates/login/'
 
+# Caches
+# Dashboard statistics are cached per company and invalidated when invoices change.
+# Invalidation only reaches other worker processes through a shared backend, so
+# they live in the database cache ("shared", created by createcachetable).
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    'shared': {
+        'BACKEND': 'django.core.cache.backends.db.DatabaseCache',
+        'LOCATION': 'shared_cache',
+    },
+}
+
+DASHBOARD_CACHE_TIMEOUT = 300
+ACTIVE_COMPANY_CACHE_TIMEOUT = 60
+ACTIVE_COMPANY_CACHE_SIZE = 256
+
+# Generated invoice PDFs, addressed by the hash of their content
+INVOICE_PDF_CACHE_DIR = os.environ.get('INVOICE_PDF_CACHE_DIR', BASE_DIR / 'pdf_cache')
+INVOICE_PDF_CACHE_MAX_BYTES = int(os.environ.get('INVOICE_PDF_CACHE_MAX_BYTES', 256 * 1024 * 1024))
+
+# WeasyPrint renderer pool, 0 workers renders inside the web process
+INVOICE_PDF_WORKERS = int(os.environ.get('INVOICE_PDF_WORKERS', 2))
+INVOICE_PDF_TIMEOUT = int(os.environ.get('INVOICE_PDF_TIMEOUT', 30))
+INVOICE_PDF_MAX_PENDING = int(os.environ.get('INVOICE_PDF_MAX_PENDING', 8))
+
 
 LOGGING = {
     'version': 1,